@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.utils.settings import settings
+
+ItemT = TypeVar("ItemT")
+
+
+class BatchOptions(BaseModel):
+    """Options shared by every batch endpoint"""
+    concurrency: Optional[int] = None
+    stream: bool = False
+    use_cache: bool = True
+    profile: Optional[str] = None
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    output: Optional[str] = None
+    language: Optional[str] = None
+    source_language: Optional[str] = None
+    error: Optional[str] = None
+    elapsed_ms: float = 0.0
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchItemResult]
+    succeeded: int
+    failed: int
+    elapsed_ms: float
+
+
+def batch_concurrency(requested: Optional[int]) -> int:
+    """Clamp the requested concurrency to the deployment's limits"""
+    return max(1, min(requested or settings.batch_concurrency, settings.batch_max_concurrency))
+
+
+async def run_bounded(
+    items: Sequence[ItemT],
+    worker: Callable[[int, ItemT], Awaitable[Dict[str, Any]]],
+    concurrency: int,
+) -> AsyncIterator[BatchItemResult]:
+    """
+    Run `worker` over every item with at most `concurrency` running at once,
+    yielding results in completion order. A failing item becomes a result
+    with `error` set instead of failing the batch.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(index: int, item: ItemT) -> BatchItemResult:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                fields = await worker(index, item)
+            except Exception as e:
+                fields = {"error": str(e) or type(e).__name__}
+            return BatchItemResult(
+                index=index,
+                id=getattr(item, "id", None),
+                elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+                **fields,
+            )
+
+    tasks = [asyncio.ensure_future(run_one(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def batch_response(
+    items: Sequence[ItemT],
+    worker: Callable[[int, ItemT], Awaitable[Dict[str, Any]]],
+    options: BatchOptions,
+):
+    """
+    Run a batch and return either a BatchResponse ordered by item index, or
+    with `stream` set, an NDJSON stream of results as they finish followed by
+    a summary line.
+    """
+    started = time.perf_counter()
+    results = run_bounded(items, worker, batch_concurrency(options.concurrency))
+
+    if options.stream:
+        async def lines():
+            failed = 0
+            async for result in results:
+                failed += result.error is not None
+                yield result.model_dump_json() + "\n"
+            yield json.dumps({
+                "done": True,
+                "succeeded": len(items) - failed,
+                "failed": failed,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+            }) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    collected = sorted([result async for result in results], key=lambda result: result.index)
+    failed = sum(result.error is not None for result in collected)
+    return BatchResponse(
+        results=collected,
+        succeeded=len(collected) - failed,
+        failed=failed,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+    )
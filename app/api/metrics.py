@@ -0,0 +1,89 @@
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.llm.backendPool import backend_pool
+from app.llm.languageDetection import detection_engine
+from app.llm.metrics import metrics
+from app.llm.modelTask import ModelTask
+from app.llm.responseCache import response_cache
+from app.llm.scheduler import request_scheduler
+from app.llm.singleFlight import single_flight
+
+# Served at the root, where Prometheus scrapes by default
+router = APIRouter(tags=["metrics"])
+
+# Route path fragments and the task their endpoints run
+ROUTE_TASKS = (
+    ("explain", ModelTask.CODE_EXPLANATION),
+    ("generate", ModelTask.CODE_GENERATION),
+    ("translate", ModelTask.CODE_TRANSLATION),
+)
+
+
+def route_task(route: str) -> str:
+    for fragment, task in ROUTE_TASKS:
+        if fragment in route:
+            return task.value
+    return "none"
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request until its response body is complete (so a
+    stream counts until its last event) and counts it by route template,
+    method and status. Unmatched paths share one label to bound cardinality.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            metrics.observe_request(
+                route, scope["method"], route_task(route), status, time.monotonic() - started
+            )
+
+
+def refresh_gauges() -> None:
+    """Copy the scheduler's, caches' and backend nodes' current figures into the gauges"""
+    scheduler = request_scheduler.stats()
+    metrics.in_flight.set(scheduler["in_flight"])
+    metrics.capacity.set(scheduler["capacity"])
+    metrics.queued.set(scheduler["queue_depth"])
+
+    cache = response_cache.stats()
+    metrics.set_cache("response", cache["hits"], cache["misses"])
+    detection = detection_engine.stats()
+    metrics.set_cache("detection", detection["hits"], detection["misses"])
+    # A coalesced request is served from a generation already in flight
+    flights = single_flight.stats()
+    metrics.set_cache("singleflight", flights["coalesced"], flights["leaders"])
+
+    for backend in backend_pool.stats()["backends"]:
+        metrics.backend_outstanding.set(backend["outstanding"], backend=backend["url"])
+        metrics.backend_up.set(0 if backend["state"] == "open" else 1, backend=backend["url"])
+        metrics.backend_requests.set(backend["requests"], backend=backend["url"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition of request, stage and generation metrics"""
+    refresh_gauges()
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,44 @@
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+
+from app.api.routes import router
+from app.api.metrics import MetricsMiddleware, router as metrics_router
+from app.api.tracing import TracingMiddleware
+from app.llm.healthMonitor import health_monitor
+from app.llm.inferenceExecutor import inference_executor
+from app.llm.jobQueue import job_queue
+from app.llm.chunkedTranslation import chunked_translator
+from app.llm.mapReduceExplanation import map_reduce_explainer
+from app.llm.modelRegistry import preload_options
+from app.llm.modelResidency import model_residency
+from app.llm.sharedState import shared_state
+from app.utils.settings import settings
+from app.utils.structuredLog import structured_log
+
+# Start background services with the API server and stop them on shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    structured_log.start()
+    shared_state.start()
+    health_monitor.start()
+    if settings.preload_models:
+        model_residency.start_preload(preload_options())
+    job_queue.start()
+    yield
+    job_queue.stop()
+    health_monitor.stop()
+    inference_executor.shutdown()
+    chunked_translator.shutdown()
+    map_reduce_explainer.shutdown()
+    shared_state.stop()
+    structured_log.stop()
+
+# The API without the desktop UI; uvicorn and gunicorn workers import it as app.api.server:app
+app = FastAPI(title="AI Code Assistant", lifespan=lifespan)
+
+# Register API routes
+app.include_router(router)
+app.include_router(metrics_router)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
@@ -0,0 +1,43 @@
+from app.llm.tracing import current_trace, tracer
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+
+class TracingMiddleware:
+    """
+    Gives every HTTP request a trace: the client's X-Request-ID, or a new ID
+    that is returned in the X-Request-ID response header. The trace is the
+    current one while the request is served, so spans recorded anywhere in
+    the request (worker threads included) land in it; it is finished once
+    the response body is complete.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")
+                break
+        trace = tracer.start(scope["method"], scope["path"], request_id)
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [header for header in message.get("headers", []) if header[0] != REQUEST_ID_HEADER]
+                message = {**message, "headers": [*headers, (REQUEST_ID_HEADER, trace.request_id.encode("latin-1"))]}
+            await send(message)
+
+        reset = current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            current_trace.reset(reset)
+            tracer.finish(trace, status, getattr(scope.get("route"), "path", None))
@@ -0,0 +1,40 @@
+"""
+Runs the API server headless (without the desktop UI), optionally as several
+worker processes. With more than one worker, the processes share the
+response cache, in-flight generations, the generation slot limit and the
+job queue through SQLite files in the data directory.
+
+Usage:
+    python -m app.cli.serve [--host HOST] [--port PORT] [--workers N] [--data-dir DIR]
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import uvicorn
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve the AI Code Assistant API")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes")
+    parser.add_argument("--data-dir", type=Path, default=Path("data"), help="Directory for the shared SQLite files")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.workers > 1:
+        # Read by every worker when it imports the settings; explicit settings win
+        os.environ.setdefault("AICT_SHARED_STATE_PATH", str(args.data_dir / "shared.db"))
+        os.environ.setdefault("AICT_CACHE_DB_PATH", str(args.data_dir / "cache.db"))
+        os.environ.setdefault("AICT_JOBS_DB_PATH", str(args.data_dir / "jobs.db"))
+    # Workers import the app themselves, so it is passed by name
+    uvicorn.run("app.api.server:app", host=args.host, port=args.port, workers=args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
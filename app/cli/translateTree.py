@@ -0,0 +1,144 @@
+"""
+Translates every supported source file under a directory into another
+language, writing the results to a mirrored output tree. Runs headless
+(no API server or UI) against the configured Ollama backend.
+
+Usage:
+    python -m app.cli.translateTree SOURCE_DIR OUTPUT_DIR --to LANGUAGE
+        [--from LANGUAGE] [--profile NAME] [--parallel N] [--no-cache] [--overwrite]
+"""
+import argparse
+import contextvars
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.llm.chunkedTranslation import chunked_translator
+from app.llm.healthMonitor import health_monitor
+from app.llm.scheduler import RequestContext, request_context
+from app.utils.settings import settings
+
+# File extension for each supported language
+LANGUAGE_EXTENSIONS: Dict[str, str] = {
+    "python": ".py",
+    "javascript": ".js",
+    "typescript": ".ts",
+    "java": ".java",
+    "csharp": ".cs",
+    "cpp": ".cpp",
+    "go": ".go",
+    "rust": ".rs",
+    "ruby": ".rb",
+    "php": ".php",
+    "swift": ".swift",
+    "kotlin": ".kt",
+    "html": ".html",
+    "css": ".css",
+}
+
+EXTENSION_LANGUAGES: Dict[str, str] = {
+    **{extension: language for language, extension in LANGUAGE_EXTENSIONS.items()},
+    ".jsx": "javascript",
+    ".tsx": "typescript",
+    ".cc": "cpp",
+    ".cxx": "cpp",
+    ".hpp": "cpp",
+    ".h": "cpp",
+    ".kts": "kotlin",
+    ".htm": "html",
+}
+
+# Directories that never contain sources worth translating
+SKIPPED_DIRECTORIES = {".git", ".hg", ".svn", "__pycache__", "node_modules", "venv", ".venv", "build", "dist", "target"}
+
+
+def find_sources(root: Path, source_language: Optional[str]) -> List[Tuple[Path, str]]:
+    """Source files under root with their language, optionally only one language"""
+    sources = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories[:] = sorted(d for d in subdirectories if d not in SKIPPED_DIRECTORIES and not d.startswith("."))
+        for name in sorted(files):
+            language = EXTENSION_LANGUAGES.get(Path(name).suffix.lower())
+            if language and (source_language is None or language == source_language):
+                sources.append((Path(directory) / name, language))
+    return sources
+
+
+def translate_file(source: Path, language: str, destination: Path, args: argparse.Namespace) -> int:
+    """Translate one file and write it; returns the number of chunks"""
+    result = chunked_translator.translate(
+        source.read_text(encoding="utf-8"),
+        args.to,
+        source_language=language,
+        profile=args.profile,
+        use_cache=not args.no_cache,
+    )
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    destination.write_text(result.code, encoding="utf-8")
+    return result.chunks
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source", type=Path, help="directory to translate")
+    parser.add_argument("output", type=Path, help="directory to write translated files to")
+    parser.add_argument("--to", required=True, choices=sorted(LANGUAGE_EXTENSIONS), help="target language")
+    parser.add_argument("--from", dest="source_language", choices=sorted(LANGUAGE_EXTENSIONS),
+                        help="only translate files of this language")
+    parser.add_argument("--profile", help="performance profile (default: deployment setting)")
+    parser.add_argument("--parallel", type=int, default=None,
+                        help="files translated at once (default: inference slots)")
+    parser.add_argument("--no-cache", action="store_true", help="skip cached translations")
+    parser.add_argument("--overwrite", action="store_true", help="replace existing output files")
+    args = parser.parse_args()
+
+    if not args.source.is_dir():
+        parser.error(f"{args.source} is not a directory")
+    status = health_monitor.probe()
+    if not status.ready:
+        print(f"Ollama is not ready: {status.error or 'missing models ' + ', '.join(status.missing_models)}", file=sys.stderr)
+        return 1
+
+    jobs = []
+    skipped = 0
+    for source, language in find_sources(args.source, args.source_language):
+        if language == args.to:
+            continue
+        destination = (args.output / source.relative_to(args.source)).with_suffix(LANGUAGE_EXTENSIONS[args.to])
+        if destination.exists() and not args.overwrite:
+            skipped += 1
+            continue
+        jobs.append((source, language, destination))
+
+    # Whole-tree work yields to interactive requests when sharing a backend
+    request_context.set(RequestContext(client_id="translate-tree", priority="batch"))
+    started = time.perf_counter()
+    failed = 0
+    chunks = 0
+    with ThreadPoolExecutor(max_workers=args.parallel or settings.max_concurrent_inference) as pool:
+        futures = {
+            pool.submit(contextvars.copy_context().run, translate_file, source, language, destination, args): (source, destination)
+            for source, language, destination in jobs
+        }
+        for future in as_completed(futures):
+            source, destination = futures[future]
+            try:
+                file_chunks = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"FAILED  {source}: {e}", file=sys.stderr)
+                continue
+            chunks += file_chunks
+            print(f"ok      {source} -> {destination} ({file_chunks} chunk{'s' if file_chunks != 1 else ''})")
+
+    elapsed = time.perf_counter() - started
+    print(f"{len(jobs) - failed} translated, {failed} failed, {skipped} skipped, {chunks} chunks in {elapsed:.1f}s")
+    chunked_translator.shutdown()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import httpx
+from pydantic import BaseModel
+
+from app.utils.settings import settings
+from .healthMonitor import BackendUnavailableError, CircuitBreaker
+from .modelConfiguration import OLLAMA_BACKENDS
+
+
+class BackendStatus(BaseModel):
+    """Result of the most recent probe of one Ollama node"""
+    url: str
+    reachable: bool = False
+    models: List[str] = []      # installed (GET /api/tags)
+    resident: List[str] = []    # loaded in memory (GET /api/ps)
+    latency_ms: float = 0.0
+    error: Optional[str] = None
+
+
+class Backend:
+    """
+    One Ollama node: requests outstanding on it, the models it has installed
+    and loaded, and a circuit breaker that ejects it while it is failing.
+    """
+    def __init__(self, url: str, breaker: CircuitBreaker):
+        self.url = url
+        self.breaker = breaker
+        self.outstanding = 0
+        self.models: Optional[set] = None  # None until the first probe
+        self.resident: set = set()
+        self.stats = {"requests": 0, "failures": 0, "ejections": 0}
+
+    def serves(self, model: str) -> bool:
+        # Ollama reports untagged models with an implicit ":latest" tag
+        return self.models is None or model in self.models or (":" not in model and f"{model}:latest" in self.models)
+
+
+class BackendPool:
+    """
+    Routes generations across several Ollama nodes.
+
+    Each request goes to the node with the fewest outstanding requests, except
+    that a node where the model is already loaded is preferred as long as it
+    has at most `affinity_slack` more outstanding requests than the least busy
+    one (a model load costs far more than a short wait). Nodes without the
+    model installed are skipped. A node is ejected after `failure_threshold`
+    consecutive connection failures and gets a trial request once
+    `eject_seconds` have passed; the health probe also ejects and readmits
+    nodes. Callers retry a failed connection on another node.
+    """
+    def __init__(
+        self,
+        urls: Sequence[str],
+        failure_threshold: int,
+        eject_seconds: float,
+        affinity_slack: int,
+        probe_timeout: float,
+    ):
+        self.backends = [
+            Backend(url, CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=eject_seconds))
+            for url in urls
+        ]
+        self.affinity_slack = affinity_slack
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._next = 0  # round-robin offset for ties
+        self._stats = {"retries": 0, "affinity_hits": 0, "no_backend": 0}
+
+    def _candidates(self, model: str, exclude: Sequence[Backend]) -> List[Backend]:
+        # Caller holds the lock; ties go round-robin so idle nodes share the load
+        count = len(self.backends)
+        order = {id(backend): (i - self._next) % count for i, backend in enumerate(self.backends)}
+        candidates = [
+            backend for backend in self.backends
+            if backend not in exclude and backend.serves(model) and backend.breaker.state != CircuitBreaker.OPEN
+        ]
+        return sorted(candidates, key=lambda backend: (backend.outstanding, order[id(backend)]))
+
+    def acquire(self, model: str, exclude: Sequence[Backend] = ()) -> Backend:
+        """Pick a node for one generation and count it as outstanding there"""
+        with self._lock:
+            candidates = self._candidates(model, exclude)
+            least = candidates[0].outstanding if candidates else 0
+            resident = [
+                backend for backend in candidates
+                if model in backend.resident and backend.outstanding <= least + self.affinity_slack
+            ]
+            for backend in resident + candidates:
+                # An ejected node past its timeout admits a single trial request
+                if backend.breaker.allow_request():
+                    break
+            else:
+                self._stats["no_backend"] += 1
+                raise BackendUnavailableError(
+                    f"No Ollama backend available for {model}",
+                    retry_after=min((b.breaker.retry_after() for b in self.backends), default=0.0) or 1.0,
+                )
+            if resident and backend is resident[0]:
+                self._stats["affinity_hits"] += 1
+            backend.outstanding += 1
+            backend.stats["requests"] += 1
+            self._next = (self._next + 1) % len(self.backends)
+            return backend
+
+    def release(self, backend: Backend, model: str, ok: Optional[bool]) -> None:
+        """
+        Finish a generation on a node: ok=True marks the model as loaded there,
+        ok=False counts a connection failure (None: neither, e.g. cancelled).
+        """
+        with self._lock:
+            backend.outstanding -= 1
+            if ok:
+                backend.resident.add(model)
+            elif ok is False:
+                backend.stats["failures"] += 1
+        if ok:
+            backend.breaker.record_success()
+        elif ok is None:
+            # A trial on an ejected node that never tested it; the next request tries it instead
+            backend.breaker.release_trial()
+        elif ok is False:
+            was_open = backend.breaker.state == CircuitBreaker.OPEN
+            backend.breaker.record_failure()
+            if not was_open and backend.breaker.state == CircuitBreaker.OPEN:
+                with self._lock:
+                    backend.stats["ejections"] += 1
+
+    @contextmanager
+    def lease(self, model: str, exclude: Sequence[Backend] = ()) -> Iterator[Backend]:
+        """Hold a node for the block; connection errors count against it"""
+        backend = self.acquire(model, exclude)
+        ok: Optional[bool] = None
+        try:
+            yield backend
+            ok = True
+        except (ConnectionError, httpx.TransportError):
+            ok = False
+            raise
+        finally:
+            self.release(backend, model, ok)
+
+    def can_retry(self, model: str, tried: Sequence[Backend]) -> bool:
+        """Whether another node could take a request that failed on `tried`"""
+        with self._lock:
+            if self._candidates(model, tried):
+                self._stats["retries"] += 1
+                return True
+            return False
+
+    def probe(self) -> List[BackendStatus]:
+        """Check every node once: installed and loaded models; unreachable nodes are ejected"""
+        results = []
+        for backend in self.backends:
+            started = time.perf_counter()
+            status = BackendStatus(url=backend.url)
+            resident: Optional[List[str]] = None
+            try:
+                tags = httpx.get(f"{backend.url}/api/tags", timeout=self.probe_timeout)
+                tags.raise_for_status()
+                status.models = [model["name"] for model in tags.json().get("models", [])]
+                try:
+                    running = httpx.get(f"{backend.url}/api/ps", timeout=self.probe_timeout)
+                    running.raise_for_status()
+                    resident = [model["name"] for model in running.json().get("models", [])]
+                except (httpx.HTTPError, ValueError):
+                    # Older servers have no /api/ps; keep what generations have shown
+                    pass
+                status.reachable = True
+            except Exception as e:
+                status.error = str(e) or type(e).__name__
+            status.latency_ms = round((time.perf_counter() - started) * 1000, 2)
+
+            with self._lock:
+                if status.reachable:
+                    backend.models = set(status.models)
+                    if resident is not None:
+                        backend.resident = set(resident)
+                status.resident = sorted(backend.resident)
+            if status.reachable:
+                backend.breaker.record_success()
+            else:
+                if backend.breaker.state != CircuitBreaker.OPEN:
+                    with self._lock:
+                        backend.stats["ejections"] += 1
+                backend.breaker.trip()
+            results.append(status)
+        return results
+
+    def mark_resident(self, url: str, model: str) -> None:
+        with self._lock:
+            for backend in self.backends:
+                if backend.url == url:
+                    backend.resident.add(model)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                **self._stats,
+                "backends": [
+                    {
+                        "url": backend.url,
+                        "state": backend.breaker.state,
+                        "outstanding": backend.outstanding,
+                        "resident": sorted(backend.resident),
+                        **backend.stats,
+                    }
+                    for backend in self.backends
+                ],
+            }
+
+
+# Create a singleton instance
+backend_pool = BackendPool(
+    urls=OLLAMA_BACKENDS,
+    failure_threshold=settings.backend_failure_threshold,
+    eject_seconds=settings.backend_eject_seconds,
+    affinity_slack=settings.backend_affinity_slack,
+    probe_timeout=settings.health_probe_timeout,
+)
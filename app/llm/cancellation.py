@@ -0,0 +1,233 @@
+import asyncio
+import functools
+import socket
+import threading
+import time
+import weakref
+from contextlib import closing
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+# Why a request was cancelled
+CLIENT_DISCONNECTED = "client_disconnected"
+DEADLINE_EXCEEDED = "deadline_exceeded"
+CANCELLED_BY_CLIENT = "cancelled_by_client"
+
+
+class RequestCancelledError(RuntimeError):
+    """Raised in place of a result once the request has been cancelled"""
+    def __init__(self, reason: str):
+        super().__init__(f"Request cancelled ({reason})")
+        self.reason = reason
+
+
+class CancellationToken:
+    """
+    Cancellation state of one request, shared by every thread working on it.
+
+    A token is cancelled explicitly (the client disconnected or asked for it)
+    or once its deadline passes. Callbacks registered with on_cancel run once,
+    in the cancelling thread, to abort whatever the request is blocked on: a
+    place in the scheduler queue or an Ollama HTTP stream.
+    """
+    def __init__(
+        self,
+        deadline: Optional[float] = None,
+        disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        counted: bool = True,
+    ):
+        self.deadline = deadline  # time.monotonic() value
+        self.disconnected = disconnected  # async probe for a client disconnect
+        self.counted = counted  # whether cancelling counts as a cancelled request
+        self.reason: Optional[str] = None
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    def cancel(self, reason: str) -> None:
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+        if self.counted:
+            cancellation_registry.record(reason)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    @property
+    def cancelled(self) -> bool:
+        if self.reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(DEADLINE_EXCEEDED)
+        return self.reason is not None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline, or None without one"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise RequestCancelledError(self.reason)
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Run callback on cancellation (right away if already cancelled); returns an unregister function"""
+        with self._lock:
+            if self.reason is None:
+                self._callbacks.append(callback)
+                return functools.partial(self._discard, callback)
+        callback()
+        return lambda: None
+
+    def _discard(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    async def guard(self, future: "asyncio.Future[T]", poll_interval: float) -> T:
+        """
+        Await a worker's result, cancelling the token if the client disconnects
+        or the deadline passes first. The worker is then aborted through the
+        registered callbacks and this raises RequestCancelledError right away.
+        """
+        try:
+            while True:
+                timeout = poll_interval
+                remaining = self.remaining()
+                if remaining is not None:
+                    timeout = min(timeout, remaining)
+                done, _ = await asyncio.wait({future}, timeout=timeout)
+                if done:
+                    return future.result()
+                if not self.cancelled and self.disconnected is not None and await self.disconnected():
+                    self.cancel(CLIENT_DISCONNECTED)
+                if self.cancelled:
+                    future.cancel()
+                    raise RequestCancelledError(self.reason)
+        except asyncio.CancelledError:
+            # The response itself was torn down, e.g. a stream whose client went away
+            self.cancel(CLIENT_DISCONNECTED)
+            raise
+
+
+# Set by the API layer per request and copied into worker threads with the request context
+request_cancellation: ContextVar[Optional[CancellationToken]] = ContextVar("request_cancellation", default=None)
+
+# Token of the Ollama generation being sent from this context, read by the httpx request hook
+_generation: ContextVar[Optional[CancellationToken]] = ContextVar("generation_cancellation", default=None)
+
+
+def _shutdown(sock: socket.socket) -> None:
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def _trace(token: CancellationToken):
+    def trace(event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            sock = info["return_value"].get_extra_info("socket")
+            if sock is not None:
+                token.on_cancel(functools.partial(_shutdown, sock))
+    return trace
+
+
+def _attach(request: httpx.Request) -> None:
+    token = _generation.get()
+    if token is not None:
+        request.extensions["trace"] = _trace(token)
+
+
+def enable_cancellation(llm) -> None:
+    """
+    Let cancellation abort the model's generations mid-request.
+
+    Generations are streamed on the model's synchronous httpx client. Its
+    requests are traced so the socket of each generation is registered with
+    the generation's token; cancelling shuts the socket down, which wakes the
+    thread blocked on it (even before the first token) and makes Ollama stop
+    generating. Closing the response alone would not wake that thread.
+    """
+    client = llm._client._client
+    client.event_hooks = {**client.event_hooks, "request": [*client.event_hooks["request"], _attach]}
+
+
+def abortable(stream: Iterator[T], token: CancellationToken) -> Iterator[T]:
+    """
+    Iterate an Ollama response stream under a cancellation token: the
+    iteration stops with RequestCancelledError as soon as the token is
+    cancelled, and the stream is closed however the iteration ends.
+    """
+    with closing(stream):
+        while True:
+            previous = _generation.set(token)
+            try:
+                item = next(stream)
+            except StopIteration:
+                return
+            except Exception:
+                if token.cancelled:
+                    # The stream was shut down by the cancellation, not by a backend failure
+                    raise RequestCancelledError(token.reason) from None
+                raise
+            finally:
+                _generation.reset(previous)
+            token.check()
+            yield item
+
+
+class CancellationRegistry:
+    """
+    Requests that can be cancelled by ID, and cancellation statistics.
+
+    Tokens are held weakly, so a request drops out of the registry as soon as
+    nothing is working on it any more.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens: "weakref.WeakValueDictionary[str, CancellationToken]" = weakref.WeakValueDictionary()
+        self._stats: Dict[str, int] = {
+            CLIENT_DISCONNECTED: 0,
+            DEADLINE_EXCEEDED: 0,
+            CANCELLED_BY_CLIENT: 0,
+            "withdrawn_from_queue": 0,
+            "aborted_generations": 0,
+        }
+
+    def register(self, request_id: str, token: CancellationToken) -> None:
+        with self._lock:
+            self._tokens[request_id] = token
+
+    def request_ids(self) -> List[str]:
+        """IDs of the cancellable requests in progress in this process"""
+        with self._lock:
+            return list(self._tokens.keys())
+
+    def cancel(self, request_id: str) -> bool:
+        """Cancel a request by ID; False if no such request is in progress here"""
+        with self._lock:
+            token = self._tokens.get(request_id)
+        if token is None:
+            return False
+        token.cancel(CANCELLED_BY_CLIENT)
+        return True
+
+    def record(self, event: str) -> None:
+        with self._lock:
+            self._stats[event] = self._stats.get(event, 0) + 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"cancellable": len(self._tokens), **self._stats}
+
+
+# Create a singleton instance
+cancellation_registry = CancellationRegistry()
@@ -1,38 +1,46 @@
 from langchain_core.prompts import PromptTemplate
 from langchain.chains import LLMChain
-from typing import Dict, Any
+from contextlib import closing
+from typing import Dict, Any, Iterator, Optional, Tuple
 import time
 
-from .modelRegistry import get_model_for_task
+from .backendPool import backend_pool
+from .cancellation import CancellationToken, RequestCancelledError, abortable, cancellation_registry, request_cancellation
+from .healthMonitor import BACKEND_ERRORS, BackendUnavailableError, health_monitor
+from .metrics import metrics
+from .modelConfiguration import OllamaModelConfig
+from .modelPool import model_pool
+from .modelResidency import model_residency
+from .modelRegistry import get_config_for_task
 from .modelTask import ModelTask
+from .outputGuard import GuardStop, create_output_guard
+from .responseCache import response_cache
+from .scheduler import QueueFullError, request_scheduler
+from .sharedState import shared_state
+from .singleFlight import single_flight
+from .tokenBudget import TokenBudget, compact_code, estimate_tokens, plan_budget
 from .tools import CodeLanguageDetectionTool
+from .tracing import annotate, ollama_timings, span
+from app.utils.settings import settings
+from app.utils.structuredLog import get_logger
+
+logger = get_logger("chains")
 
 # Initialize language detection tool for code analysis
 language_detector = CodeLanguageDetectionTool()
 
-def create_code_explanation_chain() -> LLMChain:
-    """
-    Creates a chain for explaining code.
-    
-    This chain takes code as input and provides a detailed explanation
-    of how the code works in natural language.
-    
-    Returns:
-        LLMChain: A chain for code explanation
-    """
-    llm = get_model_for_task(ModelTask.CODE_EXPLANATION)
-    
-    prompt = PromptTemplate(
-        template="""
+# Prompt templates are parsed once at import time and shared by all chains
+EXPLANATION_PROMPT = PromptTemplate(
+    template="""
         # System: You are an expert programming teacher and code explainer.
-        
+
         # Task: Explain the following code in a clear, organized manner.
-        
+
         # Input:
         ```{language}
         {code}
         ```
-        
+
         # Instructions:
         1. First, explain the overall purpose of the code
         2. Break down the key components and how they work together
@@ -40,23 +48,73 @@ def create_code_explanation_chain() -> LLMChain:
         4. Note any potential issues, optimizations, or best practices relevant to this code
         5. Keep your explanation concise but thorough
         6. Suggest possible debugger code where it may help
-        
+
         # Output your explanation:
         """,
-        input_variables=["code", "language"],
-    )
-    
-    from langchain_core.output_parsers import StrOutputParser
-    from operator import itemgetter
+    input_variables=["code", "language"],
+)
 
-    chain = prompt | llm | StrOutputParser()
-    return lambda inputs: {"explanation": chain.invoke(inputs)}
+# Map step of map-reduce explanation: one chunk of a large file. The prompt
+# depends only on the chunk, so an unchanged chunk is served from the cache.
+CHUNK_EXPLANATION_PROMPT = PromptTemplate(
+    template="""
+        # System: You are an expert programming teacher and code explainer.
 
-def create_code_generation_chain():
-    """Creates a chain for generating code based on text descriptions"""
-    llm = get_model_for_task(ModelTask.CODE_GENERATION)
-    
-    prompt_template = """# System: You are an expert programmer. Generate code in the exact programming language requested.
+        # Task: The following {language} code is one part of a larger file. Explain what it does.
+
+        # Input:
+        ```{language}
+        {code}
+        ```
+
+        # Instructions:
+        1. Describe the purpose of each function, class or block in this part
+        2. Mention what it depends on and what other code would use it for
+        3. Note any potential issues in this part
+        4. Keep it short; these notes are combined with notes on the rest of the file
+
+        # Output your notes:
+        """,
+    input_variables=["code", "language"],
+)
+
+# Reduce step: combines notes on parts of a file, either into a shorter set of
+# notes or, at the top level, into the explanation of the whole file
+SUMMARY_PROMPT = PromptTemplate(
+    template="""
+        # System: You are an expert programming teacher and code explainer.
+
+        # Task: Below are notes on consecutive parts of one {language} file. {goal}
+
+        # Notes:
+        {notes}
+
+        # Instructions:
+        {instructions}
+
+        # Output:
+        """,
+    input_variables=["language", "notes", "goal", "instructions"],
+)
+
+SUMMARY_GOALS = {
+    "final": (
+        "Explain the whole file in a clear, organized manner.",
+        """1. First, explain the overall purpose of the code
+        2. Break down the key components and how they work together
+        3. Explain any important algorithms, patterns, or techniques used
+        4. Note any potential issues, optimizations, or best practices relevant to this code
+        5. Keep your explanation concise but thorough""",
+    ),
+    "partial": (
+        "Combine them into one shorter set of notes.",
+        """1. Keep every component and how it relates to the others
+        2. Keep any potential issues that were noted
+        3. Drop repetition""",
+    ),
+}
+
+GENERATION_PROMPT = """# System: You are an expert programmer. Generate code in the exact programming language requested.
 
 # Task: Write code in {language} that accomplishes the following:
 {description}
@@ -65,45 +123,26 @@ def create_code_generation_chain():
 1. Use ONLY {language} syntax
 2. Include helpful comments
 3. Ensure the code is complete and working
-4. Do not include markdown code blocks or language tags
+4. Do not include markdown code blocks or language tags{style}
 
 # Response (write only the code):
 """
-    
-    def generate_code(inputs: Dict[str, Any]) -> Dict[str, str]:
-        try:
-            formatted_prompt = prompt_template.format(
-                language=inputs.get("language", "python"),
-                description=inputs.get("description", "")
-            )
-            
-            # Try to get response from model
-            result = llm.invoke(formatted_prompt)
-            print(f"Debug: Raw response:\n{result}")
-            
-            if result and len(result.strip()) > 0:
-                return {"code": result.strip()}
-            
-            return {"code": "// Error: No code generated"}
-                
-        except Exception as e:
-            print(f"Error in code generation: {str(e)}")
-            return {"code": f"// Error generating code: {str(e)}"}
-    
-    return generate_code
 
-def create_code_translation_chain():
-    """Creates a chain for translating code between programming languages"""
-    llm = get_model_for_task(ModelTask.CODE_TRANSLATION)
-    detector = CodeLanguageDetectionTool()
-    
-    prompt = PromptTemplate(
-        template="""# System: You are an expert code translator.
-
-# Task: Translate the following code from {source_language} to {target_language}.
+# The translation prompt is split so everything that depends only on the source
+# comes first. Translating one snippet into several languages renders that prefix
+# once, and Ollama can reuse its evaluated prompt prefix between the targets.
+TRANSLATION_PROMPT_PREFIX = PromptTemplate(
+    template="""# System: You are an expert code translator.
 
 Original code ({source_language}):
 {code}
+""",
+    input_variables=["code", "source_language"]
+)
+
+TRANSLATION_PROMPT_SUFFIX = PromptTemplate(
+    template="""
+# Task: Translate the code above from {source_language} to {target_language}.
 
 # Requirements:
 1. Write ONLY the translated code in {target_language}
@@ -113,28 +152,525 @@ Original code ({source_language}):
 5. Do not include markdown code blocks or language tags
 
 # Write the {target_language} code now:""",
-        input_variables=["code", "source_language", "target_language"]
+    input_variables=["source_language", "target_language"]
+)
+
+# Used for one part of a file that is too large to translate in a single pass
+CHUNK_TRANSLATION_PROMPT = PromptTemplate(
+    template="""# System: You are an expert code translator working through a large {source_language} file part by part.
+
+Context from the file (imports and top-level signatures, for reference only):
+{context}
+
+Part to translate ({source_language}):
+{code}
+
+# Task: Translate only the part above from {source_language} to {target_language}.
+
+# Requirements:
+1. Write ONLY the translated code for this part in {target_language}
+2. Do not repeat imports or definitions that belong to other parts
+3. Keep the names from the context so the parts fit together
+4. Include equivalent comments
+5. Do not include markdown code blocks or language tags
+
+# Write the {target_language} code now:""",
+    input_variables=["code", "context", "source_language", "target_language"]
+)
+
+# Errors that must reach the API layer instead of becoming an error string
+REJECTION_ERRORS = (BackendUnavailableError, QueueFullError, RequestCancelledError)
+
+def _produce(
+    task: ModelTask,
+    config: OllamaModelConfig,
+    llm,
+    prompt_text: str,
+    cache_key: str,
+    options: Optional[Dict[str, Any]] = None,
+    token: Optional[CancellationToken] = None,
+    input_tokens: int = 0,
+) -> Iterator[str]:
+    """
+    Stream one generation from Ollama once the scheduler grants a backend slot,
+    failing fast while the backend is known to be down. Connection failures
+    are reported to the circuit breaker and a completed result is cached.
+    `options` replaces the model's Ollama options for this call. Cancelling
+    `token` withdraws the request from the queue or aborts the HTTP stream,
+    which releases the slot straight away.
+
+    The backend pool picks the Ollama node; a connection failure before any
+    text was produced is retried on another node (up to backend_retries).
+
+    The output guard watches the decode; when it trips, the stream is closed
+    (aborting the generation) and a GuardStop is yielded last. A stopped
+    generation is not cached: a later hit could not report its stop_reason,
+    and the next request may well produce a complete answer.
+
+    A half-open breaker's trial that never got an answer from Ollama (the
+    queue was full or the request was cancelled) is released, so the next
+    request can test the backend instead.
+    """
+    trial = health_monitor.ensure_available()
+    token = token or CancellationToken()
+    guard = create_output_guard(task, input_tokens)
+    parts = []
+    call_kwargs = {"options": options} if options else {}
+    final_info = None
+    started = time.monotonic()
+    outcome = "error"
+    tried = []
+    try:
+        with request_scheduler.slot(task, llm.model):
+            try:
+                while True:
+                    token.check()
+                    try:
+                        with backend_pool.lease(llm.model, tried) as backend:
+                            # The pooled model already talks to this node unless several are configured
+                            node_llm = llm if (llm.base_url or "").rstrip("/") == backend.url else model_pool.get_model(task, config, backend.url)
+                            with span("llm_call", task=task.value, model=llm.model, backend=backend.url) as attributes:
+                                # _stream rather than stream: its last chunk carries Ollama's statistics
+                                with closing(abortable(node_llm._stream(prompt_text, **call_kwargs), token)) as stream:
+                                    for chunk in stream:
+                                        if chunk.generation_info:
+                                            final_info = chunk.generation_info
+                                        text = guard.feed(chunk.text) if guard is not None and chunk.text else chunk.text
+                                        if text:
+                                            parts.append(text)
+                                            yield text
+                                        if guard is not None and guard.stop is not None:
+                                            # Closing the stream aborts the rest of the decode
+                                            attributes["stop_reason"] = guard.stop.reason
+                                            break
+                                attributes.update(ollama_timings(final_info))
+                        break
+                    except BACKEND_ERRORS as e:
+                        # Text already sent cannot be taken back, so only a clean failure moves nodes
+                        tried.append(backend)
+                        if parts or len(tried) > settings.backend_retries or not backend_pool.can_retry(llm.model, tried):
+                            raise
+                        logger.warning("backend failed, retrying on another node", extra={
+                            "backend": backend.url, "model": llm.model, "error": type(e).__name__,
+                        })
+            except RequestCancelledError:
+                cancellation_registry.record("aborted_generations")
+                outcome = "cancelled"
+                raise
+        outcome = "ok" if guard is None or guard.stop is None else "stopped"
+    except BACKEND_ERRORS:
+        health_monitor.record_failure()
+        raise
+    except (RequestCancelledError, GeneratorExit):
+        # GeneratorExit: the consumer stopped reading, e.g. every coalesced client went away
+        outcome = "cancelled"
+        raise
+    except (QueueFullError, BackendUnavailableError):
+        outcome = "rejected"
+        raise
+    finally:
+        metrics.observe_generation(task.value, llm.model, outcome, time.monotonic() - started, final_info)
+        if trial and outcome not in ("ok", "stopped"):
+            # No-op after a backend failure, which has already reopened the breaker
+            health_monitor.release_trial()
+    health_monitor.record_success()
+    model_residency.record(llm.model, final_info, backend.url)
+
+    if guard is not None:
+        rest = guard.finish()
+        if rest:
+            parts.append(rest)
+            yield rest
+    result = "".join(parts)
+    if guard is not None and guard.stop is not None:
+        yield guard.stop
+        return
+    if settings.cache_enabled and result.strip():
+        response_cache.set(cache_key, result, task)
+
+def _stream_generate(
+    task: ModelTask,
+    config: OllamaModelConfig,
+    llm,
+    prompt_text: str,
+    language: str,
+    use_cache: bool = True,
+    budget: Optional[TokenBudget] = None,
+    report: Optional[Dict[str, Any]] = None,
+) -> Iterator[str]:
+    """
+    Yield text chunks of a generation as they are decoded.
+
+    A cache hit is yielded as a single chunk. With use_cache=False the lookup
+    is skipped but the fresh result still replaces the cached entry; empty
+    responses are never cached. Identical concurrent requests share one
+    generation unless coalescing is disabled for the task. With a budget, the
+    output limit is the one sized for this prompt. The request's cancellation
+    token aborts the generation (a shared one only once every request on it
+    has been cancelled).
+
+    `report` receives the `cache_key` of the response, which DELETE
+    /api/cache/{key} invalidates. When the output guard stops the
+    generation, it also receives the `stop_reason` and `clean_chars`, the
+    length of the usable output; text already yielded past that point
+    should be discarded.
+    """
+    key = response_cache.make_key(task, config, prompt_text, language)
+    if report is not None:
+        report["cache_key"] = key
+    if settings.cache_enabled and use_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            annotate(cache_hit=True)
+            yield cached
+            return
+
+    options = config.options(num_predict=budget.num_predict) if budget is not None else None
+    input_tokens = budget.code_tokens if budget is not None else 0
+    start = lambda token: _produce(task, config, llm, prompt_text, key, options, token, input_tokens)
+    if task.value in settings.singleflight_disabled_tasks:
+        chunks = start(request_cancellation.get())
+    else:
+        if shared_state.enabled:
+            # Another API process may already be generating this; then wait for its cached result
+            produce = start
+            start = lambda token: shared_state.coalesce(
+                key, lambda: produce(token), lambda: response_cache.get(key), token
+            )
+        chunks = single_flight.stream(key, start)
+    for chunk in chunks:
+        if isinstance(chunk, GuardStop):
+            if report is not None:
+                report.update(stop_reason=chunk.reason, clean_chars=chunk.clean_chars)
+            continue
+        yield chunk
+
+def _generate(
+    task: ModelTask,
+    config: OllamaModelConfig,
+    llm,
+    prompt_text: str,
+    language: str,
+    use_cache: bool = True,
+    budget: Optional[TokenBudget] = None,
+    report: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Run a generation to completion, cut to its clean output; see _stream_generate"""
+    report = {} if report is None else report
+    result = "".join(_stream_generate(task, config, llm, prompt_text, language, use_cache, budget, report))
+    if "clean_chars" in report:
+        result = result[:report["clean_chars"]]
+    return result
+
+def _prepare(
+    task: ModelTask,
+    config: OllamaModelConfig,
+    render,
+    inputs: Dict[str, Any],
+) -> Tuple[str, str, TokenBudget]:
+    """
+    Render a prompt and fit it to the model's context window; returns
+    (prompt, language, budget). Code that does not fit is compacted by
+    dropping comments and blank lines. If it still does not fit, the budget
+    says so; callers that can split the input switch to chunked mode first.
+    """
+    started = time.monotonic()
+    try:
+        with span("prompt_render", task=task.value) as attributes:
+            prompt_text, language, budget = _fit(task, config, render, inputs)
+            attributes.update(prompt_tokens=budget.prompt_tokens, fitting=budget.fitting)
+            return prompt_text, language, budget
+    finally:
+        metrics.observe_stage("prompt_render", time.monotonic() - started, task.value)
+
+def _fit(
+    task: ModelTask,
+    config: OllamaModelConfig,
+    render,
+    inputs: Dict[str, Any],
+) -> Tuple[str, str, TokenBudget]:
+    prompt_text, language = render(inputs)
+    code = inputs.get("code") or ""
+    # A reduce step has no code: its answer (and output guard) is sized on the notes it combines
+    budget = plan_budget(task, config, prompt_text, code or inputs.get("notes") or "")
+    if budget.fits or not code:
+        return prompt_text, language, budget
+
+    compacted = compact_code(code, language)
+    if compacted == code:
+        return prompt_text, language, budget
+    # A pre-rendered prompt prefix holds the original code, so render from scratch
+    fitted = {key: value for key, value in inputs.items() if key != "prompt_prefix"}
+    fitted["code"] = compacted
+    prompt_text, language = render(fitted)
+    budget = plan_budget(task, config, prompt_text, compacted)
+    return prompt_text, language, budget.model_copy(update={
+        "fitting": "compacted" if budget.fits else "overflow",
+        "original_code_tokens": estimate_tokens(code),
+    })
+
+def _render_explanation(inputs: Dict[str, Any]) -> Tuple[str, str]:
+    """Render the explanation prompt; returns (prompt, language)"""
+    language = inputs["language"]
+    return EXPLANATION_PROMPT.format(code=inputs["code"], language=language), language
+
+def _render_chunk_explanation(inputs: Dict[str, Any]) -> Tuple[str, str]:
+    """Render the map-step prompt for one chunk; returns (prompt, language)"""
+    language = inputs["language"]
+    return CHUNK_EXPLANATION_PROMPT.format(code=inputs["code"], language=language), language
+
+def _render_summary(inputs: Dict[str, Any]) -> Tuple[str, str]:
+    """Render a reduce-step prompt; returns (prompt, language)"""
+    language = inputs["language"]
+    goal, instructions = SUMMARY_GOALS["final" if inputs.get("final") else "partial"]
+    return SUMMARY_PROMPT.format(
+        language=language,
+        notes=inputs["notes"],
+        goal=goal,
+        instructions=instructions
+    ), language
+
+def _render_style(inputs: Dict[str, Any]) -> str:
+    """
+    The style requirement for the generation prompt, from the style
+    preferences merged into the inputs. Being part of the prompt, the style
+    is also part of the response cache key.
+    """
+    if "indentation" not in inputs:
+        return ""
+    if inputs["indentation"] == "tabs":
+        indentation = "indent with tabs"
+    else:
+        indentation = f"indent with {inputs.get('indent_size', 4)} spaces"
+    return (
+        f"\n5. Follow this code style: {indentation}, keep lines under "
+        f"{inputs.get('max_line_length', 80)} characters, use {inputs.get('naming_convention', 'snake_case')} names"
     )
-    
-    def translate(inputs: Dict[str, Any]) -> Dict[str, str]:
+
+def _render_generation(inputs: Dict[str, Any]) -> Tuple[str, str]:
+    """Render the generation prompt; returns (prompt, target language)"""
+    language = inputs.get("language", "python")
+    return GENERATION_PROMPT.format(
+        language=language,
+        description=inputs.get("description", ""),
+        style=_render_style(inputs)
+    ), language
+
+def render_translation_prefix(code: str, source_language: str) -> str:
+    """Render the target-independent part of the translation prompt"""
+    return TRANSLATION_PROMPT_PREFIX.format(code=code, source_language=source_language)
+
+def _render_translation(inputs: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Detect the source language and render the translation prompt; returns (prompt, source language).
+    A pre-rendered `prompt_prefix` and `source_language` are reused when given.
+    """
+    source_language = inputs.get("source_language") or language_detector._run(inputs["code"])
+    prefix = inputs.get("prompt_prefix") or render_translation_prefix(inputs["code"], source_language)
+    return prefix + TRANSLATION_PROMPT_SUFFIX.format(
+        source_language=source_language,
+        target_language=inputs["target_language"]  # Use the requested target language
+    ), source_language
+
+def _render_chunk_translation(inputs: Dict[str, Any]) -> Tuple[str, str]:
+    """Render the prompt for one chunk of a file; returns (prompt, source language)"""
+    source_language = inputs["source_language"]
+    return CHUNK_TRANSLATION_PROMPT.format(
+        code=inputs["code"],
+        context=inputs.get("context") or "(none)",
+        source_language=source_language,
+        target_language=inputs["target_language"]
+    ), source_language
+
+def _build_explanation_chain(llm, config: OllamaModelConfig):
+    def explain(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        prompt_text, language, budget = _prepare(ModelTask.CODE_EXPLANATION, config, _render_explanation, inputs)
+        report = {}
+        return {"explanation": _generate(
+            ModelTask.CODE_EXPLANATION, config, llm, prompt_text,
+            language, inputs.get("use_cache", True), budget, report
+        ), "budget": budget.model_dump(), "stop_reason": report.get("stop_reason"), "cache_key": report.get("cache_key")}
+
+    return explain
+
+def _build_explanation_step_chain(render):
+    """Builder for the map and reduce steps of map-reduce explanation"""
+    def build(llm, config: OllamaModelConfig):
+        def explain_step(inputs: Dict[str, Any]) -> Dict[str, Any]:
+            prompt_text, language, budget = _prepare(ModelTask.CODE_EXPLANATION, config, render, inputs)
+            return {"explanation": _generate(
+                ModelTask.CODE_EXPLANATION, config, llm, prompt_text,
+                language, inputs.get("use_cache", True), budget
+            ).strip(), "budget": budget.model_dump()}
+
+        return explain_step
+
+    return build
+
+def _build_generation_chain(llm, config: OllamaModelConfig):
+    def generate_code(inputs: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            # Detect source language
-            source_language = detector._run(inputs["code"])
-            
-            # Format prompt with correct source and target languages
-            result = llm.invoke(prompt.format(
-                code=inputs["code"],
-                source_language=source_language,
-                target_language=inputs["target_language"]  # Use the requested target language
-            ))
-            
+            formatted_prompt, language, budget = _prepare(
+                ModelTask.CODE_GENERATION, config, _render_generation, inputs
+            )
+
+            # Try to get response from model (or the response cache)
+            report = {}
+            result = _generate(
+                ModelTask.CODE_GENERATION, config, llm, formatted_prompt,
+                language, inputs.get("use_cache", True), budget, report
+            )
+
             if result and len(result.strip()) > 0:
-                return {"translated_code": result.strip()}
-            
-            return {"translated_code": "# Error: No translation generated"}
-                
+                return {
+                    "code": result.strip(),
+                    "budget": budget.model_dump(),
+                    "stop_reason": report.get("stop_reason"),
+                    "cache_key": report.get("cache_key")
+                }
+
+            return {"code": "// Error: No code generated", "budget": budget.model_dump()}
+
+        except REJECTION_ERRORS:
+            raise
         except Exception as e:
-            print(f"Translation error: {str(e)}")
+            if inputs.get("raise_errors"):
+                raise
+            logger.warning("code generation failed", extra={"error": str(e)})
+            return {"code": f"// Error generating code: {str(e)}"}
+
+    return generate_code
+
+def _build_translation_chain(llm, config: OllamaModelConfig):
+    def translate(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            # Detect source language and format prompt with correct source and target languages
+            formatted_prompt, source_language, budget = _prepare(
+                ModelTask.CODE_TRANSLATION, config, _render_translation, inputs
+            )
+            report = {}
+            result = _generate(
+                ModelTask.CODE_TRANSLATION, config, llm, formatted_prompt,
+                source_language, inputs.get("use_cache", True), budget, report
+            )
+
+            if result and len(result.strip()) > 0:
+                return {
+                    "translated_code": result.strip(),
+                    "source_language": source_language,
+                    "budget": budget.model_dump(),
+                    "stop_reason": report.get("stop_reason"),
+                    "cache_key": report.get("cache_key")
+                }
+
+            return {
+                "translated_code": "# Error: No translation generated",
+                "source_language": source_language,
+                "budget": budget.model_dump()
+            }
+
+        except REJECTION_ERRORS:
+            raise
+        except Exception as e:
+            if inputs.get("raise_errors"):
+                raise
+            logger.warning("code translation failed", extra={"error": str(e)})
             return {"translated_code": f"# Error: {str(e)}"}
-    
+
     return translate
+
+def _build_chunk_translation_chain(llm, config: OllamaModelConfig):
+    def translate_chunk(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        # Errors propagate: one failed chunk fails the whole file
+        formatted_prompt, source_language, budget = _prepare(
+            ModelTask.CODE_TRANSLATION, config, _render_chunk_translation, inputs
+        )
+        result = _generate(
+            ModelTask.CODE_TRANSLATION, config, llm, formatted_prompt,
+            source_language, inputs.get("use_cache", True), budget
+        )
+        return {"translated_code": result.strip(), "budget": budget.model_dump()}
+
+    return translate_chunk
+
+def _pooled_chain(name: str, task: ModelTask, builder, profile: Optional[str] = None):
+    """Fetch a compiled chain for a performance profile from the process-wide pool"""
+    with span("chain_construction", chain=name, task=task.value):
+        return model_pool.get_chain(name, task, get_config_for_task(task, profile), builder)
+
+def create_code_explanation_chain(profile: Optional[str] = None) -> LLMChain:
+    """
+    Creates a chain for explaining code.
+
+    This chain takes code as input and provides a detailed explanation
+    of how the code works in natural language. The chain is built once
+    and reused from the model pool.
+
+    Args:
+        profile: Performance profile name; defaults to the deployment setting
+
+    Returns:
+        LLMChain: A chain for code explanation
+    """
+    return _pooled_chain("explanation", ModelTask.CODE_EXPLANATION, _build_explanation_chain, profile)
+
+def create_chunk_explanation_chain(profile: Optional[str] = None):
+    """Creates the map-step chain that explains one chunk of a large file"""
+    return _pooled_chain(
+        "chunk_explanation", ModelTask.CODE_EXPLANATION,
+        _build_explanation_step_chain(_render_chunk_explanation), profile
+    )
+
+def create_explanation_summary_chain(profile: Optional[str] = None):
+    """Creates the reduce-step chain that combines chunk explanations"""
+    return _pooled_chain(
+        "explanation_summary", ModelTask.CODE_EXPLANATION,
+        _build_explanation_step_chain(_render_summary), profile
+    )
+
+def create_code_generation_chain(profile: Optional[str] = None):
+    """Creates a chain for generating code based on text descriptions"""
+    return _pooled_chain("generation", ModelTask.CODE_GENERATION, _build_generation_chain, profile)
+
+def create_code_translation_chain(profile: Optional[str] = None):
+    """Creates a chain for translating code between programming languages"""
+    return _pooled_chain("translation", ModelTask.CODE_TRANSLATION, _build_translation_chain, profile)
+
+def create_chunk_translation_chain(profile: Optional[str] = None):
+    """Creates a chain for translating one part of a file with shared context from the rest"""
+    return _pooled_chain("chunk_translation", ModelTask.CODE_TRANSLATION, _build_chunk_translation_chain, profile)
+
+def _stream_task(task: ModelTask, render, inputs: Dict[str, Any]) -> Tuple[str, Iterator[str], TokenBudget]:
+    # A `report` dict in the inputs receives the cache key, and the stop reason if the output guard stops the generation
+    with span("chain_construction", chain="stream", task=task.value):
+        config = get_config_for_task(task, inputs.get("profile"))
+        llm = model_pool.get_model(task, config)
+    prompt_text, language, budget = _prepare(task, config, render, inputs)
+    return language, _stream_generate(
+        task, config, llm, prompt_text, language, inputs.get("use_cache", True), budget, inputs.get("report")
+    ), budget
+
+def stream_code_explanation(inputs: Dict[str, Any]) -> Tuple[str, Iterator[str], TokenBudget]:
+    """
+    Streams an explanation token by token.
+
+    Returns:
+        Tuple of the code language, an iterator of text chunks and the token budget
+    """
+    return _stream_task(ModelTask.CODE_EXPLANATION, _render_explanation, inputs)
+
+def stream_chunk_translation(inputs: Dict[str, Any]) -> Tuple[str, Iterator[str], TokenBudget]:
+    """Streams the translation of one part of a file (`code` with shared `context`); see stream_code_translation"""
+    return _stream_task(ModelTask.CODE_TRANSLATION, _render_chunk_translation, inputs)
+
+def stream_explanation_summary(inputs: Dict[str, Any]) -> Tuple[str, Iterator[str], TokenBudget]:
+    """Streams a reduce step of map-reduce explanation (its `notes`); returns the language, text chunks and budget"""
+    return _stream_task(ModelTask.CODE_EXPLANATION, _render_summary, inputs)
+
+def stream_code_generation(inputs: Dict[str, Any]) -> Tuple[str, Iterator[str], TokenBudget]:
+    """Streams generated code; returns the target language, an iterator of text chunks and the budget"""
+    return _stream_task(ModelTask.CODE_GENERATION, _render_generation, inputs)
+
+def stream_code_translation(inputs: Dict[str, Any]) -> Tuple[str, Iterator[str], TokenBudget]:
+    """Streams a translation; returns the detected source language, an iterator of text chunks and the budget"""
+    return _stream_task(ModelTask.CODE_TRANSLATION, _render_translation, inputs)
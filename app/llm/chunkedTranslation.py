@@ -0,0 +1,201 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Set, TypeVar
+
+from pydantic import BaseModel
+
+from app.utils.settings import settings
+from .chains import create_chunk_translation_chain, create_code_translation_chain, language_detector
+from .codeChunker import plan_chunks
+from .modelConfiguration import OllamaModelConfig
+from .modelRegistry import get_config_for_task
+from .modelTask import ModelTask
+from .tokenBudget import chars_for_tokens, estimate_tokens, fits_in_context, max_code_tokens
+
+# Smallest chunk worth a generation of its own, in characters
+MIN_CHUNK_CHARS = 200
+
+# Called with (completed, total) generations as a long-running call advances
+ProgressCallback = Callable[[int, int], None]
+
+T = TypeVar("T")
+
+
+class ChunkPool:
+    """
+    Runs the chunks of one request in parallel, up to `workers` at a time.
+
+    Every call gets threads of its own instead of sharing a fixed pool, so
+    one request's chunks never wait behind another's in a FIFO executor:
+    all of them reach the request scheduler, which orders them by the
+    caller's priority and client like any other generation.
+    """
+    def __init__(self, workers: int, name: str):
+        self.workers = workers
+        self.name = name
+        self._lock = threading.Lock()
+        self._active: Set[ThreadPoolExecutor] = set()
+        self._closed = False
+
+    def map(self, fn: Callable[[Any], T], items: List[Any], on_result: Optional[Callable[[], None]] = None) -> List[T]:
+        """fn over items in parallel, results in order; each runs in a copy of the caller's context"""
+        pool = ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(items))), thread_name_prefix=self.name)
+        with self._lock:
+            if self._closed:
+                pool.shutdown()
+                raise RuntimeError(f"{self.name} is shut down")
+            self._active.add(pool)
+        try:
+            futures = [pool.submit(contextvars.copy_context().run, fn, item) for item in items]
+            results = []
+            for future in futures:
+                results.append(future.result())
+                if on_result is not None:
+                    on_result()
+            return results
+        finally:
+            # On an error the chunks not started yet are dropped
+            pool.shutdown(wait=False, cancel_futures=True)
+            with self._lock:
+                self._active.discard(pool)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            pools, self._active = self._active, set()
+        for pool in pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ChunkedTranslation(BaseModel):
+    """Result of translating a whole file"""
+    code: str
+    source_language: str
+    target_language: str
+    chunks: int
+    method: str
+    elapsed_ms: float
+
+
+def chunk_budget(config: OllamaModelConfig, code: str) -> int:
+    """
+    Largest chunk of `code` in characters. The prompt (chunk plus shared
+    context) and the translated output share the model's context window; the
+    chunk gets whatever the token estimator says fits next to the context,
+    converted to characters at this file's own density.
+    """
+    if settings.translation_chunk_chars:
+        return settings.translation_chunk_chars
+    context_tokens = estimate_tokens(code[:settings.translation_context_chars])
+    return max(MIN_CHUNK_CHARS, chars_for_tokens(code, max_code_tokens(ModelTask.CODE_TRANSLATION, config, context_tokens)))
+
+
+def join_translations(parts: List[str]) -> str:
+    """Reassemble translated chunks in order"""
+    return "\n\n".join(part for part in parts if part) + "\n"
+
+
+class ChunkedTranslator:
+    """
+    Translates files of any size by splitting them at function and class
+    boundaries, translating the chunks in parallel with the file's imports
+    and signatures as shared context, and joining the results in order.
+
+    Up to `workers` chunks of a file (by default the inference slots) run at
+    once, so one large file can keep every slot busy while the scheduler
+    still bounds Ollama concurrency and serves interactive requests first.
+    """
+    def __init__(self, workers: int):
+        self._pool = ChunkPool(workers, "chunk-translation")
+
+    def translate(
+        self,
+        code: str,
+        target_language: str,
+        source_language: Optional[str] = None,
+        profile: Optional[str] = None,
+        use_cache: bool = True,
+        progress: Optional[ProgressCallback] = None,
+    ) -> ChunkedTranslation:
+        started = time.perf_counter()
+        source_language = source_language or language_detector._run(code)
+        config = get_config_for_task(ModelTask.CODE_TRANSLATION, profile)
+        # Split exactly when the single-pass prompt would overflow, by the same estimate
+        if fits_in_context(ModelTask.CODE_TRANSLATION, config, code, source_language):
+            plan = plan_chunks(code, source_language, len(code))
+        else:
+            plan = plan_chunks(code, source_language, chunk_budget(config, code))
+
+        def finish(translated: str, chunks: int) -> ChunkedTranslation:
+            return ChunkedTranslation(
+                code=translated,
+                source_language=source_language,
+                target_language=target_language,
+                chunks=chunks,
+                method=plan.method,
+                elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+            )
+
+        if len(plan.chunks) <= 1:
+            # Small enough (or impossible to split): the regular single-pass translation
+            result = create_code_translation_chain(profile)({
+                "code": code,
+                "source_language": source_language,
+                "target_language": target_language,
+                "use_cache": use_cache,
+                "raise_errors": True
+            })
+            if progress is not None:
+                progress(1, 1)
+            return finish(result["translated_code"], 1)
+
+        # The file header travels with the first chunk so its imports are translated once
+        texts = [plan.header + plan.chunks[0].text] + [chunk.text for chunk in plan.chunks[1:]]
+        parts = self.translate_chunks(
+            texts, plan.context(settings.translation_context_chars),
+            source_language, target_language, profile, use_cache, progress
+        )
+        return finish(join_translations(parts), len(parts))
+
+    def translate_chunks(
+        self,
+        texts: List[str],
+        context: str,
+        source_language: str,
+        target_language: str,
+        profile: Optional[str] = None,
+        use_cache: bool = True,
+        progress: Optional[ProgressCallback] = None,
+    ) -> List[str]:
+        """Translate chunks of one file in parallel, returning the translations in order"""
+        chain = create_chunk_translation_chain(profile)
+        completed = [0]
+
+        def advance() -> None:
+            completed[0] += 1
+            if progress is not None:
+                progress(completed[0], len(texts))
+
+        # Each chunk runs in a copy of the caller's context (client, priority)
+        results = self._pool.map(chain, [
+            {
+                "code": text,
+                "context": context,
+                "source_language": source_language,
+                "target_language": target_language,
+                "use_cache": use_cache
+            }
+            for text in texts
+        ], advance)
+        return [result["translated_code"] for result in results]
+
+    def shutdown(self) -> None:
+        self._pool.shutdown()
+
+
+# Create a singleton instance
+chunked_translator = ChunkedTranslator(
+    workers=settings.chunk_workers or settings.max_concurrent_inference,
+)
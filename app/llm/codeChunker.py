@@ -0,0 +1,220 @@
+import ast
+import bisect
+import hashlib
+import re
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel
+from pygments.lexers import get_lexer_by_name
+from pygments.token import Comment, String
+from pygments.util import ClassNotFound
+
+# Lines that belong to a file's shared header (imports, packages, includes)
+_HEADER_LINE = re.compile(
+    r"^\s*(import\b|from\s+[\w.]+\s+import\b|using\s+[\w.]+\s*;|#\s*include\b|package\b|use\s+[\w:{}, *]+;|"
+    r"require(_relative)?\b|extern\s+crate\b|@import\b|<\?php)"
+)
+_COMMENT_LINE = re.compile(r"^\s*(#(?!\s*include)|//|/\*|\*|--|<!--)")
+_BLOCK_CLOSE = re.compile(r"^(end|\}[\s;)]*)\s*$")
+
+# Longest signature line kept for the shared context
+_MAX_SIGNATURE_CHARS = 200
+# With stable packing, roughly one segment in this many ends a chunk by its content
+_ANCHOR_RATE = 4
+
+
+class CodeChunk(BaseModel):
+    """A run of top-level definitions that is processed as one unit"""
+    index: int
+    text: str
+    start_line: int  # 1-based, inclusive
+    end_line: int
+    names: List[str] = []
+
+
+class ChunkPlan(BaseModel):
+    """A source file split into chunks"""
+    language: str
+    header: str  # imports and other declarations every chunk depends on
+    signatures: List[str]  # top-level signatures, shared as context with every chunk
+    chunks: List[CodeChunk]
+    method: str  # "ast", "tokens" or "whole"
+
+    def context(self, max_chars: int) -> str:
+        """Header and signatures for the chunk prompts, trimmed to max_chars"""
+        parts = [self.header.strip()] if self.header.strip() else []
+        parts.extend(self.signatures)
+        text = "\n".join(parts)
+        if len(text) > max_chars:
+            text = text[:max_chars].rsplit("\n", 1)[0]
+        return text
+
+
+# A segment is (first line, last line, names, signatures), lines 0-based and inclusive
+_Segment = Tuple[int, int, List[str], List[str]]
+
+
+def _python_segments(code: str, lines: List[str]) -> Optional[Tuple[int, List[_Segment]]]:
+    """Split Python at top-level statements using its own parser"""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+    body = list(tree.body)
+    header_end = 0  # number of header lines
+    while body:
+        node = body[0]
+        is_docstring = (
+            header_end == 0 and isinstance(node, ast.Expr)
+            and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+        )
+        if not (is_docstring or isinstance(node, (ast.Import, ast.ImportFrom))):
+            break
+        header_end = node.end_lineno
+        body.pop(0)
+
+    segments: List[_Segment] = []
+    previous_end = header_end
+    for position, node in enumerate(body):
+        end = node.end_lineno if position < len(body) - 1 else len(lines)
+        names, signatures = [], []
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.append(node.name)
+            signatures.append(lines[node.lineno - 1].rstrip())
+            if isinstance(node, ast.ClassDef):
+                for member in node.body:
+                    if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                        signatures.append(lines[member.lineno - 1].rstrip())
+        # Comments and blank lines before a statement travel with it
+        segments.append((previous_end, end - 1, names, signatures))
+        previous_end = end
+    return header_end, segments
+
+
+def _block_depths(code: str, language: str, lines: List[str]) -> List[int]:
+    """Brace depth at the end of every line, ignoring braces in strings and comments"""
+    depths = [0] * len(lines)
+    try:
+        lexer = get_lexer_by_name(language)
+    except ClassNotFound:
+        return depths
+
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    depth = 0
+    changes = [0] * len(lines)
+    for position, token_type, value in lexer.get_tokens_unprocessed(code):
+        if token_type in String or token_type in Comment:
+            continue
+        delta = value.count("{") - value.count("}")
+        if delta:
+            line = min(bisect.bisect_right(offsets, position) - 1, len(lines) - 1)
+            changes[line] += delta
+    for index, delta in enumerate(changes):
+        depth = max(0, depth + delta)
+        depths[index] = depth
+    return depths
+
+
+def _token_segments(code: str, language: str, lines: List[str]) -> Tuple[int, List[_Segment]]:
+    """
+    Split brace and keyword-delimited languages at top level: after a line that
+    closes a block back to depth zero, or at a blank line, whenever the next
+    code starts in the first column.
+    """
+    header_end = 0
+    for index, line in enumerate(lines):
+        if _HEADER_LINE.match(line):
+            header_end = index + 1
+        elif line.strip() and not _COMMENT_LINE.match(line):
+            break
+
+    depths = _block_depths(code, language, lines)
+    cuts = []
+    for index in range(header_end, len(lines) - 1):
+        if depths[index] != 0:
+            continue
+        following = next((line for line in lines[index + 1:] if line.strip()), None)
+        if following is None or following[0].isspace() or following.lstrip().startswith("}"):
+            continue
+        closes_block = (index > 0 and depths[index - 1] > 0) or bool(_BLOCK_CLOSE.match(lines[index]))
+        if closes_block or not lines[index + 1].strip():
+            cuts.append(index)
+
+    segments: List[_Segment] = []
+    start = header_end
+    for cut in cuts + [len(lines) - 1]:
+        if cut < start:
+            continue
+        signature = next((line.rstrip() for line in lines[start:cut + 1] if line.strip()), "")
+        if signature:
+            segments.append((start, cut, [], [signature[:_MAX_SIGNATURE_CHARS]]))
+        elif segments:
+            first, _, names, signatures = segments.pop()
+            segments.append((first, cut, names, signatures))
+        start = cut + 1
+    return header_end, segments
+
+
+def _is_anchor(text: str) -> bool:
+    digest = hashlib.blake2b(text.strip().encode("utf-8", "surrogatepass"), digest_size=2).digest()
+    return int.from_bytes(digest, "big") % _ANCHOR_RATE == 0
+
+
+def _pack(segments: List[_Segment], lines: List[str], max_chars: int, stable: bool = False) -> List[CodeChunk]:
+    """
+    Merge neighbouring segments into chunks of at most max_chars where possible.
+
+    With stable set, chunks also end after segments chosen by their content
+    (once they reach a minimum size), so an edit only changes the chunks up
+    to the next such segment instead of shifting every later chunk boundary.
+    """
+    chunks: List[CodeChunk] = []
+    current: Optional[CodeChunk] = None
+    for first, last, names, _ in segments:
+        text = "".join(lines[first:last + 1])
+        if current is not None and len(current.text) + len(text) <= max_chars:
+            current.text += text
+            current.end_line = last + 1
+            current.names.extend(names)
+        else:
+            if current is not None:
+                chunks.append(current)
+            current = CodeChunk(index=len(chunks), text=text, start_line=first + 1, end_line=last + 1, names=list(names))
+        if stable and _is_anchor(text) and len(current.text) >= max_chars // _ANCHOR_RATE:
+            chunks.append(current)
+            current = None
+    if current is not None:
+        chunks.append(current)
+    return chunks
+
+
+def plan_chunks(code: str, language: str, max_chars: int, stable: bool = False) -> ChunkPlan:
+    """
+    Split source code at function and class boundaries into chunks of at most
+    max_chars. Python is split with the ast module; other languages by brace
+    depth from pygments tokens, or by top-level block ends. A single
+    definition longer than max_chars is kept whole rather than cut in half.
+    Set stable to keep chunk boundaries in place across small edits.
+    """
+    lines = code.splitlines(keepends=True)
+    if len(code) <= max_chars or not lines:
+        return ChunkPlan(
+            language=language, header="", signatures=[], method="whole",
+            chunks=[CodeChunk(index=0, text=code, start_line=1, end_line=max(1, len(lines)))],
+        )
+
+    split = _python_segments(code, lines) if language == "python" else None
+    method = "ast" if split is not None else "tokens"
+    header_end, segments = split if split is not None else _token_segments(code, language, lines)
+
+    signatures = [signature for *_, segment_signatures in segments for signature in segment_signatures]
+    return ChunkPlan(
+        language=language,
+        header="".join(lines[:header_end]),
+        signatures=[signature[:_MAX_SIGNATURE_CHARS] for signature in signatures],
+        chunks=_pack(segments, lines, max_chars, stable),
+        method=method,
+    )
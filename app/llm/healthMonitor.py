@@ -0,0 +1,254 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+from pydantic import BaseModel
+
+from app.utils.settings import settings
+
+# Errors that mean the Ollama backend itself is unreachable or not answering
+BACKEND_ERRORS = (ConnectionError, httpx.TransportError)
+
+
+class BackendUnavailableError(RuntimeError):
+    """Raised when a request is rejected because the Ollama backend is down"""
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker guarding calls to the Ollama backend.
+
+    closed    - calls go through, consecutive failures are counted
+    open      - calls are rejected immediately until reset_timeout passes
+    half_open - a single trial call is let through to test the backend
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a trial call through"""
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def would_reject(self) -> bool:
+        """Whether a request made now would be rejected; unlike allow_request, never takes the trial"""
+        with self._lock:
+            state = self._current_state()
+            return state == self.OPEN or (state == self.HALF_OPEN and self._trial_in_flight)
+
+    def allow_request(self) -> bool:
+        return self.admit() is not None
+
+    def admit(self) -> Optional[bool]:
+        """Let a call through: None if it is rejected, else whether it is the half-open trial"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return False
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return None
+
+    def release_trial(self) -> None:
+        """The trial call ended without testing the backend (rejected or cancelled first): let another through"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open()
+
+    def trip(self) -> None:
+        """Open the breaker immediately, e.g. after a failed health probe"""
+        with self._lock:
+            self._open()
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {"state": self._current_state(), "consecutive_failures": self._failures}
+
+
+class HealthStatus(BaseModel):
+    """Result of the most recent backend probe"""
+    reachable: bool = False
+    models: List[str] = []
+    missing_models: List[str] = []
+    latency_ms: float = 0.0
+    checked_at: float = 0.0
+    error: Optional[str] = None
+    backends: List[Dict[str, Any]] = []  # per-node results when several nodes are configured
+
+    @property
+    def ready(self) -> bool:
+        return self.reachable and not self.missing_models
+
+
+class OllamaHealthMonitor:
+    """
+    Probes Ollama in the background and caches the result.
+
+    The probe lists the installed models (GET /api/tags) on every backend
+    node, which is cheap compared to a generation. Unreachable nodes are
+    ejected from the backend pool; the service is reachable while any node
+    is, and a model is missing only if no reachable node has it. Probe
+    results also drive the circuit breaker, so requests fail fast while
+    every node is down.
+    """
+    def __init__(self, interval: float, timeout: float, breaker: CircuitBreaker):
+        self.interval = interval
+        self.timeout = timeout
+        self.breaker = breaker
+        self._status: Optional[HealthStatus] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _required_models(self) -> List[str]:
+        # Imported here to avoid a circular import with the registry
+        from .modelRegistry import MODEL_REGISTRY
+        return sorted({config.name for config in MODEL_REGISTRY.values()})
+
+    @staticmethod
+    def _is_installed(name: str, installed: List[str]) -> bool:
+        # Ollama reports untagged models with an implicit ":latest" tag
+        return name in installed or (":" not in name and f"{name}:latest" in installed)
+
+    def probe(self) -> HealthStatus:
+        """Check the backends once and update the cached status"""
+        # Imported here: the pool builds on this module's circuit breaker
+        from .backendPool import backend_pool
+
+        started = time.perf_counter()
+        nodes = backend_pool.probe()
+        reachable = [node for node in nodes if node.reachable]
+        if reachable:
+            installed = sorted({name for node in reachable for name in node.models})
+            status = HealthStatus(
+                reachable=True,
+                models=installed,
+                missing_models=[
+                    name for name in self._required_models()
+                    if not self._is_installed(name, installed)
+                ],
+            )
+            self.breaker.record_success()
+        else:
+            status = HealthStatus(reachable=False, error="; ".join(node.error or "unreachable" for node in nodes))
+            self.breaker.trip()
+        if len(nodes) > 1:
+            status.backends = [node.model_dump() for node in nodes]
+
+        status.latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        status.checked_at = time.time()
+        self._status = status
+        return status
+
+    @property
+    def status(self) -> HealthStatus:
+        """Cached status; probes synchronously only if nothing is cached yet"""
+        if self._status is None:
+            return self.probe()
+        return self._status
+
+    def _unavailable(self) -> BackendUnavailableError:
+        return BackendUnavailableError(
+            "Ollama backend is unavailable",
+            retry_after=self.breaker.retry_after() or self.interval,
+        )
+
+    def ensure_available(self) -> bool:
+        """
+        Raise BackendUnavailableError instead of waiting on a dead backend.
+        Call it only right before talking to the backend: in half_open it
+        takes the single trial call, and returns True. A trial that ends
+        without reaching the backend must be given back with release_trial.
+        """
+        trial = self.breaker.admit()
+        if trial is None:
+            raise self._unavailable()
+        return trial
+
+    def check_available(self) -> None:
+        """Like ensure_available, but only reads the breaker, for early rejection in the API layer"""
+        if self.breaker.would_reject():
+            raise self._unavailable()
+
+    def record_success(self) -> None:
+        self.breaker.record_success()
+
+    def record_failure(self) -> None:
+        self.breaker.record_failure()
+
+    def release_trial(self) -> None:
+        self.breaker.release_trial()
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            self.probe()
+            self._stop_event.wait(self.interval)
+
+    def start(self) -> None:
+        """Start the background probe thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ollama-health", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+
+
+# Create a singleton instance
+health_monitor = OllamaHealthMonitor(
+    interval=settings.health_probe_interval,
+    timeout=settings.health_probe_timeout,
+    breaker=CircuitBreaker(
+        failure_threshold=settings.breaker_failure_threshold,
+        reset_timeout=settings.breaker_reset_timeout,
+    ),
+)
@@ -0,0 +1,223 @@
+import contextvars
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.utils.settings import settings
+from .chains import create_code_translation_chain, language_detector, stream_chunk_translation, stream_code_translation
+from .chunkedTranslation import chunked_translator, join_translations
+from .codeChunker import ChunkPlan, plan_chunks
+
+
+class IncrementalTranslation(BaseModel):
+    """Result of (re-)translating a buffer within an editing session"""
+    code: str
+    source_language: str
+    target_language: str
+    segments: int
+    reused: int  # segments spliced in from the previous version
+    translated: int  # segments sent to the model
+    elapsed_ms: float
+
+
+class _Session:
+    """Translations of the latest version of one editor buffer"""
+    def __init__(self, settings_key: Tuple[str, str, Optional[str]]):
+        self.settings_key = settings_key
+        self.segments: Dict[str, str] = {}  # hash of source segment -> translation
+        self.touched = time.monotonic()
+
+
+def _segment_key(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+class IncrementalTranslator:
+    """
+    Re-translates an edited buffer by regenerating only what changed.
+
+    Each session remembers the translation of every source segment (a run of
+    functions or blocks with content-defined boundaries) of its latest
+    version. On resubmission the buffer is split the same way, unchanged
+    segments are spliced in from that map and only new or edited segments go
+    to the model, so latency follows the size of the edit rather than the
+    size of the file. Sessions expire after a TTL and the least recently used
+    are dropped beyond a maximum count.
+    """
+    def __init__(self, segment_chars: int, ttl: int, max_sessions: int):
+        self.segment_chars = segment_chars
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+
+    def _session(self, session_id: str, settings_key: Tuple[str, str, Optional[str]]) -> _Session:
+        now = time.monotonic()
+        with self._lock:
+            for stale_id in [sid for sid, s in self._sessions.items() if now - s.touched > self.ttl]:
+                del self._sessions[stale_id]
+            session = self._sessions.get(session_id)
+            if session is None or session.settings_key != settings_key:
+                # New session, or the languages or profile changed: nothing can be reused
+                session = _Session(settings_key)
+                self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            session.touched = now
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def _segments(
+        self,
+        session_id: str,
+        code: str,
+        target_language: str,
+        source_language: Optional[str],
+        profile: Optional[str],
+    ) -> Tuple[str, _Session, ChunkPlan, List[str], List[str]]:
+        """Split the buffer into segments; returns the source language, session, plan, texts and keys"""
+        source_language = source_language or language_detector._run(code)
+        session = self._session(session_id, (source_language, target_language, profile))
+        plan = plan_chunks(code, source_language, self.segment_chars, stable=True)
+        texts = [chunk.text for chunk in plan.chunks] or [code]
+        texts[0] = plan.header + texts[0]
+        return source_language, session, plan, texts, [_segment_key(text) for text in texts]
+
+    def translate(
+        self,
+        session_id: str,
+        code: str,
+        target_language: str,
+        source_language: Optional[str] = None,
+        profile: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> IncrementalTranslation:
+        started = time.perf_counter()
+        source_language, session, plan, texts, keys = self._segments(
+            session_id, code, target_language, source_language, profile
+        )
+        previous = dict(session.segments)
+        # Changed segments, each distinct text translated once
+        changed = {key: text for key, text in zip(keys, texts) if key not in previous}
+
+        if len(texts) == 1 and changed:
+            result = create_code_translation_chain(profile)({
+                "code": code,
+                "source_language": source_language,
+                "target_language": target_language,
+                "use_cache": use_cache,
+                "raise_errors": True
+            })
+            fresh = {keys[0]: result["translated_code"]}
+        elif changed:
+            translations = chunked_translator.translate_chunks(
+                list(changed.values()), plan.context(settings.translation_context_chars),
+                source_language, target_language, profile, use_cache
+            )
+            fresh = dict(zip(changed, translations))
+        else:
+            fresh = {}
+
+        current = {key: fresh.get(key, previous.get(key)) for key in keys}
+        with self._lock:
+            # Keep only the latest version so the map does not grow with every edit
+            session.segments = current
+        return IncrementalTranslation(
+            code=current[keys[0]] if len(keys) == 1 else join_translations([current[key] for key in keys]),
+            source_language=source_language,
+            target_language=target_language,
+            segments=len(keys),
+            reused=sum(key not in fresh for key in keys),
+            translated=len(fresh),
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+        )
+
+    def stream(
+        self,
+        session_id: str,
+        code: str,
+        target_language: str,
+        source_language: Optional[str] = None,
+        profile: Optional[str] = None,
+        use_cache: bool = True,
+        report: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[str]:
+        """
+        Like translate, as a stream of text chunks. When segments can be
+        reused the spliced result arrives as one chunk. Otherwise (a new
+        session, one segment, or nothing left unchanged) nothing is gained by
+        waiting: the first segment streams as it is generated while the rest
+        are translated in parallel, and every segment is remembered for the
+        next edit. `report` receives the segment counts, and the stop reason
+        if the output guard cut the streamed segment short.
+        """
+        report = {} if report is None else report
+        source_language, session, plan, texts, keys = self._segments(
+            session_id, code, target_language, source_language, profile
+        )
+        if len(keys) > 1 and any(key in session.segments for key in keys):
+            result = self.translate(session_id, code, target_language, source_language, profile, use_cache)
+            report.update(segments=result.segments, reused=result.reused, translated=result.translated)
+            yield result.code
+            return
+
+        report.update(segments=len(keys), reused=0, translated=len(keys))
+        inputs = {
+            "source_language": source_language,
+            "target_language": target_language,
+            "use_cache": use_cache,
+            "profile": profile,
+            "report": report
+        }
+        rest = None
+        background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="incremental-translation")
+        try:
+            if len(keys) == 1:
+                # The same prompt translate() sends, so either one's cached result serves the other
+                _, tokens, _ = stream_code_translation({**inputs, "code": code})
+            else:
+                context = plan.context(settings.translation_context_chars)
+                # Under the caller's context, so the segments are scheduled at its priority
+                rest = background.submit(
+                    contextvars.copy_context().run, chunked_translator.translate_chunks,
+                    texts[1:], context, source_language, target_language, profile, use_cache
+                )
+                _, tokens, _ = stream_chunk_translation({**inputs, "code": texts[0], "context": context})
+
+            streamed = []
+            for text in tokens:
+                streamed.append(text)
+                yield text
+            first = "".join(streamed)[:report.get("clean_chars")].strip()
+            parts = [first] + (rest.result() if rest is not None else [])
+            for part in parts[1:]:
+                yield "\n\n" + part
+        finally:
+            background.shutdown(wait=False, cancel_futures=True)
+
+        current = dict(zip(keys, parts))
+        if "stop_reason" in report:
+            # A segment the guard cut short is translated again next time
+            current.pop(keys[0], None)
+        with self._lock:
+            session.segments = current
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "segments": sum(len(session.segments) for session in self._sessions.values()),
+            }
+
+
+# Create a singleton instance
+incremental_translator = IncrementalTranslator(
+    segment_chars=settings.incremental_segment_chars,
+    ttl=settings.translation_session_ttl,
+    max_sessions=settings.translation_sessions_max,
+)
@@ -0,0 +1,86 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator, TypeVar
+
+from app.utils.settings import settings
+from .cancellation import request_cancellation
+
+T = TypeVar("T")
+_END = object()
+
+
+class InferenceExecutor:
+    """
+    Runs blocking chain and detection work off the event loop.
+
+    Chains run on a dedicated worker pool and CPU-bound language detection on
+    a separate, smaller pool, so neither can starve the other or the loop.
+    How many Ollama calls are actually in flight is decided by the request
+    scheduler, so cache hits never wait behind generations.
+
+    While a request waits on a worker, its client is probed for a disconnect
+    and its deadline is watched; either cancels the request, which aborts the
+    work in the worker, and the wait ends with RequestCancelledError.
+    """
+    def __init__(self, inference_workers: int, detection_workers: int):
+        self._chain_pool = ThreadPoolExecutor(
+            max_workers=inference_workers,
+            thread_name_prefix="inference",
+        )
+        self._detection_pool = ThreadPoolExecutor(
+            max_workers=detection_workers,
+            thread_name_prefix="detection",
+        )
+
+    @staticmethod
+    async def _run_in(pool: ThreadPoolExecutor, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        # Carry the request context (client, priority) over to the worker thread
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(pool, functools.partial(context.run, fn, *args, **kwargs))
+        token = request_cancellation.get()
+        if token is None:
+            return await future
+        return await token.guard(future, settings.disconnect_poll_interval)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking chain call on the inference pool"""
+        return await self._run_in(self._chain_pool, fn, *args, **kwargs)
+
+    async def run_detection(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run CPU-bound detection or prompt rendering on the detection pool"""
+        return await self._run_in(self._detection_pool, fn, *args, **kwargs)
+
+    async def iterate(self, iterator: Iterator[T]) -> AsyncIterator[T]:
+        """Consume a blocking iterator (e.g. a token stream) on the inference pool"""
+        try:
+            while True:
+                item = await self.run(next, iterator, _END)
+                if item is _END:
+                    return
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except ValueError:
+                    # Still running in a worker; the cancellation ends it there
+                    pass
+
+    def shutdown(self) -> None:
+        self._chain_pool.shutdown(wait=False, cancel_futures=True)
+        self._detection_pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Create a singleton instance
+# Every queued request parks a worker thread, so size the pool for a full queue
+inference_executor = InferenceExecutor(
+    inference_workers=max(
+        settings.inference_workers,
+        settings.max_concurrent_inference + settings.max_queue_depth,
+    ),
+    detection_workers=settings.detection_workers,
+)
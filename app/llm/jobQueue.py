@@ -0,0 +1,468 @@
+import contextvars
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.utils.settings import settings
+from app.utils.structuredLog import get_logger
+from .cancellation import CANCELLED_BY_CLIENT, CancellationToken, RequestCancelledError, request_cancellation
+from .chains import create_code_generation_chain, language_detector
+from .chunkedTranslation import ProgressCallback, chunked_translator
+from .healthMonitor import BackendUnavailableError
+from .mapReduceExplanation import map_reduce_explainer
+from .modelTask import ModelTask
+from .scheduler import QueueFullError, RequestContext, request_context
+from .sharedState import shared_state
+
+logger = get_logger("jobs")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# Cancellation reason of jobs interrupted by a shutdown; they run again after the restart
+SHUTDOWN = "shutdown"
+
+
+class Job(BaseModel):
+    """State of one asynchronous job as returned to clients"""
+    id: str
+    type: str
+    status: str
+    completed: int = 0   # generations finished so far
+    total: int = 0       # generations expected (grows during map-reduce rounds)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    expires_at: Optional[float] = None
+
+
+def _run_translation(inputs: Dict[str, Any], progress: ProgressCallback) -> Dict[str, Any]:
+    result = chunked_translator.translate(
+        inputs["code"],
+        inputs["target_language"],
+        inputs.get("source_language"),
+        inputs.get("profile"),
+        inputs.get("use_cache", True),
+        progress,
+    )
+    return result.model_dump()
+
+
+def _run_explanation(inputs: Dict[str, Any], progress: ProgressCallback) -> Dict[str, Any]:
+    language = inputs.get("language") or language_detector._run(inputs["code"])
+    result = map_reduce_explainer.explain(
+        inputs["code"],
+        language,
+        inputs.get("profile"),
+        inputs.get("use_cache", True),
+        progress,
+    )
+    return result.model_dump()
+
+
+def _run_generation(inputs: Dict[str, Any], progress: ProgressCallback) -> Dict[str, Any]:
+    result = create_code_generation_chain(inputs.get("profile"))({
+        "description": inputs["description"],
+        "language": inputs["language"],
+        "use_cache": inputs.get("use_cache", True),
+        "raise_errors": True,
+        **inputs.get("style", {})
+    })
+    progress(1, 1)
+    return {"code": result["code"], "language": inputs["language"], "stop_reason": result.get("stop_reason")}
+
+
+# Job type -> (task, runner); runners execute the same chains as the synchronous endpoints
+JOB_TYPES: Dict[str, Tuple[ModelTask, Callable[[Dict[str, Any], ProgressCallback], Dict[str, Any]]]] = {
+    "translate": (ModelTask.CODE_TRANSLATION, _run_translation),
+    "explain": (ModelTask.CODE_EXPLANATION, _run_explanation),
+    "generate": (ModelTask.CODE_GENERATION, _run_generation),
+}
+
+
+class JobStore:
+    """
+    SQLite table of jobs: inputs, status, progress and results. Every change
+    is committed straight away, so jobs survive a restart, and several API
+    processes can share the table: a worker claims a job in a write
+    transaction, so each job runs in exactly one process.
+    """
+    # Columns added after the table was first created
+    MIGRATIONS = {
+        "owner": "ALTER TABLE jobs ADD COLUMN owner TEXT",
+        "run_after": "ALTER TABLE jobs ADD COLUMN run_after REAL NOT NULL DEFAULT 0",
+        "cancel_requested": "ALTER TABLE jobs ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0",
+    }
+
+    def __init__(self, db_path: str):
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Processes starting together must not migrate the table at the same time
+        self._db.execute("BEGIN IMMEDIATE")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                inputs TEXT NOT NULL,
+                client_id TEXT NOT NULL,
+                priority TEXT NOT NULL,
+                completed INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )"""
+        )
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, statement in self.MIGRATIONS.items():
+            if column not in columns:
+                self._db.execute(statement)
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at)")
+        self._db.commit()
+
+    def _execute(self, sql: str, parameters: Tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            cursor = self._db.execute(sql, parameters)
+            self._db.commit()
+            return cursor
+
+    def create(self, job_type: str, inputs: Dict[str, Any], context: RequestContext) -> str:
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (id, type, status, inputs, client_id, priority, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, job_type, QUEUED, json.dumps(inputs), context.client_id, context.priority, time.time()),
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def claim(self, owner: str) -> Optional[sqlite3.Row]:
+        """Mark the oldest runnable queued job as running in this process and return it"""
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock first, so two processes never claim the same job
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE status = ? AND run_after <= ? ORDER BY created_at LIMIT 1",
+                    (QUEUED, now),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = ?, owner = ?, started_at = ? WHERE id = ?",
+                        (RUNNING, owner, now, row["id"]),
+                    )
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+            if row is None:
+                return None
+            return self._db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+
+    def set_progress(self, job_id: str, completed: int, total: int) -> None:
+        self._execute("UPDATE jobs SET completed = ?, total = ? WHERE id = ?", (completed, total, job_id))
+
+    def finish(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+        )
+
+    def cancel_queued(self, job_id: str) -> bool:
+        cursor = self._execute(
+            "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+            (CANCELLED, time.time(), job_id, QUEUED),
+        )
+        return cursor.rowcount == 1
+
+    def request_cancel(self, job_id: str) -> None:
+        """Flag a running job; the process running it cancels it on its next poll"""
+        self._execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+
+    def cancel_requested(self, owner: str) -> List[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status = ? AND owner = ? AND cancel_requested = 1", (RUNNING, owner)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def requeue(self, job_id: str, delay: float = 0.0) -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, owner = NULL, started_at = NULL, completed = 0, total = 0, run_after = ? "
+            "WHERE id = ?",
+            (QUEUED, time.time() + delay, job_id),
+        )
+
+    def recover(self, is_alive: Callable[[Optional[str]], bool]) -> int:
+        """Requeue running jobs whose process is gone; returns how many"""
+        with self._lock:
+            rows = self._db.execute("SELECT id, owner FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+        orphaned = [row["id"] for row in rows if not is_alive(row["owner"])]
+        for job_id in orphaned:
+            self.requeue(job_id)
+        return len(orphaned)
+
+    def prune(self, finished_before: float) -> int:
+        """Delete finished jobs older than the retention period"""
+        placeholders = ", ".join("?" for _ in FINISHED)
+        cursor = self._execute(
+            f"DELETE FROM jobs WHERE status IN ({placeholders}) AND finished_at < ?",
+            (*FINISHED, finished_before),
+        )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["count"] for row in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class JobQueue:
+    """
+    Runs long translations and explanations in the background.
+
+    Submitting a job stores it and returns its ID; a pool of worker threads
+    claims queued jobs in order and runs them through the same chains as the
+    synchronous endpoints, recording chunk progress as it goes. Jobs keep
+    the submitter's client ID and priority (batch by default), so they share
+    the scheduler fairly with interactive traffic. While the backend is down
+    or the scheduler queue is full a job is put back for a while instead of
+    failing. Jobs interrupted by a shutdown, or left running by a process
+    that died, run again; finished jobs are deleted once `retention`
+    seconds have passed.
+
+    Jobs live only in the database, so with several API processes any of
+    them can take a job submitted to another, and cancellations reach the
+    process running the job within `poll_interval`.
+    """
+    def __init__(
+        self,
+        db_path: str,
+        workers: int,
+        retention: float,
+        max_pending: int,
+        prune_interval: float,
+        poll_interval: float,
+    ):
+        self.db_path = db_path
+        self.workers = workers
+        self.retention = retention
+        self.max_pending = max_pending
+        self.prune_interval = prune_interval
+        self.poll_interval = poll_interval
+        self._store: Optional[JobStore] = None
+        # Wakes an idle worker when a job is submitted here; jobs from other processes are polled for
+        self._wakeup: "queue.Queue[None]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._running: Dict[str, CancellationToken] = {}
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._stats = {"submitted": 0, "succeeded": 0, "failed": 0, "cancelled": 0, "retried": 0, "recovered": 0, "pruned": 0}
+
+    @property
+    def store(self) -> JobStore:
+        # Opened on first use, so importing the module never touches the disk
+        with self._lock:
+            if self._store is None:
+                self._store = JobStore(self.db_path)
+            return self._store
+
+    def submit(self, job_type: str, inputs: Dict[str, Any], context: RequestContext) -> Job:
+        """Store a job and queue it; raises QueueFullError when too many jobs are waiting"""
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Unknown job type '{job_type}'; use one of {', '.join(JOB_TYPES)}")
+        if self.store.counts().get(QUEUED, 0) >= self.max_pending:
+            raise QueueFullError(f"{self.max_pending} jobs are already waiting", retry_after=self.prune_interval)
+        job_id = self.store.create(job_type, inputs, context)
+        with self._lock:
+            self._stats["submitted"] += 1
+        self._wakeup.put(None)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self.store.get(job_id)
+        if row is None:
+            return None
+        return Job(
+            id=row["id"],
+            type=row["type"],
+            status=row["status"],
+            completed=row["completed"],
+            total=row["total"],
+            result=json.loads(row["result"]) if row["result"] else None,
+            error=row["error"],
+            created_at=row["created_at"],
+            started_at=row["started_at"],
+            finished_at=row["finished_at"],
+            expires_at=row["finished_at"] + self.retention if row["finished_at"] else None,
+        )
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job; finished jobs are left as they are"""
+        if not self.store.cancel_queued(job_id):
+            with self._lock:
+                token = self._running.get(job_id)
+            if token is not None:
+                # The worker records the job as cancelled once the generation is aborted
+                token.cancel(CANCELLED_BY_CLIENT)
+            else:
+                # Running in another process, or about to finish
+                self.store.request_cancel(job_id)
+        return self.get(job_id)
+
+    def _run(self, row: sqlite3.Row) -> None:
+        store = self.store
+        job_id = row["id"]
+        token = CancellationToken()
+        with self._lock:
+            self._running[job_id] = token
+        request_context.set(RequestContext(client_id=row["client_id"], priority=row["priority"]))
+        request_cancellation.set(token)
+        try:
+            _, runner = JOB_TYPES[row["type"]]
+            result = runner(
+                json.loads(row["inputs"]),
+                lambda completed, total: store.set_progress(job_id, completed, total),
+            )
+            store.finish(job_id, SUCCEEDED, result)
+            outcome = "succeeded"
+        except RequestCancelledError:
+            if token.reason == SHUTDOWN:
+                store.requeue(job_id)
+                return
+            store.finish(job_id, CANCELLED)
+            outcome = "cancelled"
+        except (BackendUnavailableError, QueueFullError) as e:
+            # Not the job's fault: put it back and run it again from the start later
+            store.requeue(job_id, e.retry_after)
+            outcome = "retried"
+        except Exception as e:
+            logger.warning("job failed", extra={"job_id": job_id, "type": row["type"], "error": str(e)})
+            store.finish(job_id, FAILED, error=str(e) or type(e).__name__)
+            outcome = "failed"
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def _work(self) -> None:
+        while not self._stop_event.is_set():
+            row = self.store.claim(shared_state.instance_id)
+            if row is None:
+                try:
+                    self._wakeup.get(timeout=self.poll_interval)
+                except queue.Empty:
+                    pass
+                continue
+            try:
+                # A fresh context per job, so no request or job state leaks between them
+                contextvars.Context().run(self._run, row)
+            except Exception as e:
+                logger.error("job worker error", extra={"job_id": row["id"], "error": str(e)})
+
+    def _monitor(self) -> None:
+        last_maintenance = time.monotonic()
+        while not self._stop_event.wait(self.poll_interval):
+            for job_id in self.store.cancel_requested(shared_state.instance_id):
+                with self._lock:
+                    token = self._running.get(job_id)
+                if token is not None:
+                    token.cancel(CANCELLED_BY_CLIENT)
+            if time.monotonic() - last_maintenance >= self.prune_interval:
+                last_maintenance = time.monotonic()
+                self.prune()
+                self.recover()
+
+    def prune(self) -> int:
+        pruned = self.store.prune(time.time() - self.retention)
+        with self._lock:
+            self._stats["pruned"] += pruned
+        return pruned
+
+    def recover(self) -> int:
+        """Requeue jobs left running by processes that are no longer alive"""
+        recovered = self.store.recover(shared_state.is_alive)
+        with self._lock:
+            self._stats["recovered"] += recovered
+        return recovered
+
+    def start(self) -> None:
+        """Requeue jobs orphaned by a previous run and start the workers"""
+        if self._threads:
+            return
+        self._stop_event.clear()
+        self.prune()
+        self.recover()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        self._threads.append(threading.Thread(target=self._monitor, name="job-monitor", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the workers; running jobs are aborted and stay queued for the next start"""
+        self._stop_event.set()
+        with self._lock:
+            tokens = list(self._running.values())
+        for token in tokens:
+            token.cancel(SHUTDOWN)
+        for _ in range(self.workers):
+            self._wakeup.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def stats(self) -> Dict[str, object]:
+        counts = self.store.counts()
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running_here": len(self._running),
+                "pending": counts.get(QUEUED, 0),
+                "retention_seconds": self.retention,
+                "by_status": counts,
+                **self._stats,
+            }
+
+
+# Create a singleton instance
+job_queue = JobQueue(
+    db_path=settings.jobs_db_path,
+    workers=settings.job_workers,
+    retention=settings.job_retention_seconds,
+    max_pending=settings.job_max_pending,
+    prune_interval=settings.job_prune_interval,
+    poll_interval=settings.job_poll_interval,
+)
@@ -0,0 +1,278 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from pydantic import BaseModel
+from pygments.lexers import guess_lexer
+from pygments.util import ClassNotFound
+
+from app.utils.settings import settings
+from .metrics import metrics
+from .tracing import span
+
+# Map Pygments lexer names to standardized language identifiers
+PYGMENTS_LANGUAGE_MAP: Dict[str, str] = {
+    "Python 3": "python",
+    "Python": "python",
+    "JavaScript": "javascript",
+    "TypeScript": "typescript",
+    "C++": "cpp",
+    "C#": "csharp",
+    "Java": "java",
+    "HTML": "html",
+    "CSS": "css",
+    "PHP": "php",
+    "Ruby": "ruby",
+    "Go": "go",
+    "Rust": "rust",
+    "Swift": "swift",
+    "Kotlin": "kotlin"
+}
+
+# Signatures for the languages we support: (pattern, weight).
+# Each pattern counts once, however often it matches.
+_SIGNATURES: Dict[str, List[Tuple[str, float]]] = {
+    "python": [
+        (r"^\s*def \w+\(.*\)\s*(->\s*[^:]+)?:\s*$", 4),
+        (r"^\s*class \w+(\(.*\))?:\s*$", 3),
+        (r"^\s*(elif\b.*|else|try|except\b.*|finally):\s*$", 3),
+        (r"^\s*(from [\w.]+ import [\w., *]+|import [\w., ]+)\s*$", 2),
+        (r"\bself\.\w+", 2),
+        (r"__\w+__", 2),
+        (r"^\s*(if|for|while|with) .*:\s*$", 2),
+        (r"\b(None|True|False)\b", 1),
+        (r"\bprint\(", 1),
+    ],
+    "javascript": [
+        (r"\bfunction\s*\w*\s*\([^)]*\)\s*\{", 3),
+        (r"\b(const|let|var)\s+\w+\s*=", 2),
+        (r"=>", 1),
+        (r"\bconsole\.\w+\(", 3),
+        (r"\b(document|window)\.\w+", 2),
+        (r"\brequire\(['\"]|\bmodule\.exports\b", 3),
+        (r"===|!==", 1),
+    ],
+    "typescript": [
+        (r"\b(const|let|var)\s+\w+\s*:\s*[\w<>\[\]|]+\s*=", 4),
+        (r"\(\s*\w+\s*:\s*(string|number|boolean|any|unknown|void)\b", 4),
+        (r"\)\s*:\s*(string|number|boolean|void|any|Promise<[^>]*>)\s*(\{|=>)", 4),
+        (r"^\s*(export\s+)?interface\s+\w+(\s+extends\s+[\w, ]+)?\s*\{", 3),
+        (r"^\s*(export\s+)?type\s+\w+\s*=", 3),
+        (r"^\s*import\s+.*\s+from\s+['\"]", 1),
+        (r"\bconsole\.\w+\(", 1),
+    ],
+    "java": [
+        (r"\bpublic\s+(static\s+)?(final\s+)?(class|interface|enum|void|int|String)\b", 3),
+        (r"\bSystem\.(out|err)\.print", 5),
+        (r"^\s*import\s+java\.[\w.*]+;", 5),
+        (r"\bString\[\]\s+\w+", 3),
+        (r"@Override\b", 2),
+        (r"^\s*package\s+[\w.]+;", 3),
+        (r"\bprivate\s+(static\s+)?(final\s+)?[A-Z]\w*(<[^>]*>)?\s+\w+\s*[;=]", 2),
+    ],
+    "csharp": [
+        (r"^\s*using\s+System(\.\w+)*;", 5),
+        (r"\bConsole\.(Write|WriteLine|ReadLine)\(", 5),
+        (r"^\s*namespace\s+[\w.]+", 2),
+        (r"\{\s*get;\s*(private\s+)?(set;)?\s*\}", 4),
+        (r"\bpublic\s+(static\s+)?(async\s+)?(void|string|int|bool|Task)\s+[A-Z]\w*\s*\(", 2),
+        (r"\bvar\s+\w+\s*=\s*new\b", 2),
+        (r"\bstring\[\]\s+\w+", 2),
+    ],
+    "cpp": [
+        (r"^\s*#include\s*[<\"][\w./]+[>\"]", 4),
+        (r"\bstd::\w+", 4),
+        (r"\b(cout|cerr)\s*<<|\bcin\s*>>", 3),
+        (r"\btemplate\s*<", 3),
+        (r"^\s*using\s+namespace\s+std;", 4),
+        (r"\bint\s+main\s*\(", 1),
+        (r"\w+::\w+\s*\(", 1),
+    ],
+    "html": [
+        (r"<!DOCTYPE\s+html", 6),
+        (r"<(html|head|body|div|span|p|a|ul|li|table|form|input|script|style|meta|link)\b[^>]*>", 3),
+        (r"</\w+>", 2),
+    ],
+    "css": [
+        (r"^\s*[.#]?[\w-]+([\s,>+~]+[.#]?[\w-]+)*(:[\w-]+)?\s*\{\s*$", 1),
+        (r"^\s*(color|background(-color)?|margin|padding|font(-\w+)?|display|width|height|border)\s*:\s*[^;]+;", 4),
+        (r"@(media|import|keyframes|font-face)\b", 3),
+    ],
+    "php": [
+        (r"<\?php", 8),
+        (r"\$\w+\s*=", 2),
+        (r"\bfunction\s+\w+\s*\(\s*\$", 3),
+        (r"\$this->\w+", 3),
+        (r"\becho\b", 1),
+    ],
+    "ruby": [
+        (r"^\s*def \w+[?!]?(\([^)]*\))?\s*$", 3),
+        (r"^\s*end\s*$", 3),
+        (r"\bputs\b", 2),
+        (r"\bdo\s*\|[\w, ]+\|", 3),
+        (r"^\s*require(_relative)?\s+['\"]", 2),
+        (r"\battr_(accessor|reader|writer)\b", 4),
+        (r"^\s*elsif\b", 3),
+        (r"@\w+", 1),
+    ],
+    "go": [
+        (r"^\s*package\s+\w+\s*$", 3),
+        (r"\bfunc\s+(\(\s*\w+\s+\*?\w+\s*\)\s*)?\w+\s*\([^)]*\)\s*[\w*\[\]()., ]*\{", 4),
+        (r":=", 2),
+        (r"\bfmt\.\w+\(", 5),
+        (r"^\s*import\s*\(", 3),
+        (r"\b(chan|defer)\b|\bgo\s+func\b", 2),
+    ],
+    "rust": [
+        (r"\bfn\s+\w+\s*(<[^>]*>)?\s*\(", 4),
+        (r"\blet\s+mut\b", 4),
+        (r"\b\w+!\(", 3),
+        (r"^\s*impl\b", 3),
+        (r"^\s*use\s+\w+(::[\w{}, *]+)+;", 3),
+        (r"&str\b|\bString::\w+", 3),
+        (r"\bpub\s+(fn|struct|enum|mod)\b", 3),
+    ],
+    "swift": [
+        (r"\bfunc\s+\w+\s*\([^)]*\w+\s*:\s*[A-Z]\w*", 4),
+        (r"^\s*import\s+(UIKit|Foundation|SwiftUI|Combine)\b", 6),
+        (r"\b(guard|if)\s+let\b", 4),
+        (r"\b(let|var)\s+\w+\s*:\s*[A-Z]\w*\??\s*=", 2),
+        (r"\boverride\s+func\b", 3),
+        (r"->\s*[A-Z]\w*\??\s*\{", 2),
+    ],
+    "kotlin": [
+        (r"\bfun\s+(<[^>]*>\s*)?\w+\s*\(", 5),
+        (r"\bval\s+\w+", 2),
+        (r"\bprintln\(", 2),
+        (r"\bdata\s+class\b", 4),
+        (r"\bwhen\s*\(", 2),
+        (r"^\s*import\s+kotlin(x)?\.", 5),
+    ],
+}
+
+_COMPILED: Dict[str, List[Tuple[Pattern[str], float]]] = {
+    language: [(re.compile(pattern, re.MULTILINE), weight) for pattern, weight in signatures]
+    for language, signatures in _SIGNATURES.items()
+}
+
+SUPPORTED_LANGUAGES: List[str] = sorted(_SIGNATURES)
+
+
+class DetectionResult(BaseModel):
+    """Detected language and how it was decided"""
+    language: str
+    confidence: float
+    method: str  # "signatures", "pygments" or "cache"
+
+
+class LanguageDetector:
+    """
+    Language detection tuned for the languages this app supports.
+
+    Only a bounded prefix of the input is examined. Cheap regex signatures
+    for the supported languages are scored first; the full pygments scan
+    (guess_lexer, which runs every installed lexer) is only used when the
+    best score is low or too close to the runner-up. Results are memoized
+    by a hash of the examined prefix.
+    """
+    def __init__(self, prefix_chars: int, min_score: float, min_margin: float, cache_size: int):
+        self.prefix_chars = prefix_chars
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, DetectionResult]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def score(self, code: str) -> List[Tuple[str, float]]:
+        """Signature scores for every supported language, best first"""
+        scores = [
+            (language, sum(weight for pattern, weight in signatures if pattern.search(code)))
+            for language, signatures in _COMPILED.items()
+        ]
+        return sorted(scores, key=lambda item: item[1], reverse=True)
+
+    def _detect_uncached(self, sample: str) -> DetectionResult:
+        ranked = self.score(sample)
+        (best, best_score), (_, runner_up) = ranked[0], ranked[1]
+        confidence = round(best_score / (best_score + runner_up), 3) if best_score else 0.0
+        if best_score >= self.min_score and best_score - runner_up >= self.min_margin:
+            return DetectionResult(language=best, confidence=confidence, method="signatures")
+
+        fallback = self._pygments(sample)
+        if fallback in SUPPORTED_LANGUAGES or not best_score:
+            return DetectionResult(language=fallback, confidence=confidence, method="pygments")
+        # pygments picked something we do not support; a weak signature match is still a better guess
+        return DetectionResult(language=best, confidence=confidence, method="signatures")
+
+    @staticmethod
+    def _pygments(sample: str) -> str:
+        try:
+            lexer = guess_lexer(sample, stripnl=False, stripall=False)
+        except ClassNotFound:
+            return "unknown"
+        return PYGMENTS_LANGUAGE_MAP.get(lexer.name, lexer.name.lower())
+
+    def detect(self, code: str) -> DetectionResult:
+        started = time.monotonic()
+        with span("detection") as attributes:
+            result = self._detect(code)
+            attributes.update(language=result.language, method=result.method)
+        metrics.observe_stage("detection", time.monotonic() - started)
+        return result
+
+    def _detect(self, code: str) -> DetectionResult:
+        sample = code[:self.prefix_chars]
+        key = hashlib.blake2b(sample.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self._hits += 1
+                return cached.model_copy(update={"method": "cache"})
+            self._misses += 1
+
+        result = self._detect_uncached(sample)
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def detect_many(self, snippets: List[str]) -> List[DetectionResult]:
+        """Detect several snippets at once; duplicates are only analysed once"""
+        seen: Dict[str, DetectionResult] = {}
+        results = []
+        for code in snippets:
+            sample = code[:self.prefix_chars]
+            if sample not in seen:
+                seen[sample] = self.detect(code)
+            results.append(seen[sample])
+        return results
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._cache),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Create a singleton instance
+detection_engine = LanguageDetector(
+    prefix_chars=settings.detection_prefix_chars,
+    min_score=settings.detection_min_score,
+    min_margin=settings.detection_min_margin,
+    cache_size=settings.detection_cache_size,
+)
@@ -0,0 +1,228 @@
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.utils.settings import settings
+from .chains import (
+    create_chunk_explanation_chain,
+    create_code_explanation_chain,
+    create_explanation_summary_chain,
+    stream_code_explanation,
+    stream_explanation_summary
+)
+from .chunkedTranslation import MIN_CHUNK_CHARS, ChunkPool, ProgressCallback
+from .codeChunker import CodeChunk, plan_chunks
+from .modelConfiguration import OllamaModelConfig
+from .modelRegistry import get_config_for_task
+from .modelTask import ModelTask
+from .tokenBudget import chars_for_tokens, estimate_tokens, fits_in_context, max_code_tokens
+
+EXPLANATION_MODES = ("single", "map_reduce", "auto")
+
+
+class MapReduceExplanation(BaseModel):
+    """Result of explaining a file chunk by chunk"""
+    explanation: str
+    language: str
+    chunks: int
+    levels: int  # reduce rounds needed to reach one explanation
+    elapsed_ms: float
+
+
+def explanation_budget(config: OllamaModelConfig, code: str) -> int:
+    """
+    Largest chunk in characters: whatever the token estimator says one
+    explanation prompt and its answer leave room for, converted to
+    characters at the density of `code`.
+    """
+    if settings.explanation_chunk_chars:
+        return settings.explanation_chunk_chars
+    return max(MIN_CHUNK_CHARS, chars_for_tokens(code, max_code_tokens(ModelTask.CODE_EXPLANATION, config)))
+
+
+def batch_notes(notes: List[str], limit: int) -> List[List[str]]:
+    """
+    Group notes, in order, into batches of at most `limit` estimated tokens
+    (the separators included), so every reduce prompt fits. A note too large
+    for a batch on its own is cut to the limit rather than sent overflowing.
+    """
+    batches: List[List[str]] = [[]]
+    used = 0
+    for note in notes:
+        tokens = estimate_tokens(note + "\n\n")
+        while tokens > limit:
+            # The estimate is not linear in length; shrink until it fits
+            note = note[:max(0, min(chars_for_tokens(note, limit), len(note) - 1) - 2)]
+            tokens = estimate_tokens(note + "\n\n")
+        if batches[-1] and used + tokens > limit:
+            batches.append([])
+            used = 0
+        batches[-1].append(note)
+        used += tokens
+    return batches
+
+
+def _label(chunk: CodeChunk) -> str:
+    names = f" ({', '.join(chunk.names)})" if chunk.names else ""
+    return f"Lines {chunk.start_line}-{chunk.end_line}{names}"
+
+
+class MapReduceExplainer:
+    """
+    Explains files too large for one prompt. Each function or class chunk is
+    explained in parallel (map), then the notes are combined in rounds until
+    a single explanation of the whole file remains (reduce).
+
+    Chunk boundaries are content-defined and the map prompts depend only on
+    the chunk itself, so after a small edit the unchanged chunks come from
+    the response cache and only the edited ones go to the model.
+    """
+    def __init__(self, workers: int):
+        self._pool = ChunkPool(workers, "map-reduce")
+
+    def _run_all(
+        self,
+        chain: Callable[[Dict[str, Any]], Dict[str, str]],
+        inputs: List[Dict[str, Any]],
+        on_result: Optional[Callable[[], None]] = None,
+    ) -> List[str]:
+        return [result["explanation"] for result in self._pool.map(chain, inputs, on_result)]
+
+    def should_split(self, code: str, language: str, profile: Optional[str] = None) -> bool:
+        """Whether `auto` mode explains this input chunk by chunk: when it does not fit one prompt"""
+        config = get_config_for_task(ModelTask.CODE_EXPLANATION, profile)
+        return not fits_in_context(ModelTask.CODE_EXPLANATION, config, code, language)
+
+    def _plan(self, code: str, language: str, config: OllamaModelConfig):
+        # Split exactly when the single-pass prompt would overflow, by the same estimate
+        fits = fits_in_context(ModelTask.CODE_EXPLANATION, config, code, language)
+        return plan_chunks(code, language, len(code) if fits else explanation_budget(config, code), stable=True)
+
+    def _final_notes(
+        self,
+        plan,
+        language: str,
+        config: OllamaModelConfig,
+        profile: Optional[str],
+        use_cache: bool,
+        advance: Callable[[int], None],
+    ) -> Tuple[str, int]:
+        """
+        Map every chunk to notes, then combine them in rounds until they fit
+        one prompt. Returns the notes for the final summary and the rounds taken.
+        """
+        # Map: explain every chunk; the file header goes with the first one
+        texts = [plan.header + plan.chunks[0].text] + [chunk.text for chunk in plan.chunks[1:]]
+        advance(len(texts))
+        notes = self._run_all(create_chunk_explanation_chain(profile), [
+            {"code": text, "language": language, "use_cache": use_cache} for text in texts
+        ], lambda: advance(0))
+        notes = [f"## {_label(chunk)}\n{note}" for chunk, note in zip(plan.chunks, notes)]
+
+        # Reduce: combine batches of notes that fit one prompt until one batch is left. A round
+        # where every note fills a batch alone still progresses: each summary is shorter than its notes.
+        summary_chain = create_explanation_summary_chain(profile)
+        limit = max_code_tokens(ModelTask.CODE_EXPLANATION, config)
+        levels = 0
+        while True:
+            batches = batch_notes(notes, limit)
+            if len(batches) == 1:
+                return "\n\n".join(batches[0]), levels
+            levels += 1
+            advance(len(batches))
+            notes = self._run_all(summary_chain, [
+                {"notes": "\n\n".join(batch), "language": language, "final": False, "use_cache": use_cache}
+                for batch in batches
+            ], lambda: advance(0))
+
+    def explain(
+        self,
+        code: str,
+        language: str,
+        profile: Optional[str] = None,
+        use_cache: bool = True,
+        progress: Optional[ProgressCallback] = None,
+    ) -> MapReduceExplanation:
+        """
+        Explain `code`, chunk by chunk when it is large. `progress` is told the
+        generations completed so far; the total grows with each reduce round.
+        """
+        started = time.perf_counter()
+        config = get_config_for_task(ModelTask.CODE_EXPLANATION, profile)
+        plan = self._plan(code, language, config)
+
+        def finish(explanation: str, chunks: int, levels: int) -> MapReduceExplanation:
+            return MapReduceExplanation(
+                explanation=explanation,
+                language=language,
+                chunks=chunks,
+                levels=levels,
+                elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+            )
+
+        if len(plan.chunks) <= 1:
+            result = create_code_explanation_chain(profile)({
+                "code": code,
+                "language": language,
+                "use_cache": use_cache
+            })
+            if progress is not None:
+                progress(1, 1)
+            return finish(result["explanation"], 1, 0)
+
+        counts = {"completed": 0, "total": 0}
+
+        def advance(added: int) -> None:
+            # Called with the generations a round adds, then with 0 as each one completes
+            if added:
+                counts["total"] += added
+                return
+            counts["completed"] += 1
+            if progress is not None:
+                progress(counts["completed"], counts["total"])
+
+        notes, levels = self._final_notes(plan, language, config, profile, use_cache, advance)
+        advance(1)
+        summary = create_explanation_summary_chain(profile)({
+            "notes": notes, "language": language, "final": True, "use_cache": use_cache
+        })
+        advance(0)
+        return finish(summary["explanation"], len(plan.chunks), levels + 1)
+
+    def explain_stream(
+        self,
+        code: str,
+        language: str,
+        profile: Optional[str] = None,
+        use_cache: bool = True,
+        report: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[str]:
+        """
+        Explain `code` as a token stream: the chunk notes and intermediate
+        rounds run first, then the final summary is streamed as it is
+        generated. `report` receives the chunks, rounds and token budget of
+        the streamed prompt, and a guard stop like any streamed generation.
+        """
+        report = {} if report is None else report
+        config = get_config_for_task(ModelTask.CODE_EXPLANATION, profile)
+        plan = self._plan(code, language, config)
+        if len(plan.chunks) <= 1:
+            inputs = {"code": code, "language": language}
+            stream, chunks, levels = stream_code_explanation, 1, 0
+        else:
+            notes, levels = self._final_notes(plan, language, config, profile, use_cache, lambda added: None)
+            inputs = {"notes": notes, "language": language, "final": True}
+            stream, chunks, levels = stream_explanation_summary, len(plan.chunks), levels + 1
+        _, tokens, budget = stream({**inputs, "use_cache": use_cache, "profile": profile, "report": report})
+        report.update(explained_chunks=chunks, levels=levels, budget=budget.model_dump())
+        yield from tokens
+
+    def shutdown(self) -> None:
+        self._pool.shutdown()
+
+
+# Create a singleton instance
+map_reduce_explainer = MapReduceExplainer(
+    workers=settings.chunk_workers or settings.max_concurrent_inference,
+)
@@ -0,0 +1,245 @@
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.utils.settings import settings
+
+# Upper bounds (seconds) for request and stage latencies; +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Upper bounds for decode throughput in tokens per second
+TOKEN_RATE_BUCKETS = (1.0, 2.5, 5.0, 10.0, 15.0, 20.0, 30.0, 50.0, 75.0, 100.0, 150.0, 250.0)
+
+# Stages a generation's time is split into
+STAGES = ("detection", "prompt_render", "queue_wait", "model_load", "prompt_eval", "decode")
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """A named metric family with a fixed set of label names"""
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _samples(self) -> Iterable[str]:
+        return ()
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+
+class Counter(_Metric):
+    """Monotonic total per label set"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    """
+    Current value per label set. Gauges are set from the components' own
+    statistics when /metrics is scraped; `kind="counter"` exports a total
+    kept elsewhere (e.g. cache hits) as a counter.
+    """
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), kind: str = "gauge"):
+        super().__init__(name, help, labels)
+        self.kind = kind
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Observation counts per bucket, plus sum and count, per label set"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # One count per bucket and +Inf, then the sum
+                series = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            values = sorted((key, list(series)) for key, series in self._values.items())
+        lines = []
+        for key, series in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), series):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {int(cumulative)}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {int(cumulative)}")
+        return lines
+
+
+class Metrics:
+    """
+    Process-wide metrics in the Prometheus text exposition format.
+
+    Requests and generations record into the histograms and counters as they
+    happen; queue, in-flight and cache figures are gauges refreshed from the
+    scheduler's and caches' statistics on each scrape (see app/api/metrics.py).
+    """
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+
+        # HTTP requests per route template; `task` is the ModelTask the route serves
+        self.http_requests = Counter(
+            "aict_http_requests_total", "HTTP requests handled", ("route", "method", "task", "status")
+        )
+        self.http_latency = Histogram(
+            "aict_http_request_duration_seconds",
+            "HTTP request latency until the response body is complete",
+            ("route", "method", "task"),
+        )
+
+        # Ollama generations per task and model
+        self.generations = Counter(
+            "aict_generations_total", "Generations sent to Ollama by outcome", ("task", "model", "outcome")
+        )
+        self.generation_latency = Histogram(
+            "aict_generation_duration_seconds",
+            "Generation latency from queueing for a slot to the last token",
+            ("task", "model"),
+        )
+        self.stage_latency = Histogram(
+            "aict_stage_duration_seconds",
+            "Time spent per request stage: " + ", ".join(STAGES),
+            ("stage", "task"),
+        )
+        self.tokens_per_second = Histogram(
+            "aict_decode_tokens_per_second",
+            "Decode throughput per generation (eval_count / eval_duration)",
+            ("task", "model"),
+            buckets=TOKEN_RATE_BUCKETS,
+        )
+        self.eval_tokens = Counter("aict_eval_tokens_total", "Tokens decoded by Ollama", ("task", "model"))
+        self.prompt_tokens = Counter(
+            "aict_prompt_eval_tokens_total", "Prompt tokens evaluated by Ollama", ("task", "model")
+        )
+
+        # Refreshed on scrape
+        self.in_flight = Gauge("aict_requests_in_flight", "Generations holding a backend slot")
+        self.capacity = Gauge("aict_backend_slots", "Backend slots (concurrent generations allowed)")
+        self.queued = Gauge("aict_requests_queued", "Requests waiting for a backend slot")
+        self.cache_lookups = Gauge(
+            "aict_cache_lookups_total", "Cache lookups by result", ("cache", "result"), kind="counter"
+        )
+        self.cache_hit_ratio = Gauge("aict_cache_hit_ratio", "Share of cache lookups that were hits", ("cache",))
+        self.backend_outstanding = Gauge(
+            "aict_backend_outstanding", "Generations outstanding per Ollama node", ("backend",)
+        )
+        self.backend_up = Gauge("aict_backend_up", "1 while the Ollama node is in rotation, 0 while ejected", ("backend",))
+        self.backend_requests = Gauge(
+            "aict_backend_requests_total", "Generations sent to each Ollama node", ("backend",), kind="counter"
+        )
+
+    def observe_stage(self, stage: str, seconds: float, task: str = "none") -> None:
+        if self.enabled:
+            self.stage_latency.observe(seconds, stage=stage, task=task)
+
+    def observe_request(self, route: str, method: str, task: str, status: int, seconds: float) -> None:
+        if self.enabled:
+            self.http_requests.inc(route=route, method=method, task=task, status=str(status))
+            self.http_latency.observe(seconds, route=route, method=method, task=task)
+
+    def observe_generation(
+        self,
+        task: str,
+        model: str,
+        outcome: str,
+        seconds: float,
+        info: Optional[Dict[str, object]] = None,
+    ) -> None:
+        """
+        Record a finished generation. `info` is Ollama's final response
+        statistics; its durations are in nanoseconds.
+        """
+        if not self.enabled:
+            return
+        self.generations.inc(task=task, model=model, outcome=outcome)
+        self.generation_latency.observe(seconds, task=task, model=model)
+        if not info:
+            return
+        for stage, field in (("model_load", "load_duration"), ("prompt_eval", "prompt_eval_duration"),
+                             ("decode", "eval_duration")):
+            if info.get(field):
+                self.stage_latency.observe(info[field] / 1e9, stage=stage, task=task)
+        eval_count, eval_duration = info.get("eval_count") or 0, info.get("eval_duration") or 0
+        if eval_count:
+            self.eval_tokens.inc(eval_count, task=task, model=model)
+        if eval_count and eval_duration:
+            self.tokens_per_second.observe(eval_count / (eval_duration / 1e9), task=task, model=model)
+        if info.get("prompt_eval_count"):
+            self.prompt_tokens.inc(info["prompt_eval_count"], task=task, model=model)
+
+    def set_cache(self, cache: str, hits: int, misses: int) -> None:
+        self.cache_lookups.set(hits, cache=cache, result="hit")
+        self.cache_lookups.set(misses, cache=cache, result="miss")
+        lookups = hits + misses
+        self.cache_hit_ratio.set(hits / lookups if lookups else 0.0, cache=cache)
+
+    def render(self) -> str:
+        families = [
+            self.http_requests, self.http_latency,
+            self.generations, self.generation_latency, self.stage_latency,
+            self.tokens_per_second, self.eval_tokens, self.prompt_tokens,
+            self.in_flight, self.capacity, self.queued, self.cache_lookups, self.cache_hit_ratio,
+            self.backend_outstanding, self.backend_up, self.backend_requests,
+        ]
+        return "\n".join(line for family in families for line in family.render()) + "\n"
+
+
+# Create a singleton instance
+metrics = Metrics(enabled=settings.metrics_enabled)
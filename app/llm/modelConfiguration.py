@@ -1,6 +1,20 @@
+import httpx
 from pydantic import BaseModel
 from langchain_ollama import OllamaLLM
-from typing import List
+from typing import Any, Dict, List, Optional
+
+from app.utils.settings import settings
+from .cancellation import enable_cancellation
+
+# Address of the Ollama server (AICT_OLLAMA_BASE_URL, e.g. a fake server for benchmarks)
+OLLAMA_BASE_URL = settings.ollama_base_url
+
+# Ollama nodes generations are balanced across (AICT_OLLAMA_BACKENDS, else just the one above)
+OLLAMA_BACKENDS = [url.rstrip("/") for url in settings.ollama_backends] or [OLLAMA_BASE_URL.rstrip("/")]
+
+# Every generation opens its own connection, so cancelling one can shut down exactly
+# its socket; connecting to a local server costs nothing next to a generation
+GENERATION_LIMITS = httpx.Limits(max_keepalive_connections=0)
 
 class OllamaModelConfig(BaseModel):
     # Basic model configuration
@@ -10,14 +24,45 @@ class OllamaModelConfig(BaseModel):
     top_k: int = 40
     repeat_penalty: float = 1.1
     stop: List[str] = []
+
+    # Resource and length limits
+    num_ctx: int = 4096                 # Context window in tokens
+    num_predict: Optional[int] = None   # Maximum tokens to generate (None = Ollama default)
+    num_thread: Optional[int] = None    # CPU threads used for decoding (None = Ollama default)
+    keep_alive: Optional[str] = None    # How long Ollama keeps the model loaded, e.g. "30m"
+    request_timeout: float = 120
     
-    def create_model(self) -> OllamaLLM:
-        # Create an Ollama model instance with optimized settings
-        return OllamaLLM(
+    def create_model(self, base_url: Optional[str] = None) -> OllamaLLM:
+        # Create an Ollama model instance passing every configured option through
+        model = OllamaLLM(
             model=self.name,
-            base_url="http://localhost:11434",
+            base_url=base_url or OLLAMA_BASE_URL,
             temperature=self.temperature,
-            request_timeout=120,
-            context_window=4096,
+            top_p=self.top_p,
+            top_k=self.top_k,
+            repeat_penalty=self.repeat_penalty,
+            stop=self.stop or None,
+            num_ctx=self.num_ctx,
+            num_predict=self.num_predict,
+            num_thread=self.num_thread,
+            keep_alive=self.keep_alive,
+            client_kwargs={"timeout": self.request_timeout, "limits": GENERATION_LIMITS},
             verbose=True,
-        )
\ No newline at end of file
+        )
+        enable_cancellation(model)
+        return model
+
+
+    def options(self, **overrides: Any) -> Dict[str, Any]:
+        """Per-call Ollama options matching this configuration, with overrides"""
+        return {
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "top_k": self.top_k,
+            "repeat_penalty": self.repeat_penalty,
+            "stop": self.stop or None,
+            "num_ctx": self.num_ctx,
+            "num_predict": self.num_predict,
+            "num_thread": self.num_thread,
+            **overrides,
+        }
@@ -0,0 +1,85 @@
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from langchain_ollama import OllamaLLM
+
+from .modelConfiguration import OllamaModelConfig
+from .modelTask import ModelTask
+
+
+class ModelPool:
+    """
+    Process-wide pool of Ollama models and compiled chains.
+
+    Models are created lazily on first use and then shared by every request.
+    Entries are keyed by the task and a fingerprint of its configuration, so a
+    changed config never reuses a model built from the old one.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._models: Dict[Tuple[ModelTask, str, Optional[str]], OllamaLLM] = {}
+        self._chains: Dict[Tuple[str, ModelTask, str], Any] = {}
+
+    @staticmethod
+    def _config_key(config: OllamaModelConfig) -> str:
+        """Stable fingerprint of a model configuration"""
+        return config.model_dump_json()
+
+    def get_model(self, task: ModelTask, config: OllamaModelConfig, base_url: Optional[str] = None) -> OllamaLLM:
+        """Return the pooled model for a task (on one Ollama node), creating it on first use"""
+        key = (task, self._config_key(config), base_url)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            # Another thread may have built it while we waited for the lock
+            model = self._models.get(key)
+            if model is None:
+                model = config.create_model(base_url)
+                self._models[key] = model
+            return model
+
+    def get_chain(
+        self,
+        name: str,
+        task: ModelTask,
+        config: OllamaModelConfig,
+        builder: Callable[[OllamaLLM, OllamaModelConfig], Any],
+    ) -> Any:
+        """Return the compiled chain `name` for a task, building it on first use"""
+        key = (name, task, self._config_key(config))
+        chain = self._chains.get(key)
+        if chain is not None:
+            return chain
+
+        with self._lock:
+            chain = self._chains.get(key)
+            if chain is None:
+                chain = builder(self.get_model(task, config), config)
+                self._chains[key] = chain
+            return chain
+
+    def invalidate(self, task: Optional[ModelTask] = None) -> None:
+        """
+        Drop pooled models and chains.
+
+        Call this whenever MODEL_REGISTRY changes. With no task given the
+        whole pool is cleared.
+        """
+        with self._lock:
+            if task is None:
+                self._models.clear()
+                self._chains.clear()
+                return
+            self._models = {k: v for k, v in self._models.items() if k[0] != task}
+            self._chains = {k: v for k, v in self._chains.items() if k[1] != task}
+
+    def stats(self) -> Dict[str, int]:
+        """Number of pooled models and chains"""
+        with self._lock:
+            return {"models": len(self._models), "chains": len(self._chains)}
+
+
+# Create a singleton instance
+model_pool = ModelPool()
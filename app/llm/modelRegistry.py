@@ -1,7 +1,12 @@
 from .modelConfiguration import OllamaModelConfig
 from .modelTask import ModelTask
+from .modelPool import model_pool
 from langchain_community.llms import Ollama
-from typing import Dict
+from typing import Any, Dict, List, Optional
+from app.utils.settings import settings
+from app.utils.structuredLog import get_logger
+
+logger = get_logger("models")
 
 # Define model configurations for each task
 MODEL_REGISTRY: Dict[ModelTask, OllamaModelConfig] = {
@@ -11,12 +16,9 @@ MODEL_REGISTRY: Dict[ModelTask, OllamaModelConfig] = {
         top_p=0.1,       # More focused sampling
         top_k=40,
         repeat_penalty=1.2,
+        # Markdown fences are handled by the output guard: a stop on the opening
+        # fence would end the generation before any code
         stop=[
-            "```",
-            "```python",
-            "```javascript",
-            "```java",
-            "```cpp",
             "# Task:",
             "# System:",
             "# Response"
@@ -29,7 +31,6 @@ MODEL_REGISTRY: Dict[ModelTask, OllamaModelConfig] = {
         top_k=40,
         repeat_penalty=1.1,
         stop=[
-            "```",
             "# Task:",
             "# System:",
             "# Requirements:",
@@ -46,17 +47,83 @@ MODEL_REGISTRY: Dict[ModelTask, OllamaModelConfig] = {
     )
 }
 
-def get_model_for_task(task: ModelTask) -> Ollama:
+# Named performance profiles applied on top of the registry configuration.
+# They bound the context window and decode length so latency stays predictable.
+PERFORMANCE_PROFILES: Dict[ModelTask, Dict[str, Dict[str, Any]]] = {
+    ModelTask.CODE_GENERATION: {
+        "low-latency": {"num_ctx": 2048, "num_predict": 384, "top_k": 20},
+        "balanced": {"num_ctx": 4096, "num_predict": 1024},
+        "high-quality": {"num_ctx": 8192, "num_predict": 2048},
+    },
+    ModelTask.CODE_TRANSLATION: {
+        "low-latency": {"num_ctx": 2048, "num_predict": 768, "top_k": 20},
+        "balanced": {"num_ctx": 4096, "num_predict": 1536},
+        "high-quality": {"num_ctx": 8192, "num_predict": 3072},
+    },
+    ModelTask.CODE_EXPLANATION: {
+        "low-latency": {"num_ctx": 2048, "num_predict": 256, "top_k": 20},
+        "balanced": {"num_ctx": 4096, "num_predict": 768},
+        "high-quality": {"num_ctx": 8192, "num_predict": 1536},
+    },
+}
+
+def resolve_profile(task: ModelTask, profile: Optional[str] = None) -> str:
     """
-    Get the appropriate LLM model for a specific task.
+    Pick the profile for a request: the requested one, else the deployment's
+    per-task choice, else the deployment default.
+    """
+    name = profile or settings.task_profiles.get(task.value) or settings.profile
+    if name not in PERFORMANCE_PROFILES.get(task, {}):
+        raise KeyError(f"Unknown performance profile '{name}' for task: {task.value}")
+    return name
+
+def get_config_for_task(task: ModelTask, profile: Optional[str] = None) -> OllamaModelConfig:
+    """
+    Get the model configuration for a specific task with its performance profile applied.
     """
-    print(f"Getting model for task: {task.name}")
-    
     if task not in MODEL_REGISTRY:
         raise KeyError(f"No model configured for task: {task}")
     
-    config = MODEL_REGISTRY[task]
-    model = config.create_model()
-    
-    print(f"Using model: {config.name}")
-    return model
\ No newline at end of file
+    overrides = dict(PERFORMANCE_PROFILES[task][resolve_profile(task, profile)])
+    if settings.num_thread is not None:
+        overrides.setdefault("num_thread", settings.num_thread)
+    if MODEL_REGISTRY[task].keep_alive is None and settings.keep_alive:
+        overrides["keep_alive"] = settings.keep_alive
+    return MODEL_REGISTRY[task].model_copy(update=overrides)
+
+def registered_models() -> List[str]:
+    """Distinct Ollama model names in the registry, in registry order"""
+    return list(dict.fromkeys(config.name for config in MODEL_REGISTRY.values()))
+
+# Options that decide how Ollama loads a model: a request with different values reloads it
+LOAD_OPTIONS = ("num_ctx", "num_thread")
+
+def preload_options() -> Dict[str, Dict[str, Any]]:
+    """
+    Load options for each registered model, from the default profile of the
+    first task that uses it, so a preload loads the model the way its first
+    request will need it instead of with Ollama's defaults.
+    """
+    options: Dict[str, Dict[str, Any]] = {}
+    for task, config in MODEL_REGISTRY.items():
+        if config.name not in options:
+            loaded = get_config_for_task(task).options()
+            options[config.name] = {key: loaded[key] for key in LOAD_OPTIONS if loaded[key] is not None}
+    return options
+
+def get_model_for_task(task: ModelTask, profile: Optional[str] = None) -> Ollama:
+    """
+    Get the appropriate LLM model for a specific task.
+    Models are pooled, so repeated calls return the same instance.
+    """
+    config = get_config_for_task(task, profile)
+    model = model_pool.get_model(task, config)
+    logger.debug("model for task", extra={"task": task.value, "model": config.name})
+    return model
+
+def register_model(task: ModelTask, config: OllamaModelConfig) -> None:
+    """
+    Replace the model configuration for a task and drop its pooled models and chains.
+    """
+    MODEL_REGISTRY[task] = config
+    model_pool.invalidate(task)
\ No newline at end of file
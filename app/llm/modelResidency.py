@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional
+
+import httpx
+
+from app.utils.settings import settings
+from .backendPool import backend_pool
+from .modelConfiguration import OLLAMA_BACKENDS
+
+
+class ModelResidency:
+    """
+    Keeps track of which models Ollama has loaded.
+
+    The registered models are preloaded at startup with an explicit
+    keep_alive so the first request does not pay for loading them. Every
+    finished generation reports Ollama's load_duration; a generation that
+    had to load its model counts as a load, and loading a model that was
+    already loaded earlier counts as a swap (it was evicted in between).
+    With several backend nodes every node is preloaded, and loads and swaps
+    are counted per node.
+    """
+    def __init__(self, base_urls: List[str], keep_alive: Optional[str], load_threshold_ms: float, timeout: float = 300.0):
+        self.base_urls = [url.rstrip("/") for url in base_urls]
+        self.keep_alive = keep_alive
+        self.load_threshold_ms = load_threshold_ms
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, float]] = {}
+        self._loaded_once: set = set()
+        self._preloaded: Dict[str, Any] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def _model(self, name: str) -> Dict[str, float]:
+        # Caller holds the lock
+        return self._models.setdefault(name, {"generations": 0, "loads": 0, "swaps": 0, "load_ms": 0.0})
+
+    def _record_load(self, name: str, load_ms: float, backend: Optional[str]) -> None:
+        # Caller holds the lock
+        model = self._model(name)
+        model["loads"] += 1
+        model["load_ms"] += load_ms
+        if (backend, name) in self._loaded_once:
+            model["swaps"] += 1
+        self._loaded_once.add((backend, name))
+
+    def preload(self, models: Mapping[str, Mapping[str, Any]]) -> Dict[str, Any]:
+        """
+        Ask Ollama to load each model now (a generate request without a
+        prompt) with its load options (context size, threads) and keep it
+        loaded for keep_alive. Returns the load time in milliseconds per
+        model, or the error for models that failed; with several backend
+        nodes, those results per node URL.
+        """
+        per_backend = {url: self._preload_backend(url, models) for url in self.base_urls}
+        results = per_backend[self.base_urls[0]] if len(self.base_urls) == 1 else per_backend
+        with self._lock:
+            self._preloaded.update(results)
+        return results
+
+    def _preload_backend(self, base_url: str, models: Mapping[str, Mapping[str, Any]]) -> Dict[str, Any]:
+        results: Dict[str, Any] = {}
+        for name, options in models.items():
+            started = time.perf_counter()
+            body: Dict[str, Any] = {"model": name, "stream": False}
+            if options:
+                # Loaded with other options, Ollama would load the model again for the first request
+                body["options"] = dict(options)
+            if self.keep_alive:
+                body["keep_alive"] = self.keep_alive
+            try:
+                response = httpx.post(f"{base_url}/api/generate", json=body, timeout=self.timeout)
+                response.raise_for_status()
+                # The last line carries the statistics whether or not the reply was streamed
+                final = json.loads(response.text.strip().splitlines()[-1])
+                load_ms = final.get("load_duration", 0) / 1e6 or (time.perf_counter() - started) * 1000
+                results[name] = round(load_ms, 2)
+                with self._lock:
+                    self._record_load(name, load_ms, base_url)
+                backend_pool.mark_resident(base_url, name)
+            except Exception as e:
+                results[name] = {"error": str(e) or type(e).__name__}
+        return results
+
+    def start_preload(self, models: Mapping[str, Mapping[str, Any]]) -> None:
+        """Preload in the background so startup is not held up"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.preload, args=(models,), name="model-preload", daemon=True)
+        self._thread.start()
+
+    def record(self, name: str, info: Optional[Mapping[str, Any]], backend: Optional[str] = None) -> None:
+        """Record a finished generation from Ollama's final response statistics"""
+        load_ms = (info or {}).get("load_duration", 0) / 1e6
+        with self._lock:
+            self._model(name)["generations"] += 1
+            if load_ms >= self.load_threshold_ms:
+                self._record_load(name, load_ms, backend)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            loads = sum(model["loads"] for model in self._models.values())
+            load_ms = sum(model["load_ms"] for model in self._models.values())
+            return {
+                "keep_alive": self.keep_alive,
+                "preloaded": dict(self._preloaded),
+                "loads": loads,
+                "swaps": sum(model["swaps"] for model in self._models.values()),
+                "total_load_ms": round(load_ms, 2),
+                "avg_load_ms": round(load_ms / loads, 2) if loads else 0.0,
+                "models": {
+                    name: {**model, "load_ms": round(model["load_ms"], 2)}
+                    for name, model in self._models.items()
+                },
+            }
+
+
+# Create a singleton instance
+model_residency = ModelResidency(
+    base_urls=OLLAMA_BACKENDS,
+    keep_alive=settings.keep_alive,
+    load_threshold_ms=settings.model_load_threshold_ms,
+)
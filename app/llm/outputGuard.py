@@ -0,0 +1,306 @@
+import re
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.utils.settings import settings
+from .modelTask import ModelTask
+
+# Prompt headings the model starts echoing once it has run past its answer, as
+# the chains' prompts write them. Each pattern is matched at column 0 against a
+# whole line, so an ordinary comment that merely starts the same way
+# ("    # Write the result to disk") is not mistaken for one.
+SENTINELS: Dict[ModelTask, Tuple[str, ...]] = {
+    ModelTask.CODE_GENERATION: (
+        r"# System: You are an expert programmer\..*",
+        r"# Task: Write code in .+ that accomplishes the following:",
+        r"# Requirements:",
+        r"# Response \(write only the code\):",
+    ),
+    ModelTask.CODE_TRANSLATION: (
+        r"# System: You are an expert code translator.*",
+        r"Original code \(.+\):",
+        r"# Task: Translate (?:the code|only the part) above from .+ to .+\.",
+        r"# Requirements:",
+        r"# Write the .+ code now:",
+    ),
+    ModelTask.CODE_EXPLANATION: (
+        r"# System: You are an expert programming teacher and code explainer\.",
+        r"# Task: (?:Explain the following code|The following .+ code is one part|Below are notes on) .*",
+        r"# Input:",
+        r"# Notes:",
+        r"# Instructions:",
+        r"# Output(?: your explanation| your notes)?:",
+    ),
+}
+
+# Tasks whose answer is code only: an opening markdown fence is dropped and a
+# closing fence ends the answer
+FENCED_TASKS = (ModelTask.CODE_GENERATION, ModelTask.CODE_TRANSLATION)
+
+FENCE = "```"
+
+# How every heading in SENTINELS begins; a line starting like this is held back
+# until it is complete and can be told apart from ordinary output
+_HEADING_STARTS = ("#", "Original code")
+
+# Words and single symbols, for repetition detection
+_TOKENS = re.compile(r"\w+|[^\w\s]")
+_WORD = re.compile(r"\w")
+
+
+class GuardStop(NamedTuple):
+    """Why a generation was stopped early and where its clean output ends"""
+    reason: str  # "repetition", "length_ratio", "sentinel", "fence" or "token_cap"
+    clean_chars: int
+
+
+class OutputGuard:
+    """
+    Watches one generation as it streams and stops it once it degenerates.
+
+    Checks, in order of how cheaply they trip:
+    - token cap: a hard limit on decoded tokens
+    - sentinels: a whole line that is one of the prompt's headings (the model echoing its prompt)
+    - fences: for code-only tasks, a closing markdown fence ends the code
+    - length ratio: output tokens beyond a multiple of the input code's tokens
+    - repetition: the output ends with one block of tokens repeated back to back,
+      spanning at least `min_repeat_words` words (so a `# =====` banner or a run
+      of closing brackets is not taken for a loop)
+
+    feed() returns the text to pass on; once `stop` is set the decode should
+    be aborted, and output[:stop.clean_chars] is the answer. A line that may
+    be a prompt heading is passed on only once it is complete.
+    """
+    def __init__(
+        self,
+        task: ModelTask,
+        input_tokens: int = 0,
+        max_tokens: int = 4096,
+        length_ratio: Optional[float] = None,
+        min_tokens: int = 256,
+        ngram: int = 8,
+        min_repeats: int = 3,
+        min_repeat_tokens: int = 64,
+        min_repeat_words: int = 24,
+    ):
+        self.max_tokens = max_tokens
+        self.length_limit = max(min_tokens, int(length_ratio * input_tokens)) if length_ratio else None
+        self.ngram = ngram
+        self.min_repeats = min_repeats
+        self.min_repeat_tokens = min_repeat_tokens
+        self.min_repeat_words = min_repeat_words
+        self.fenced = task in FENCED_TASKS
+        sentinels = SENTINELS.get(task, ())
+        # Only complete lines match, so a heading is never judged on its first few characters
+        self._sentinel = re.compile(
+            r"(?m)^(?:" + "|".join(sentinels) + r")[ \t]*\r?(?=\n)"
+        ) if sentinels else None
+
+        self.output = ""  # text received so far, after fence filtering
+        self._passed = 0  # how much of it has been passed on
+        self.tokens = 0  # chunks decoded (Ollama streams one token per chunk)
+        self.stop: Optional[GuardStop] = None
+        # Fence handling: the start of a line held back while it may be a fence
+        self._held = ""
+        self._mid_line = False
+        self._opened = False
+        # Where the next sentinel scan starts (start of the current line)
+        self._scan_from = 0
+        # Repetition: tokens with their end offsets, the number of word tokens up to and
+        # including each one, and the last position of each n-gram
+        self._words: List[str] = []
+        self._ends: List[int] = []
+        self._word_counts: List[int] = []
+        self._seen: Dict[Tuple[str, ...], int] = {}
+        self._tokenized = 0
+
+    def feed(self, text: str) -> str:
+        """Add one streamed chunk; returns the text to pass on"""
+        if self.stop is not None:
+            return ""
+        self.tokens += 1
+        if self.fenced:
+            text = self._filter_fences(text)
+        self.output += text
+
+        if self.stop is None and self.tokens >= self.max_tokens:
+            self._stop("token_cap", len(self.output))
+        if self.stop is None:
+            self._check_sentinels()
+        if self.stop is None and self.length_limit is not None and self.tokens > self.length_limit:
+            self._stop("length_ratio", self._line_start(len(self.output)))
+        if self.stop is None:
+            self._check_repetition()
+
+        return self._pass_on(self.stop.clean_chars if self.stop is not None else self._passable())
+
+    def finish(self) -> str:
+        """Text still held back when the generation ends by itself"""
+        held, self._held = self._held, ""
+        if self.stop is not None:
+            return ""
+        if not held.lstrip(" \t").startswith(FENCE):
+            self.output += held
+        # The last line has no line break to end it; it may still be an echoed heading
+        if self._sentinel is not None:
+            match = self._sentinel.search(self.output + "\n", self._scan_from)
+            if match:
+                self._stop("sentinel", len(self.output[:match.start()].rstrip()))
+        return self._pass_on(self.stop.clean_chars if self.stop is not None else len(self.output))
+
+    def _pass_on(self, end: int) -> str:
+        start = self._passed
+        self._passed = max(start, end)
+        return self.output[start:self._passed]
+
+    def _passable(self) -> int:
+        """End of the text that can be passed on: all of it, unless the last line may be a heading"""
+        if self._sentinel is None:
+            return len(self.output)
+        line_start = self.output.rfind("\n") + 1
+        line = self.output[line_start:]
+        if line and any(line.startswith(start) or start.startswith(line) for start in _HEADING_STARTS):
+            return line_start
+        return len(self.output)
+
+    def _stop(self, reason: str, clean_chars: int) -> None:
+        self.stop = GuardStop(reason, clean_chars)
+        output_guard_monitor.record(reason)
+
+    def _line_start(self, position: int) -> int:
+        """Start of the line containing position, or position itself on the first line"""
+        return self.output.rfind("\n", 0, position) + 1 or position
+
+    def _filter_fences(self, text: str) -> str:
+        """Drop the opening fence line and stop at the closing fence"""
+        passed = []
+        for piece in text.splitlines(keepends=True):
+            if self._mid_line:
+                passed.append(piece)
+                self._mid_line = not piece.endswith("\n")
+                continue
+
+            line = self._held + piece
+            head = line.lstrip(" \t")
+            if head.startswith(FENCE) or (not line.endswith("\n") and FENCE.startswith(head)):
+                if not line.endswith("\n"):
+                    # Wait for the rest of the line to tell a fence from other code
+                    self._held = line
+                    continue
+                self._held = ""
+                if self._is_closing():
+                    before = self.output + "".join(passed)
+                    self._stop("fence", len(before.rstrip()) if before.strip() else len(before))
+                    return "".join(passed)
+                self._opened = True
+                continue
+
+            self._held = ""
+            passed.append(line)
+            self._mid_line = not line.endswith("\n")
+        return "".join(passed)
+
+    def _is_closing(self) -> bool:
+        if self._opened:
+            return True
+        # Before any code, or after a line introducing it ("Here is the code:"), a fence opens
+        written = self.output.strip()
+        return bool(written) and not written.endswith(":")
+
+    def _check_sentinels(self) -> None:
+        if self._sentinel is not None:
+            match = self._sentinel.search(self.output, self._scan_from)
+            if match:
+                self._stop("sentinel", len(self.output[:match.start()].rstrip()))
+                return
+        self._scan_from = self.output.rfind("\n") + 1
+
+    def _check_repetition(self) -> None:
+        # Only whole words are tokenized; a word may continue in the next chunk
+        boundary = max(self.output.rfind(" "), self.output.rfind("\n"), self.output.rfind("\t")) + 1
+        if boundary <= self._tokenized:
+            return
+        for match in _TOKENS.finditer(self.output, self._tokenized, boundary):
+            token = match.group()
+            self._words.append(token)
+            self._ends.append(match.end())
+            counted = self._word_counts[-1] if self._word_counts else 0
+            self._word_counts.append(counted + (1 if _WORD.match(token) else 0))
+            if self._repeats_at(len(self._words) - 1):
+                return
+        self._tokenized = boundary
+
+    def _repeats_at(self, i: int) -> bool:
+        """Whether the tokens up to i end with one block repeated enough times"""
+        n = self.ngram
+        if i + 1 < n:
+            return False
+        key = tuple(self._words[i - n + 1:i + 1])
+        previous = self._seen.get(key)
+        self._seen[key] = i
+        if previous is None:
+            return False
+
+        period = i - previous
+        # Words in one copy of the block; symbols alone (banners, brackets) never count as a loop
+        block_words = self._word_counts[i] - self._word_counts[previous]
+        if not block_words:
+            return False
+        repeats = max(
+            self.min_repeats,
+            -(-self.min_repeat_tokens // period),
+            -(-self.min_repeat_words // block_words),
+        )
+        span = period * repeats
+        first = i - span + 1
+        if first < 0 or self._words[first:i - period + 1] != self._words[first + period:i + 1]:
+            return False
+
+        # Keep the first copy of the block, cut back to a line break when there is one in it
+        cut = self._ends[first + period - 1]
+        second = first + period
+        next_start = self._ends[second] - len(self._words[second])
+        block_start = self._ends[first - 1] if first else 0
+        line_break = self.output.rfind("\n", block_start, next_start)
+        self._stop("repetition", line_break + 1 if line_break >= 0 else cut)
+        return True
+
+
+def create_output_guard(task: ModelTask, input_tokens: int = 0) -> Optional[OutputGuard]:
+    """An output guard for one generation with the deployment's limits, or None when disabled"""
+    if not settings.output_guard_enabled:
+        return None
+    return OutputGuard(
+        task,
+        input_tokens=input_tokens,
+        max_tokens=settings.guard_max_tokens,
+        length_ratio=settings.guard_length_ratios.get(task.value),
+        min_tokens=settings.guard_min_tokens,
+        ngram=settings.guard_ngram,
+        min_repeats=settings.guard_min_repeats,
+        min_repeat_tokens=settings.guard_min_repeat_tokens,
+        min_repeat_words=settings.guard_min_repeat_words,
+    )
+
+
+class OutputGuardMonitor:
+    """How often, and why, generations were stopped early"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stops: Dict[str, int] = {}
+
+    def record(self, reason: str) -> None:
+        with self._lock:
+            self._stops[reason] = self._stops.get(reason, 0) + 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "enabled": settings.output_guard_enabled,
+                "stopped": sum(self._stops.values()),
+                "by_reason": dict(self._stops),
+            }
+
+
+# Create a singleton instance
+output_guard_monitor = OutputGuardMonitor()
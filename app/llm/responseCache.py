@@ -0,0 +1,254 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.utils.settings import settings
+from .modelConfiguration import OllamaModelConfig
+from .modelTask import ModelTask
+
+
+class ResponseCache:
+    """
+    Two-tier cache for model responses.
+
+    The memory tier is an LRU bounded by entry count and TTL. The optional
+    disk tier is a SQLite database, so cached responses survive restarts.
+    Disk hits are promoted back into memory.
+
+    Several API processes can share one disk tier. Invalidations, of a task
+    or of a single key, are recorded in it too, and every `sync_interval`
+    seconds each process drops the memory entries another process has
+    invalidated.
+    """
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        db_path: Optional[str] = None,
+        disk_max_entries: int = 10000,
+        sync_interval: float = 1.0,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        self.sync_interval = sync_interval
+        # Task ("" for all) -> time of the latest invalidation already applied to memory
+        self._invalidated: Dict[str, float] = {}
+        # Time of the latest single-key invalidation already applied to memory
+        self._keys_invalidated_at = 0.0
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+        # key -> (value, task, expires_at)
+        self._memory: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+        self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str) -> None:
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # Other API processes may be writing; wait for them rather than failing
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                task TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_task ON responses (task)")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS invalidations (
+                task TEXT PRIMARY KEY,
+                invalidated_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS key_invalidations (
+                key TEXT PRIMARY KEY,
+                invalidated_at REAL NOT NULL
+            )"""
+        )
+        self._db.commit()
+        self._invalidated = dict(self._db.execute("SELECT task, invalidated_at FROM invalidations").fetchall())
+        self._keys_invalidated_at = self._db.execute(
+            "SELECT COALESCE(MAX(invalidated_at), 0) FROM key_invalidations"
+        ).fetchone()[0]
+        self._synced_at = time.monotonic()
+
+    def _sync_invalidations(self) -> None:
+        # Caller holds the lock; apply invalidations made by other processes to the memory tier
+        now = time.monotonic()
+        if self._db is None or now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
+        for task, invalidated_at in self._db.execute("SELECT task, invalidated_at FROM invalidations"):
+            if invalidated_at > self._invalidated.get(task, 0.0):
+                self._invalidated[task] = invalidated_at
+                self._drop_memory(task or None)
+        for key, invalidated_at in self._db.execute(
+            "SELECT key, invalidated_at FROM key_invalidations WHERE invalidated_at > ?",
+            (self._keys_invalidated_at,),
+        ).fetchall():
+            self._memory.pop(key, None)
+            self._keys_invalidated_at = max(self._keys_invalidated_at, invalidated_at)
+
+    def _drop_memory(self, task: Optional[str]) -> int:
+        # Caller holds the lock
+        if task is None:
+            removed = len(self._memory)
+            self._memory.clear()
+            return removed
+        keys = [k for k, entry in self._memory.items() if entry[1] == task]
+        for k in keys:
+            del self._memory[k]
+        return len(keys)
+
+    @staticmethod
+    def make_key(task: ModelTask, config: OllamaModelConfig, prompt: str, language: str) -> str:
+        """
+        Cache key covering everything that can change a response: the task,
+        the model name and every generation parameter, the rendered prompt
+        and the detected language.
+        """
+        payload = json.dumps(
+            {
+                "task": task.value,
+                "config": config.model_dump(),
+                "prompt": prompt,
+                "language": language,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            self._sync_invalidations()
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, task, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, task, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[2] > now:
+                    self._remember(key, row[0], row[1], row[2])
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                    return row[0]
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str, task: ModelTask) -> None:
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, value, task.value, expires_at)
+            self._stats["writes"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, task, value, created_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, task.value, value, now, expires_at),
+                )
+                self._prune_disk(now)
+                self._db.commit()
+
+    def _remember(self, key: str, value: str, task: str, expires_at: float) -> None:
+        self._memory[key] = (value, task, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _prune_disk(self, now: float) -> None:
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max_entries,),
+        )
+
+    def invalidate(self, task: Optional[ModelTask] = None) -> int:
+        """Remove cached responses for one task, or everything. Returns entries removed."""
+        with self._lock:
+            removed = self._drop_memory(task.value if task is not None else None)
+
+            if self._db is not None:
+                if task is None:
+                    cursor = self._db.execute("DELETE FROM responses")
+                else:
+                    cursor = self._db.execute("DELETE FROM responses WHERE task = ?", (task.value,))
+                # Tells processes sharing the database to drop their memory entries too
+                invalidated_at = time.time()
+                name = task.value if task is not None else ""
+                self._db.execute(
+                    "INSERT OR REPLACE INTO invalidations (task, invalidated_at) VALUES (?, ?)",
+                    (name, invalidated_at),
+                )
+                self._db.commit()
+                self._invalidated[name] = invalidated_at
+                removed = max(removed, cursor.rowcount)
+            return removed
+
+    def invalidate_key(self, key: str) -> int:
+        """Remove one cached response by its key. Returns entries removed (0 or 1)."""
+        with self._lock:
+            removed = 1 if self._memory.pop(key, None) is not None else 0
+
+            if self._db is not None:
+                cursor = self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                # Tells processes sharing the database to drop the key from memory too;
+                # a record older than the TTL has no memory entry left to drop
+                invalidated_at = time.time()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO key_invalidations (key, invalidated_at) VALUES (?, ?)",
+                    (key, invalidated_at),
+                )
+                self._db.execute(
+                    "DELETE FROM key_invalidations WHERE invalidated_at < ?", (invalidated_at - self.ttl,)
+                )
+                self._db.commit()
+                self._keys_invalidated_at = max(self._keys_invalidated_at, invalidated_at)
+                removed = max(removed, cursor.rowcount)
+            return removed
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            stats: Dict[str, object] = dict(self._stats)
+            stats["hit_rate"] = round(self._stats["hits"] / lookups, 4) if lookups else 0.0
+            stats["memory_entries"] = len(self._memory)
+            stats["max_entries"] = self.max_entries
+            stats["ttl_seconds"] = self.ttl
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return stats
+
+
+# Create a singleton instance
+response_cache = ResponseCache(
+    max_entries=settings.cache_max_entries,
+    ttl=settings.cache_ttl,
+    db_path=settings.cache_db_path,
+    disk_max_entries=settings.cache_disk_max_entries,
+    sync_interval=settings.cache_sync_interval,
+)
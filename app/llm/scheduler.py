@@ -0,0 +1,304 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.utils.settings import settings
+from .cancellation import RequestCancelledError, cancellation_registry, request_cancellation
+from .metrics import metrics
+from .modelConfiguration import OLLAMA_BACKENDS
+from .sharedState import shared_state
+from .tracing import span
+from .modelTask import ModelTask
+
+# Lower rank is served first
+PRIORITY_CLASSES: Dict[str, int] = {
+    "interactive": 0,
+    "batch": 1,
+}
+
+
+class RequestContext(BaseModel):
+    """Scheduling identity of the request currently being served"""
+    client_id: str = "anonymous"
+    priority: str = "interactive"
+
+
+# Set by the API layer, read wherever an Ollama slot is acquired
+request_context: ContextVar[RequestContext] = ContextVar("request_context", default=RequestContext())
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the scheduler queue is at its maximum depth"""
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ("event", "enqueued_at", "model", "key", "client_id", "granted")
+
+    def __init__(self, key: Tuple[int, int], client_id: str, model: Optional[str] = None):
+        self.event = threading.Event()
+        self.enqueued_at = time.monotonic()
+        self.model = model
+        self.key = key
+        self.client_id = client_id
+        self.granted = False
+
+
+class RequestScheduler:
+    """
+    Admission control in front of the Ollama backend.
+
+    At most `capacity` generations run at once. Everything else waits in
+    priority queues ordered by request class (interactive before batch) and
+    then by task priority. Within one priority level, clients are served
+    round-robin so a single client cannot monopolise the backend. Once
+    `max_queue_depth` requests are waiting, new ones are rejected.
+
+    Within a priority level, requests for the model Ollama is already running
+    are served ahead of requests that would make it switch models, as long as
+    the request being passed over has waited less than `affinity_window`
+    seconds. This saves model swaps on hosts that cannot keep every model
+    loaded; set the window to 0 for strict arrival order.
+
+    A queued request whose client disconnects or whose deadline passes is
+    withdrawn from the queue at once instead of waiting for its turn.
+    """
+    def __init__(
+        self,
+        capacity: int,
+        max_queue_depth: int,
+        task_priorities: Dict[str, int],
+        affinity_window: float = 0.0,
+    ):
+        self.capacity = capacity
+        self.max_queue_depth = max_queue_depth
+        self.task_priorities = task_priorities
+        self.affinity_window = affinity_window
+        self._lock = threading.Lock()
+        # priority key -> client id -> waiting tickets
+        self._queues: Dict[Tuple[int, int], "OrderedDict[str, Deque[_Ticket]]"] = {}
+        self._depth = 0
+        self._in_flight = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._withdrawn = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        # Exponentially weighted average of how long a slot is held
+        self._avg_service_time = 0.0
+        # Model affinity: generations in flight per model and the last model started
+        self._running: Dict[str, int] = {}
+        self._last_model: Optional[str] = None
+        self._model_switches = 0
+        self._affinity_reorders = 0
+
+    def _priority_key(self, task: ModelTask, priority: str) -> Tuple[int, int]:
+        return (
+            PRIORITY_CLASSES.get(priority, PRIORITY_CLASSES["interactive"]),
+            self.task_priorities.get(task.value, 0),
+        )
+
+    def retry_after(self) -> float:
+        """Rough estimate of how long until a queued request would be served"""
+        service_time = self._avg_service_time or 1.0
+        return max(1.0, (self._depth + 1) * service_time / self.capacity)
+
+    def check_admission(self) -> None:
+        """Reject early, before any work is done, when the queue is already full"""
+        with self._lock:
+            if self._depth >= self.max_queue_depth:
+                self._rejected += 1
+                raise QueueFullError("Request queue is full", retry_after=self.retry_after())
+
+    def _start(self, model: Optional[str]) -> None:
+        # Caller holds the lock
+        self._in_flight += 1
+        if model is None:
+            return
+        self._running[model] = self._running.get(model, 0) + 1
+        if self._last_model is not None and model != self._last_model:
+            self._model_switches += 1
+        self._last_model = model
+
+    def _preferred_model(self) -> Optional[str]:
+        # Caller holds the lock; the model busiest right now, else the last one used
+        if self._running:
+            return max(self._running, key=self._running.get)
+        return self._last_model
+
+    def acquire(self, task: ModelTask, model: Optional[str] = None) -> float:
+        """
+        Block until a slot is free for this request; returns the time spent
+        queued. Raises RequestCancelledError if the request is cancelled first.
+        """
+        context = request_context.get()
+        token = request_cancellation.get()
+        if token is not None:
+            token.check()
+        with self._lock:
+            if self._in_flight < self.capacity and self._depth == 0:
+                self._start(model)
+                self._admitted += 1
+                return 0.0
+            if self._depth >= self.max_queue_depth:
+                self._rejected += 1
+                raise QueueFullError("Request queue is full", retry_after=self.retry_after())
+
+            ticket = _Ticket(self._priority_key(task, context.priority), context.client_id, model)
+            clients = self._queues.setdefault(ticket.key, OrderedDict())
+            clients.setdefault(context.client_id, deque()).append(ticket)
+            self._depth += 1
+
+        # Slots are handed over by release(), which also counts the ticket as in flight
+        if token is None:
+            ticket.event.wait()
+        else:
+            unregister = token.on_cancel(ticket.event.set)
+            try:
+                while not ticket.event.wait(token.remaining()) and not token.cancelled:
+                    pass
+            finally:
+                unregister()
+            with self._lock:
+                if not ticket.granted:
+                    self._withdraw(ticket)
+            if not ticket.granted:
+                cancellation_registry.record("withdrawn_from_queue")
+                raise RequestCancelledError(token.reason)
+        waited = time.monotonic() - ticket.enqueued_at
+        with self._lock:
+            self._admitted += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+        return waited
+
+    def release(self, held_for: Optional[float] = None, model: Optional[str] = None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if model is not None:
+                self._running[model] -= 1
+                if not self._running[model]:
+                    del self._running[model]
+            if held_for is not None:
+                self._avg_service_time = (
+                    held_for if not self._avg_service_time
+                    else 0.8 * self._avg_service_time + 0.2 * held_for
+                )
+            self._dispatch()
+
+    def _withdraw(self, ticket: _Ticket) -> None:
+        # Caller holds the lock
+        clients = self._queues[ticket.key]
+        waiting = clients[ticket.client_id]
+        waiting.remove(ticket)
+        if not waiting:
+            del clients[ticket.client_id]
+        if not clients:
+            del self._queues[ticket.key]
+        self._depth -= 1
+        self._withdrawn += 1
+
+    def _pick(self, clients: "OrderedDict[str, Deque[_Ticket]]") -> Tuple[str, _Ticket]:
+        # Caller holds the lock. Round-robin head, unless a request for the running
+        # model can go first without the head waiting past the affinity window.
+        client_id, waiting = next(iter(clients.items()))
+        head = waiting[0]
+        preferred = self._preferred_model()
+        if (
+            self.affinity_window > 0 and preferred is not None and head.model not in (None, preferred)
+            and time.monotonic() - head.enqueued_at < self.affinity_window
+        ):
+            for other_id, other in clients.items():
+                for ticket in other:
+                    if ticket.model == preferred:
+                        self._affinity_reorders += 1
+                        return other_id, ticket
+        return client_id, head
+
+    def _dispatch(self) -> None:
+        # Caller holds the lock
+        while self._in_flight < self.capacity and self._depth > 0:
+            key = min(self._queues)
+            clients = self._queues[key]
+            client_id, ticket = self._pick(clients)
+            waiting = clients[client_id]
+            waiting.remove(ticket)
+            if waiting:
+                # Round-robin: this client goes to the back of its priority level
+                clients.move_to_end(client_id)
+            else:
+                del clients[client_id]
+            if not clients:
+                del self._queues[key]
+            self._depth -= 1
+            self._start(ticket.model)
+            ticket.granted = True
+            ticket.event.set()
+
+    @contextmanager
+    def slot(self, task: ModelTask, model: Optional[str] = None):
+        """
+        Hold one backend slot for the duration of the block. With several
+        API processes, a slot of the shared pool is taken as well, so
+        `capacity` bounds the generations of all processes together.
+        """
+        shared_slot = None
+        with span("queue", task=task.value) as attributes:
+            waited = self.acquire(task, model)
+            attributes["queued"] = waited > 0
+            if shared_state.enabled:
+                shared_started = time.monotonic()
+                try:
+                    shared_slot = shared_state.acquire_slot(self.capacity, request_cancellation.get())
+                except BaseException:
+                    self.release(0.0, model)
+                    raise
+                waited += time.monotonic() - shared_started
+        metrics.observe_stage("queue_wait", waited, task.value)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            if shared_slot is not None:
+                shared_state.release_slot(shared_slot)
+            self.release(time.monotonic() - started, model)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            waited = self._admitted or 1
+            return {
+                "in_flight": self._in_flight,
+                "capacity": self.capacity,
+                "queue_depth": self._depth,
+                "max_queue_depth": self.max_queue_depth,
+                "queued_by_priority": {
+                    f"{rank[0]}.{rank[1]}": sum(len(q) for q in clients.values())
+                    for rank, clients in sorted(self._queues.items())
+                },
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "withdrawn": self._withdrawn,
+                "avg_wait_ms": round(self._total_wait / waited * 1000, 2),
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+                "avg_service_ms": round(self._avg_service_time * 1000, 2),
+                "running_models": dict(self._running),
+                "model_switches": self._model_switches,
+                "affinity_reorders": self._affinity_reorders,
+                "affinity_window_s": self.affinity_window,
+            }
+
+
+# Create a singleton instance
+request_scheduler = RequestScheduler(
+    capacity=settings.max_concurrent_inference * len(OLLAMA_BACKENDS),
+    max_queue_depth=settings.max_queue_depth,
+    task_priorities=settings.task_priorities,
+    affinity_window=settings.affinity_window,
+)
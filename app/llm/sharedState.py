@@ -0,0 +1,321 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.utils.settings import settings
+from .cancellation import CancellationToken, RequestCancelledError, cancellation_registry
+from .tracing import annotate
+
+# Seconds a cancel request waits for the process serving it before it is dropped
+CANCEL_RETENTION = 60.0
+
+
+class SharedState:
+    """
+    State the API's worker processes share through one SQLite database in
+    WAL mode, so several processes serve as one logical service:
+
+    - processes: every process heartbeats; one that stops counts as dead
+      and whatever it held (slots, flights, running jobs) is reclaimed
+    - slots: a cross-process semaphore capping concurrent generations
+    - flights: which process is producing a given response right now, so
+      the others wait for its result instead of generating it again
+    - cancellations: requests cancelled by ID through whichever process
+      received the cancel; the process serving the request polls for it
+
+    Disabled (db_path unset) in a single process, where the scheduler and
+    single-flight already cover all of this.
+    """
+    def __init__(
+        self,
+        db_path: Optional[str],
+        poll_interval: float,
+        heartbeat_interval: float,
+        cancel_poll_interval: float,
+    ):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.cancel_poll_interval = cancel_poll_interval
+        # Identifies this process; unlike a pid it is never reused after a restart
+        self.instance_id = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._stats = {
+            "slot_waits": 0,
+            "flights_led": 0,
+            "flights_joined": 0,
+            "reclaimed": 0,
+            "cancels_requested": 0,
+            "cancels_received": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.db_path is not None
+
+    def _open(self) -> sqlite3.Connection:
+        # Caller holds the lock
+        if self._db is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            # Autocommit; transactions are opened explicitly with BEGIN IMMEDIATE
+            self._db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(
+                """CREATE TABLE IF NOT EXISTS processes (
+                    instance TEXT PRIMARY KEY,
+                    pid INTEGER NOT NULL,
+                    started_at REAL NOT NULL,
+                    heartbeat REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS slots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    instance TEXT NOT NULL,
+                    acquired_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS flights (
+                    key TEXT PRIMARY KEY,
+                    instance TEXT NOT NULL,
+                    started_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS cancellations (
+                    request_id TEXT PRIMARY KEY,
+                    requested_at REAL NOT NULL
+                );"""
+            )
+            now = time.time()
+            self._db.execute(
+                "INSERT OR REPLACE INTO processes (instance, pid, started_at, heartbeat) VALUES (?, ?, ?, ?)",
+                (self.instance_id, os.getpid(), now, now),
+            )
+            self._threads = [
+                threading.Thread(target=self._heartbeat, name="shared-state-heartbeat", daemon=True),
+                threading.Thread(target=self._watch_cancellations, name="shared-state-cancellations", daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
+        return self._db
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """A write transaction; BEGIN IMMEDIATE serializes it against the other processes"""
+        with self._lock:
+            db = self._open()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def _live_after(self) -> float:
+        # A process is alive while its heartbeat is younger than three intervals
+        return time.time() - 3 * self.heartbeat_interval
+
+    def _reclaim(self, db: sqlite3.Connection) -> None:
+        """Drop dead processes and release what they held (inside a transaction)"""
+        live_after = self._live_after()
+        dead = "SELECT instance FROM processes WHERE heartbeat <= ?"
+        slots = db.execute(f"DELETE FROM slots WHERE instance IN ({dead})", (live_after,)).rowcount
+        flights = db.execute(f"DELETE FROM flights WHERE instance IN ({dead})", (live_after,)).rowcount
+        db.execute("DELETE FROM processes WHERE heartbeat <= ?", (live_after,))
+        # A cancel nobody picked up: the request had already finished, or never existed
+        db.execute("DELETE FROM cancellations WHERE requested_at <= ?", (time.time() - CANCEL_RETENTION,))
+        if slots or flights:
+            self._stats["reclaimed"] += slots + flights
+
+    def _heartbeat(self) -> None:
+        while not self._stop_event.wait(self.heartbeat_interval):
+            try:
+                with self._transaction() as db:
+                    db.execute(
+                        "UPDATE processes SET heartbeat = ? WHERE instance = ?", (time.time(), self.instance_id)
+                    )
+                    self._reclaim(db)
+            except sqlite3.Error:
+                # A busy database delays one heartbeat; the next one catches up
+                pass
+
+    def request_cancel(self, request_id: str) -> None:
+        """Ask whichever process is serving `request_id` to cancel it, on its next poll"""
+        with self._transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO cancellations (request_id, requested_at) VALUES (?, ?)",
+                (request_id, time.time()),
+            )
+        with self._lock:
+            self._stats["cancels_requested"] += 1
+
+    def cancel_requested(self, request_ids: List[str]) -> List[str]:
+        """Which of these requests another process was asked to cancel; each is handed out once"""
+        if not request_ids:
+            return []
+        placeholders = ", ".join("?" * len(request_ids))
+        with self._transaction() as db:
+            rows = db.execute(
+                f"SELECT request_id FROM cancellations WHERE request_id IN ({placeholders})", request_ids
+            ).fetchall()
+            db.execute(f"DELETE FROM cancellations WHERE request_id IN ({placeholders})", request_ids)
+        return [request_id for (request_id,) in rows]
+
+    def _watch_cancellations(self) -> None:
+        while not self._stop_event.wait(self.cancel_poll_interval):
+            try:
+                cancelled = self.cancel_requested(cancellation_registry.request_ids())
+            except sqlite3.Error:
+                continue
+            for request_id in cancelled:
+                if cancellation_registry.cancel(request_id):
+                    with self._lock:
+                        self._stats["cancels_received"] += 1
+
+    def start(self) -> None:
+        """Join the service: register this process and start heartbeating"""
+        if self.enabled:
+            with self._lock:
+                self._open()
+
+    def is_alive(self, instance: Optional[str]) -> bool:
+        """Whether the process with this instance ID is still running"""
+        if instance == self.instance_id:
+            return True
+        if not self.enabled or instance is None:
+            # Without shared state every other instance was an earlier run of this process
+            return False
+        with self._lock:
+            row = self._open().execute(
+                "SELECT 1 FROM processes WHERE instance = ? AND heartbeat > ?", (instance, self._live_after())
+            ).fetchone()
+        return row is not None
+
+    def acquire_slot(self, capacity: int, token: Optional[CancellationToken] = None) -> int:
+        """
+        Take one of `capacity` generation slots shared by all processes,
+        polling until one is free. Raises RequestCancelledError if the
+        request is cancelled while waiting.
+        """
+        waited = False
+        while True:
+            with self._transaction() as db:
+                self._reclaim(db)
+                (taken,) = db.execute("SELECT COUNT(*) FROM slots").fetchone()
+                if taken < capacity:
+                    cursor = db.execute(
+                        "INSERT INTO slots (instance, acquired_at) VALUES (?, ?)", (self.instance_id, time.time())
+                    )
+                    if waited:
+                        self._stats["slot_waits"] += 1
+                    return cursor.lastrowid
+            waited = True
+            if token is not None:
+                if token.cancelled:
+                    raise RequestCancelledError(token.reason)
+            time.sleep(self.poll_interval)
+
+    def release_slot(self, slot_id: int) -> None:
+        with self._transaction() as db:
+            db.execute("DELETE FROM slots WHERE id = ?", (slot_id,))
+
+    def _claim_flight(self, key: str) -> bool:
+        with self._transaction() as db:
+            self._reclaim(db)
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO flights (key, instance, started_at) VALUES (?, ?, ?)",
+                (key, self.instance_id, time.time()),
+            )
+            return cursor.rowcount == 1
+
+    def _flight_running(self, key: str) -> bool:
+        with self._lock:
+            row = self._open().execute(
+                "SELECT 1 FROM flights JOIN processes USING (instance) WHERE key = ? AND heartbeat > ?",
+                (key, self._live_after()),
+            ).fetchone()
+        return row is not None
+
+    def _release_flight(self, key: str) -> None:
+        with self._transaction() as db:
+            db.execute("DELETE FROM flights WHERE key = ? AND instance = ?", (key, self.instance_id))
+
+    def coalesce(
+        self,
+        key: str,
+        produce: Callable[[], Iterator],
+        lookup: Callable[[], Optional[str]],
+        token: Optional[CancellationToken] = None,
+    ) -> Iterator:
+        """
+        Yield `produce()` unless another process is already producing `key`;
+        then wait for it to finish and yield its result, read with `lookup`
+        from the shared response cache, as a single chunk. If the other
+        process fails or leaves no result, this one produces it instead.
+        """
+        while True:
+            if self._claim_flight(key):
+                with self._lock:
+                    self._stats["flights_led"] += 1
+                try:
+                    yield from produce()
+                finally:
+                    self._release_flight(key)
+                return
+
+            while self._flight_running(key):
+                if token is not None and token.cancelled:
+                    raise RequestCancelledError(token.reason)
+                time.sleep(self.poll_interval)
+            result = lookup()
+            if result is not None:
+                with self._lock:
+                    self._stats["flights_joined"] += 1
+                annotate(coalesced=True)
+                yield result
+                return
+
+    def stop(self) -> None:
+        """Leave the service: stop heartbeating and release everything this process holds"""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=max(self.heartbeat_interval, self.cancel_poll_interval) + 1)
+        self._threads = []
+        if self._db is not None:
+            with self._transaction() as db:
+                for table in ("slots", "flights", "processes"):
+                    db.execute(f"DELETE FROM {table} WHERE instance = ?", (self.instance_id,))
+
+    def stats(self) -> Dict[str, object]:
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            db = self._open()
+            live_after = self._live_after()
+            processes = db.execute("SELECT COUNT(*) FROM processes WHERE heartbeat > ?", (live_after,)).fetchone()[0]
+            slots = db.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+            flights = db.execute("SELECT COUNT(*) FROM flights").fetchone()[0]
+            return {
+                "enabled": True,
+                "instance": self.instance_id,
+                "pid": os.getpid(),
+                "processes": processes,
+                "slots_in_use": slots,
+                "flights": flights,
+                **self._stats,
+            }
+
+
+# Create a singleton instance
+shared_state = SharedState(
+    db_path=settings.shared_state_path,
+    poll_interval=settings.shared_state_poll_interval,
+    heartbeat_interval=settings.shared_state_heartbeat,
+    cancel_poll_interval=settings.shared_state_cancel_poll_interval,
+)
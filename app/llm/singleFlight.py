@@ -0,0 +1,166 @@
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
+
+from .cancellation import CancellationToken, RequestCancelledError, request_cancellation
+from .tracing import annotate
+
+
+class _Flight:
+    """One in-flight generation shared by every request with the same key"""
+    def __init__(self, start: Callable[[CancellationToken], Iterator[str]]):
+        # The generation is cancelled only when every subscriber has been
+        self.token = CancellationToken(counted=False)
+        self.producer = start(self.token)
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.driving = False
+        self.subscribers = 0
+        self.listening = 0  # subscribers whose own request is not cancelled
+        self.cond = threading.Condition()
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent generations.
+
+    The first request for a key starts the producer; later requests for the
+    same key subscribe to it, replay the chunks produced so far and then
+    receive new chunks as they arrive. Whichever subscriber needs the next
+    chunk first pulls it from the producer, so the flight keeps going as long
+    as anyone is listening. When the last subscriber leaves early the
+    producer is closed, which aborts the underlying Ollama request.
+
+    A subscriber whose request is cancelled stops waiting at once; the
+    generation itself is cancelled once no subscriber is still listening.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._stats = {"leaders": 0, "coalesced": 0, "abandoned": 0}
+
+    def stream(self, key: str, start: Callable[[CancellationToken], Iterator[str]]) -> Iterator[str]:
+        """
+        Yield the chunks of the flight for `key`, starting it with
+        `start(token)` if needed; the token is cancelled once every subscriber
+        of the flight has been.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = _Flight(start)
+                self._flights[key] = flight
+                self._stats["leaders"] += 1
+            else:
+                self._stats["coalesced"] += 1
+                annotate(coalesced=True)
+            with flight.cond:
+                flight.subscribers += 1
+                flight.listening += 1
+
+        token = request_cancellation.get()
+        listening = [True]
+
+        def stop_listening() -> None:
+            with flight.cond:
+                if not listening[0]:
+                    return
+                listening[0] = False
+                flight.listening -= 1
+                abort = flight.listening == 0 and not flight.done
+                flight.cond.notify_all()
+            if abort:
+                flight.token.cancel(token.reason if token is not None and token.reason else "abandoned")
+
+        unregister = token.on_cancel(stop_listening) if token is not None else None
+        try:
+            yield from self._consume(key, flight, token)
+        finally:
+            if unregister is not None:
+                unregister()
+            stop_listening()
+            self._leave(key, flight)
+
+    def _consume(self, key: str, flight: _Flight, token: Optional[CancellationToken]) -> Iterator[str]:
+        position = 0
+        while True:
+            with flight.cond:
+                while position >= len(flight.chunks) and not flight.done and flight.driving:
+                    if token is not None and token.cancelled:
+                        raise RequestCancelledError(token.reason)
+                    flight.cond.wait(token.remaining() if token is not None else None)
+                if token is not None and token.cancelled:
+                    raise RequestCancelledError(token.reason)
+                if position < len(flight.chunks):
+                    chunk = flight.chunks[position]
+                    position += 1
+                elif flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    # Nobody is pulling from the producer right now, so we do it
+                    flight.driving = True
+                    chunk = None
+
+            if chunk is not None:
+                yield chunk
+                continue
+
+            self._pull(key, flight)
+
+    def _pull(self, key: str, flight: _Flight) -> None:
+        chunk = None
+        finished = False
+        error = None
+        # The producer runs in whichever subscriber's thread pulls it, but it serves
+        # every subscriber: waits for a queue or shared slot must end on the flight's
+        # cancellation, not on this subscriber's
+        reset = request_cancellation.set(flight.token)
+        try:
+            chunk = next(flight.producer)
+        except StopIteration:
+            finished = True
+        except BaseException as e:
+            finished = True
+            error = e
+        finally:
+            request_cancellation.reset(reset)
+
+        with flight.cond:
+            flight.driving = False
+            if chunk is not None:
+                flight.chunks.append(chunk)
+            if finished:
+                flight.done = True
+                flight.error = error
+            flight.cond.notify_all()
+
+        if finished:
+            self._forget(key, flight)
+
+    def _leave(self, key: str, flight: _Flight) -> None:
+        with flight.cond:
+            flight.subscribers -= 1
+            abandoned = flight.subscribers == 0 and not flight.done and not flight.driving
+            if abandoned:
+                flight.done = True
+        if abandoned:
+            # Closing the producer releases its backend slot and HTTP stream
+            flight.producer.close()
+            self._forget(key, flight)
+            with self._lock:
+                self._stats["abandoned"] += 1
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": len(self._flights), **self._stats}
+
+
+# Create a singleton instance
+single_flight = SingleFlight()
@@ -0,0 +1,218 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from pydantic import BaseModel
+from pygments.lexers import get_lexer_by_name
+from pygments.token import Comment, String
+from pygments.util import ClassNotFound
+
+from app.utils.settings import settings
+from .modelConfiguration import OllamaModelConfig
+from .modelTask import ModelTask
+
+# Pieces the estimator counts separately: words, digits, whitespace runs, symbols
+_PIECES = re.compile(r"[A-Za-z_]+|\d|\n|[ \t]+|[^\sA-Za-z_\d]")
+
+# Comments that carry meaning and must survive compaction
+_KEPT_COMMENTS = (Comment.Preproc, Comment.PreprocFile, Comment.Hashbang)
+
+# Compacted code by a hash of (language, code); compaction runs a full lexer pass,
+# and the same file is often checked and then rendered. Kept small: values are code.
+COMPACTION_CACHE_SIZE = 64
+_compacted: "OrderedDict[str, str]" = OrderedDict()
+_compacted_lock = threading.Lock()
+
+# Expected output per task as (base tokens, tokens per input code token, whether the
+# answer must fit whole), never more than the profile's num_predict. A translation cut at
+# the limit is incomplete, so code whose translation would not fit counts as not fitting
+# and is split; an explanation just gets shorter. Generation has no input code and uses
+# the profile value.
+OUTPUT_ESTIMATES: Dict[ModelTask, Optional[Tuple[int, float, bool]]] = {
+    ModelTask.CODE_TRANSLATION: (64, 1.3, True),
+    ModelTask.CODE_EXPLANATION: (192, 0.6, False),
+    ModelTask.CODE_GENERATION: None,
+}
+
+# Fewest tokens a response may be limited to
+MIN_PREDICT = 64
+# Tokens taken by a prompt template without its code, for quick checks
+TEMPLATE_TOKENS = 250
+
+
+class TokenBudget(BaseModel):
+    """How a request's prompt and output fit the model's context window"""
+    num_ctx: int
+    prompt_tokens: int
+    code_tokens: int
+    num_predict: int  # output limit sent to Ollama for this request
+    headroom: int  # context tokens left unused
+    fitting: str = "none"  # "none", "compacted" or "overflow"
+    original_code_tokens: Optional[int] = None  # before compaction
+
+    @property
+    def fits(self) -> bool:
+        return self.fitting != "overflow"
+
+
+def _estimate(text: str) -> int:
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        first = piece[0]
+        if first.isalpha() or first == "_":
+            # Common words are one token; long identifiers split every few characters
+            tokens += 1 + (len(piece) - 1) // 5
+        elif first == " ":
+            # One space merges with the following word; indentation comes in runs of four
+            tokens += (len(piece) + 2) // 4
+        elif first == "\t":
+            tokens += len(piece)
+        else:
+            tokens += 1
+    return tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimated token count of text for the code models: a heuristic over
+    words, digits, whitespace and symbols, scaled by AICT_TOKEN_ESTIMATE_FACTOR.
+    """
+    if not text:
+        return 0
+    return int(_estimate(text) * settings.token_estimate_factor) + 1
+
+
+def compact_code(code: str, language: str) -> str:
+    """
+    Shrink code without changing what it does: drop comments (keeping
+    preprocessor lines and shebangs), trailing whitespace and blank lines.
+    Lines inside multi-line string literals are kept exactly as they are.
+    Code in a language pygments does not know is returned unchanged, since
+    its strings cannot be told apart.
+    """
+    key = hashlib.blake2b(f"{language}\0{code}".encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+    with _compacted_lock:
+        cached = _compacted.get(key)
+        if cached is not None:
+            _compacted.move_to_end(key)
+            return cached
+
+    compacted = _compact(code, language)
+    with _compacted_lock:
+        _compacted[key] = compacted
+        while len(_compacted) > COMPACTION_CACHE_SIZE:
+            _compacted.popitem(last=False)
+    return compacted
+
+
+def _compact(code: str, language: str) -> str:
+    try:
+        lexer = get_lexer_by_name(language)
+    except ClassNotFound:
+        return code
+
+    pieces = []
+    # Lines a string literal runs through; their whitespace is part of the string
+    in_string = set()
+    line = 0
+    for token_type, value in lexer.get_tokens(code):
+        breaks = value.count("\n")
+        if token_type in Comment and not any(token_type in kept for kept in _KEPT_COMMENTS):
+            # A dropped comment leaves its line breaks so the code around it keeps its lines
+            value = "\n" * breaks
+        elif token_type in String and breaks:
+            in_string.update(range(line, line + breaks + 1))
+        pieces.append(value)
+        line += breaks
+
+    kept = []
+    for number, text in enumerate("".join(pieces).split("\n")):
+        if number in in_string:
+            kept.append(text)
+        elif text.strip():
+            kept.append(text.rstrip())
+    return "\n".join(kept).rstrip("\n") + "\n"
+
+
+def _desired_output(task: ModelTask, config: OllamaModelConfig, code_tokens: int) -> int:
+    """Tokens the whole answer should need for an input of code_tokens, before the profile's limit"""
+    estimate = OUTPUT_ESTIMATES.get(task)
+    if estimate is None:
+        return config.num_predict or config.num_ctx // 4
+    base, ratio, _ = estimate
+    return base + int(code_tokens * ratio)
+
+
+def _expected_output(task: ModelTask, config: OllamaModelConfig, code_tokens: int) -> int:
+    """Tokens to allow the answer: the desired output within the profile's num_predict"""
+    desired = _desired_output(task, config, code_tokens)
+    # The profile's limit bounds decode time, e.g. for low-latency
+    if config.num_predict:
+        return min(desired, config.num_predict)
+    return desired
+
+
+def _answer_fits(task: ModelTask, config: OllamaModelConfig, code_tokens: int) -> bool:
+    """Whether the profile's num_predict leaves room for an answer that must be whole"""
+    estimate = OUTPUT_ESTIMATES.get(task)
+    if estimate is None or not estimate[2] or not config.num_predict:
+        return True
+    return _desired_output(task, config, code_tokens) <= config.num_predict
+
+
+def plan_budget(task: ModelTask, config: OllamaModelConfig, prompt_text: str, code: str = "") -> TokenBudget:
+    """
+    Work out the token budget of a rendered prompt: its size, the output
+    limit to request (sized from the input rather than a fixed profile
+    value, and never more than the context has room for) and whether it fits.
+    """
+    prompt_tokens = int(estimate_tokens(prompt_text) * (1 + settings.token_safety_margin))
+    code_tokens = estimate_tokens(code)
+    needed = _expected_output(task, config, code_tokens)
+    room = config.num_ctx - prompt_tokens
+    num_predict = max(MIN_PREDICT, min(needed, room))
+    fits = prompt_tokens + needed <= config.num_ctx and _answer_fits(task, config, code_tokens)
+    return TokenBudget(
+        num_ctx=config.num_ctx,
+        prompt_tokens=prompt_tokens,
+        code_tokens=code_tokens,
+        num_predict=num_predict,
+        headroom=max(0, room - num_predict),
+        fitting="none" if fits else "overflow",
+    )
+
+
+def _fits(task: ModelTask, config: OllamaModelConfig, code_tokens: int, extra_tokens: int = 0) -> bool:
+    """Whether a prompt with code_tokens of code (plus extra_tokens of context) and its answer fit"""
+    needed = _expected_output(task, config, code_tokens)
+    prompt_tokens = (TEMPLATE_TOKENS + extra_tokens + code_tokens) * (1 + settings.token_safety_margin)
+    return prompt_tokens + needed <= config.num_ctx and _answer_fits(task, config, code_tokens)
+
+
+def fits_in_context(task: ModelTask, config: OllamaModelConfig, code: str, language: str) -> bool:
+    """Quick check whether code fits one prompt for the task, after compaction if needed"""
+    return (
+        _fits(task, config, estimate_tokens(code))
+        or _fits(task, config, estimate_tokens(compact_code(code, language)))
+    )
+
+
+def max_code_tokens(task: ModelTask, config: OllamaModelConfig, extra_tokens: int = 0) -> int:
+    """Most code tokens one prompt for the task can hold next to extra_tokens of context"""
+    low, high = 0, config.num_ctx
+    while low < high:
+        middle = (low + high + 1) // 2
+        if _fits(task, config, middle, extra_tokens):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def chars_for_tokens(code: str, tokens: int) -> int:
+    """How many characters of `code` make up `tokens` estimated tokens, at the code's own density"""
+    if not code:
+        return tokens
+    return int(tokens * len(code) / estimate_tokens(code))
@@ -1,7 +1,7 @@
 from langchain.tools import BaseTool
-from pygments.lexers import guess_lexer
-from pygments.util import ClassNotFound
-from typing import Optional, Type, ClassVar
+from typing import List, Optional, Type, ClassVar
+
+from .languageDetection import detection_engine
 
 
 class CodeLanguageDetectionTool(BaseTool):
@@ -9,31 +9,12 @@ class CodeLanguageDetectionTool(BaseTool):
     description: ClassVar[str] = "Detects the programming language of a given code snippet"
 
     def _run(self, code_snippet: str) -> str:
-        try:
-            lexer = guess_lexer(code_snippet, stripnl=False, stripall=False)
-            # Map Pygments lexer names to standardized language identifiers
-            language_map = {
-                "Python 3": "python",
-                "JavaScript": "javascript",
-                "TypeScript": "typescript",
-                "C++": "cpp",
-                "C#": "csharp",
-                "Java": "java",
-                "HTML": "html",
-                "CSS": "css",
-                "PHP": "php",
-                "Ruby": "ruby",
-                "Go": "go",
-                "Rust": "rust",
-                "Swift": "swift",
-                "Kotlin": "kotlin"
-            }
-            
-            detected_language = lexer.name
-            return language_map.get(detected_language, detected_language.lower())
-            
-        except ClassNotFound:
-            return "unknown"
+        # Signature scoring over the supported languages, falling back to pygments
+        return detection_engine.detect(code_snippet).language
+
+    def detect_many(self, code_snippets: List[str]) -> List[str]:
+        """Detect the language of several snippets in one call"""
+        return [result.language for result in detection_engine.detect_many(code_snippets)]
         
     async def _arun(self, code_snippet: str) -> str:
-        return self._run(code_snippet)
\ No newline at end of file
+        return self._run(code_snippet)
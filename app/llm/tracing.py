@@ -0,0 +1,219 @@
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from app.utils.settings import settings
+from app.utils.structuredLog import get_logger
+
+logger = get_logger("trace")
+slow_logger = get_logger("slow_request")
+
+
+class Span:
+    """One timed step of a request, with its start as an offset into the trace"""
+    __slots__ = ("name", "start_ms", "duration_ms", "attributes")
+
+    def __init__(self, name: str, start_ms: float, duration_ms: float, attributes: Dict[str, Any]):
+        self.name = name
+        self.start_ms = start_ms
+        self.duration_ms = duration_ms
+        self.attributes = attributes
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "start_ms": round(self.start_ms, 2),
+            "duration_ms": round(self.duration_ms, 2),
+            **self.attributes,
+        }
+
+
+class Trace:
+    """
+    Spans recorded while serving one request. Worker threads add spans
+    concurrently (fan-out, chunked translation), so additions are locked.
+    """
+    def __init__(self, request_id: str, method: str, path: str, sampled: bool):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.status: Optional[int] = None
+        self.sampled = sampled
+        self.started_at = time.time()
+        self._started = time.monotonic()
+        self.duration_ms: Optional[float] = None
+        self.attributes: Dict[str, Any] = {}
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def offset_ms(self, monotonic: float) -> float:
+        return (monotonic - self._started) * 1000
+
+    def add_span(self, name: str, started: float, ended: float, **attributes: Any) -> None:
+        """Record a span from two time.monotonic() readings"""
+        span = Span(name, self.offset_ms(started), (ended - started) * 1000, attributes)
+        with self._lock:
+            self.spans.append(span)
+
+    def annotate(self, **attributes: Any) -> None:
+        with self._lock:
+            self.attributes.update(attributes)
+
+    def finish(self, status: int, route: Optional[str]) -> None:
+        self.status = status
+        self.route = route
+        self.duration_ms = self.offset_ms(time.monotonic())
+
+    def breakdown(self) -> Dict[str, float]:
+        """Total milliseconds per span name"""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span.name] = round(totals.get(span.name, 0.0) + span.duration_ms, 2)
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start_ms)
+            attributes = dict(self.attributes)
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": round(self.started_at, 3),
+            "duration_ms": round(self.duration_ms, 2) if self.duration_ms is not None else None,
+            **attributes,
+            "breakdown_ms": self.breakdown(),
+            "spans": [span.to_dict() for span in spans],
+        }
+
+
+# The trace of the request being served; copied into worker threads with the request context
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time the block as a span of the current request's trace (a no-op outside
+    a request). Yields the span's attribute dict, so the block can attach
+    results to it.
+    """
+    trace = current_trace.get()
+    started = time.monotonic()
+    try:
+        yield attributes
+    except BaseException as e:
+        attributes.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        if trace is not None:
+            trace.add_span(name, started, time.monotonic(), **attributes)
+
+
+def annotate(**attributes: Any) -> None:
+    """Attach attributes to the current request's trace"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.annotate(**attributes)
+
+
+def ollama_timings(info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Ollama's final response statistics as span attributes (durations in ms)"""
+    if not info:
+        return {}
+    timings: Dict[str, Any] = {}
+    for field in ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration"):
+        if info.get(field):
+            timings[field.replace("_duration", "_ms")] = round(info[field] / 1e6, 2)
+    for field in ("prompt_eval_count", "eval_count"):
+        if info.get(field):
+            timings[field] = info[field]
+    if info.get("eval_count") and info.get("eval_duration"):
+        timings["tokens_per_second"] = round(info["eval_count"] / (info["eval_duration"] / 1e9), 2)
+    return timings
+
+
+class Tracer:
+    """
+    Starts and finishes request traces and keeps the most recent ones.
+
+    Finished traces are logged through the structured log when sampled
+    (`sample_rate`); requests slower than `slow_request_ms` are always
+    written to the slow-request log with their full span breakdown.
+    """
+    def __init__(self, enabled: bool, sample_rate: float, slow_request_ms: Optional[float], buffer_size: int):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow_request_ms = slow_request_ms
+        self._lock = threading.Lock()
+        self._recent: Deque[Trace] = deque(maxlen=buffer_size)
+        self._slow: Deque[Trace] = deque(maxlen=buffer_size)
+        self._stats = {"traced": 0, "sampled": 0, "slow": 0}
+
+    def start(self, method: str, path: str, request_id: Optional[str] = None) -> Trace:
+        return Trace(
+            request_id or uuid.uuid4().hex,
+            method,
+            path,
+            sampled=random.random() < self.sample_rate,
+        )
+
+    def finish(self, trace: Trace, status: int, route: Optional[str] = None) -> None:
+        trace.finish(status, route)
+        slow = self.slow_request_ms is not None and trace.duration_ms >= self.slow_request_ms
+        with self._lock:
+            self._recent.append(trace)
+            self._stats["traced"] += 1
+            if trace.sampled:
+                self._stats["sampled"] += 1
+            if slow:
+                self._slow.append(trace)
+                self._stats["slow"] += 1
+
+        if slow:
+            slow_logger.warning("slow request", extra=trace.to_dict())
+        elif trace.sampled:
+            logger.info("request", extra={
+                key: value for key, value in trace.to_dict().items() if key != "spans"
+            })
+
+    def recent(self, limit: int = 50, slow_only: bool = False) -> List[Dict[str, Any]]:
+        """The most recent finished traces, newest first"""
+        with self._lock:
+            traces = list(self._slow if slow_only else self._recent)
+        return [trace.to_dict() for trace in reversed(traces[-limit:])] if limit > 0 else []
+
+    def find(self, request_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for trace in reversed(self._recent):
+                if trace.request_id == request_id:
+                    return trace.to_dict()
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "sample_rate": self.sample_rate,
+                "slow_request_ms": self.slow_request_ms,
+                "buffered": len(self._recent),
+                **self._stats,
+            }
+
+
+# Create a singleton instance
+tracer = Tracer(
+    enabled=settings.tracing_enabled,
+    sample_rate=settings.trace_sample_rate,
+    slow_request_ms=settings.slow_request_ms,
+    buffer_size=settings.trace_buffer_size,
+)
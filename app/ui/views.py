@@ -1,8 +1,9 @@
 import flet as ft
 import requests
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional, Tuple
 import time
+import uuid
 
 # API base URL
 API_BASE_URL = "http://127.0.0.1:8000/api"
@@ -17,6 +18,25 @@ def api_call(endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
     except Exception as e:
         return {"error": str(e)}
 
+def api_cancel(request_id: str) -> bool:
+    """Ask the server to stop a request sent with this X-Request-ID"""
+    try:
+        return requests.delete(f"{API_BASE_URL}/requests/{request_id}").ok
+    except Exception:
+        return False
+
+def api_stream(method: str, endpoint: str, **kwargs) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Call a Server-Sent Events endpoint and yield (event, data) pairs as they arrive"""
+    with requests.request(method, f"{API_BASE_URL}/{endpoint}", stream=True, **kwargs) as response:
+        response.raise_for_status()
+        event = "message"
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[len("data:"):].strip())
+                event = "message"
+
 def main_view(page: ft.Page):
     """
     Create a dark-themed UI for the code translator app with unified interface.
@@ -28,6 +48,11 @@ def main_view(page: ft.Page):
     page.window_width = 1200
     page.window_min_width = 800
     page.bgcolor = ft.colors.SURFACE_VARIANT
+
+    # Identifies this editor to the server so re-translations only redo edited code
+    session_id = uuid.uuid4().hex
+    # ID of the request in progress, so the Cancel button can stop it on the server
+    active_request_id = ft.Ref[str]()
     
     # Define all helper functions first
     def shake_dropdown():
@@ -103,6 +128,12 @@ def main_view(page: ft.Page):
             language_warning.value = "Please select a language"
         page.update()
 
+    def handle_cancel(e):
+        if active_request_id.current:
+            status_text.value = "Cancelling..."
+            page.update()
+            api_cancel(active_request_id.current)
+
     def handle_action(e):
         if not code_input.value:
             page.snack_bar = ft.SnackBar(content=ft.Text("Please enter input"))
@@ -116,42 +147,67 @@ def main_view(page: ft.Page):
             return
 
         loading.visible = True
+        cancel_button.visible = True
         status_text.value = "Processing..."
+        active_request_id.current = uuid.uuid4().hex
+        headers = {"X-Request-ID": active_request_id.current}
         page.update()
 
         try:
             if current_mode.current == "translate":
-                result = api_call("translate_code", {
+                events = api_stream("POST", "translate_code/stream", headers=headers, json={
                     "code": code_input.value,
-                    "target_language": language_dropdown.value
+                    "target_language": language_dropdown.value,
+                    "session_id": session_id
                 })
-                output_area.value = result.get("code", "Translation failed")
-                status_text.value = f"Source: {result.get('source_language', 'Unknown')}"
-            
             elif current_mode.current == "explain":
-                result = api_call("explain_code", {
+                events = api_stream("POST", "explain_code/stream", headers=headers, json={
                     "code": code_input.value
                 })
-                output_area.value = result.get("explanation", "Explanation failed")
-                status_text.value = f"Language: {result.get('language', 'Unknown')}"
-            
             else:  # generate
-                response = requests.get(
-                    f"{API_BASE_URL}/generate_code",
-                    params={
-                        "description": code_input.value,
-                        "language": language_dropdown.value
-                    }
-                )
-                result = response.json()
-                output_area.value = result.get("code", "Generation failed")
-                status_text.value = f"Generated {language_dropdown.value} code"
+                events = api_stream("GET", "generate_code/stream", headers=headers, params={
+                    "description": code_input.value,
+                    "language": language_dropdown.value
+                })
+
+            # Render tokens as they arrive, throttling redraws to ~20 per second
+            output_area.value = ""
+            last_update = 0.0
+            for event, data in events:
+                if event == "token":
+                    output_area.value += data["text"]
+                    if time.monotonic() - last_update > 0.05:
+                        page.update()
+                        last_update = time.monotonic()
+                elif event == "error":
+                    status_text.value = f"Error: {data.get('error', 'Unknown error')}"
+                elif event == "cancelled":
+                    status_text.value = "Cancelled"
+                elif event == "done":
+                    if "clean_chars" in data:
+                        # The output guard stopped a runaway generation; drop what ran past the answer
+                        output_area.value = output_area.value[:data["clean_chars"]]
+                    if current_mode.current == "translate":
+                        status_text.value = f"Source: {data.get('source_language', 'Unknown')}"
+                        if data.get("reused"):
+                            status_text.value += f" ({data['reused']} of {data['segments']} segments unchanged)"
+                    elif current_mode.current == "explain":
+                        status_text.value = f"Language: {data.get('language', 'Unknown')}"
+                    else:
+                        status_text.value = f"Generated {language_dropdown.value} code"
+                    if data.get("stop_reason"):
+                        status_text.value += f" (stopped early: {data['stop_reason'].replace('_', ' ')})"
+
+            if current_mode.current != "explain":
+                output_area.value = output_area.value.strip()
 
         except Exception as e:
             page.snack_bar = ft.SnackBar(content=ft.Text(f"Error: {str(e)}"))
             page.snack_bar.open = True
         
+        active_request_id.current = None
         loading.visible = False
+        cancel_button.visible = False
         page.update()
 
     # Now create all the UI elements
@@ -250,6 +306,12 @@ def main_view(page: ft.Page):
 
     status_text = ft.Text("", size=14, color=ft.colors.ON_SURFACE_VARIANT)
     loading = ft.ProgressRing(visible=False, width=16, height=16)
+    cancel_button = ft.OutlinedButton(
+        text="Cancel",
+        icon=ft.icons.STOP,
+        visible=False,  # Shown while a request is in progress
+        on_click=handle_cancel,
+    )
     
     action_button = ft.ElevatedButton(
         text="Translate",
@@ -284,6 +346,7 @@ def main_view(page: ft.Page):
                 ft.VerticalDivider(width=10),
                 mode_buttons,
                 loading,
+                cancel_button,
                 status_text,
             ], alignment=ft.MainAxisAlignment.START),
             input_label,
@@ -0,0 +1,171 @@
+from typing import Dict, List, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class AppSettings(BaseSettings):
+    """
+    Runtime settings for the API and LLM layer.
+    Every field can be overridden with an AICT_<FIELD_NAME> environment variable.
+    """
+    model_config = SettingsConfigDict(env_prefix="AICT_")
+
+    # Ollama server every model, probe and preload talks to
+    ollama_base_url: str = "http://localhost:11434"
+
+    # Several Ollama nodes to balance generations across (unset = just ollama_base_url).
+    # A node is ejected after backend_failure_threshold consecutive failures and retried after
+    # backend_eject_seconds; a request stays on a node with its model loaded unless that node has
+    # more than backend_affinity_slack requests outstanding beyond the least busy one
+    ollama_backends: List[str] = []
+    backend_failure_threshold: int = 2
+    backend_eject_seconds: float = 30.0
+    backend_affinity_slack: int = 2
+    backend_retries: int = 2
+
+    # Background health probe of the Ollama backend
+    health_probe_interval: float = 15.0
+    health_probe_timeout: float = 2.0
+
+    # Circuit breaker that fails requests fast while Ollama is down
+    breaker_failure_threshold: int = 3
+    breaker_reset_timeout: float = 30.0
+
+    # Response cache: in-memory LRU plus an optional SQLite tier on disk; with several
+    # processes sharing the disk tier, how often each picks up the others' invalidations
+    cache_enabled: bool = True
+    cache_max_entries: int = 512
+    cache_ttl: float = 24 * 60 * 60
+    cache_db_path: Optional[str] = None
+    cache_disk_max_entries: int = 10000
+    cache_sync_interval: float = 1.0
+
+    # Multi-process serving (python -m app.cli.serve --workers N): SQLite file through which
+    # the worker processes share generation slots, in-flight generations, cancel requests and
+    # liveness (unset = single process), how often a waiting process polls it, how often each
+    # process checks it for cancels of its requests, and the heartbeat interval (a process
+    # missing three heartbeats counts as dead)
+    shared_state_path: Optional[str] = None
+    shared_state_poll_interval: float = 0.05
+    shared_state_cancel_poll_interval: float = 0.25
+    shared_state_heartbeat: float = 2.0
+
+    # Off-loop execution: worker threads and the cap on in-flight Ollama calls per backend node
+    max_concurrent_inference: int = 4
+    inference_workers: int = 32
+    detection_workers: int = 4
+
+    # Request scheduler: queue depth before 429s and per-task priority (lower runs first)
+    max_queue_depth: int = 64
+    task_priorities: Dict[str, int] = {
+        "code_explanation": 0,
+        "code_translation": 0,
+        "code_generation": 0,
+    }
+
+    # Cancellation: default per-request deadline in seconds (unset = none; clients send
+    # X-Request-Timeout) and how often a waiting request checks for a client disconnect
+    request_timeout: Optional[float] = None
+    disconnect_poll_interval: float = 0.25
+
+    # Model affinity: how long (seconds) a queued request may be passed over for
+    # requests using the model already running; 0 keeps strict arrival order
+    affinity_window: float = 2.0
+
+    # Model residency: load the registered models at startup, how long Ollama keeps
+    # them loaded, and the load time above which a generation counts as a model load
+    preload_models: bool = True
+    keep_alive: Optional[str] = "30m"
+    model_load_threshold_ms: float = 250.0
+
+    # Runaway-output guard: hard cap on decoded tokens, output/input token ratio per task
+    # (above a floor of guard_min_tokens), and repetition detection (n-gram length,
+    # back-to-back copies of a block and the fewest tokens and words those copies must span)
+    output_guard_enabled: bool = True
+    guard_max_tokens: int = 4096
+    guard_length_ratios: Dict[str, float] = {
+        "code_translation": 3.0,
+        "code_explanation": 6.0,
+    }
+    guard_min_tokens: int = 256
+    guard_ngram: int = 8
+    guard_min_repeats: int = 3
+    guard_min_repeat_tokens: int = 64
+    guard_min_repeat_words: int = 24
+
+    # Tasks whose identical concurrent requests should NOT share one generation
+    singleflight_disabled_tasks: List[str] = []
+
+    # Performance profile ("low-latency", "balanced", "high-quality"), optionally per task
+    profile: str = "balanced"
+    task_profiles: Dict[str, str] = {}
+    # CPU threads Ollama may use per generation (unset = Ollama's default)
+    num_thread: Optional[int] = None
+
+    # Batch endpoints: default and maximum per-batch concurrency, maximum items
+    batch_concurrency: int = 4
+    batch_max_concurrency: int = 16
+    batch_max_items: int = 500
+
+    # Most target languages a single translate request may fan out to
+    max_translation_targets: int = 10
+
+    # Token estimation: scale for the heuristic estimator and safety margin on prompt size
+    token_estimate_factor: float = 1.0
+    token_safety_margin: float = 0.1
+
+    # Chunked file translation: chunk size (unset = derived from the model's context
+    # window) and shared context budget
+    translation_chunk_chars: Optional[int] = None
+    translation_context_chars: int = 2000
+    # Map-reduce explanation: default mode ("single", "map_reduce" or "auto") and chunk size
+    explanation_mode: str = "auto"
+    explanation_chunk_chars: Optional[int] = None
+    # Incremental re-translation: segment size, session lifetime in seconds, sessions kept
+    incremental_segment_chars: int = 1500
+    translation_session_ttl: int = 3600
+    translation_sessions_max: int = 256
+    # Chunks of one file processed in parallel (unset = inference slots); they still
+    # wait for inference slots in the scheduler, ordered by the caller's priority
+    chunk_workers: Optional[int] = None
+
+    # Asynchronous jobs (/api/jobs): worker threads, the SQLite file holding job state and
+    # results, how long finished jobs are kept, jobs allowed to wait before new ones are
+    # rejected, how often expired jobs are deleted, and how often workers look for jobs and
+    # cancellations submitted through other processes
+    job_workers: int = 4
+    jobs_db_path: str = "data/jobs.db"
+    job_retention_seconds: float = 86400.0
+    job_max_pending: int = 10000
+    job_prune_interval: float = 300.0
+    job_poll_interval: float = 1.0
+
+    # Style preferences: how often (seconds) the preference files are checked for changes
+    # made by hand or by another API process
+    style_reload_interval: float = 1.0
+
+    # Language detection: examined prefix, confidence needed to skip pygments, memo size
+    detection_prefix_chars: int = 4096
+    detection_min_score: float = 4.0
+    detection_min_margin: float = 2.0
+    detection_cache_size: int = 2048
+
+    # Prometheus metrics at /metrics: request, stage and generation histograms
+    metrics_enabled: bool = True
+
+    # Request tracing: share of finished requests logged, requests slower than
+    # slow_request_ms (unset = never) logged with their spans, traces kept for /api/debug/traces
+    tracing_enabled: bool = True
+    trace_sample_rate: float = 0.01
+    slow_request_ms: Optional[float] = 10000.0
+    trace_buffer_size: int = 200
+
+    # Structured JSON log, written by a background thread: level, file (unset = stderr)
+    # and records queued before new ones are dropped
+    log_level: str = "INFO"
+    log_file: Optional[str] = None
+    log_queue_size: int = 10000
+
+
+# Create a singleton instance
+settings = AppSettings()
@@ -0,0 +1,104 @@
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from typing import Optional
+
+from app.utils.settings import settings
+
+# Every application logger lives under this one, e.g. aict.trace
+ROOT_LOGGER = "aict"
+
+# LogRecord attributes that are not extra fields
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any `extra=` fields as top-level keys"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue without blocking; records are dropped (and counted) while the queue is full"""
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredLog:
+    """
+    Non-blocking structured logging for the application loggers.
+
+    Request threads only put records on a bounded queue; a background
+    listener formats them as JSON lines and writes them to stderr or a file,
+    so slow output never holds up a request.
+    """
+    def __init__(self, level: str = "INFO", path: Optional[str] = None, queue_size: int = 10000):
+        self.level = level
+        self.path = path
+        self._queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+        self._handler = _DroppingQueueHandler(self._queue)
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._lock = threading.Lock()
+
+        logger = logging.getLogger(ROOT_LOGGER)
+        logger.setLevel(level.upper())
+        logger.addHandler(self._handler)
+        logger.propagate = False
+
+    def start(self) -> None:
+        """Start writing queued records; called lazily on first use and by the API lifespan"""
+        with self._lock:
+            if self._listener is not None:
+                return
+            output = logging.FileHandler(self.path) if self.path else logging.StreamHandler(sys.stderr)
+            output.setFormatter(JsonFormatter())
+            self._listener = logging.handlers.QueueListener(self._queue, output, respect_handler_level=False)
+            self._listener.start()
+
+    def stop(self) -> None:
+        """Flush what is queued and stop the writer thread"""
+        with self._lock:
+            listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+
+    def get_logger(self, name: str) -> logging.Logger:
+        self.start()
+        return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "dropped": self._handler.dropped, "level": self.level}
+
+
+# Create a singleton instance
+structured_log = StructuredLog(
+    level=settings.log_level,
+    path=settings.log_file,
+    queue_size=settings.log_queue_size,
+)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Application logger `aict.<name>`, written through the non-blocking structured log"""
+    return structured_log.get_logger(name)
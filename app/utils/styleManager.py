@@ -1,8 +1,18 @@
 import json
 import os
+import stat
+import tempfile
+import threading
+import time
 from pathlib import Path
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.utils.settings import settings
+
+# The process umask, read once at import: os.umask can only be read by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
 
 class StylePreferences(BaseModel):
     """Model for code style preferences"""
@@ -14,19 +24,34 @@ class StylePreferences(BaseModel):
 class StyleManager:
     """
     Manages user style preferences for code generation and translation.
-    Handles loading and saving style preferences to a JSON file.
+
+    The default preferences live in style_preferences.json and named
+    profiles (per user or per team) in style_profiles.json. Both are kept
+    in memory; at most every `reload_interval` seconds the files' mtimes are
+    checked and a file is re-read only when it changed, so edits made by
+    hand or by another API process are picked up without reading the files
+    on every request.
     """
-    def __init__(self):
+    def __init__(self, reload_interval: float = 1.0):
         self.preferences_dir = Path("preferences")
         self.preferences_file = self.preferences_dir / "style_preferences.json"
+        self.profiles_file = self.preferences_dir / "style_profiles.json"
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        # File -> (mtime, size, inode) when it was last read
+        self._signatures: Dict[Path, Optional[Tuple[int, int, int]]] = {}
+        self.preferences = StylePreferences()
+        self.profiles: Dict[str, StylePreferences] = {}
         self._ensure_preferences_dir()
         self._load_or_create_default()
+        self._load_profiles()
 
     def _ensure_preferences_dir(self):
         """Make sure the preferences directory exists"""
         if not self.preferences_dir.exists():
             self.preferences_dir.mkdir(parents=True)
-    
+
     def _load_or_create_default(self):
         """Load existing preferences or create default ones"""
         if not self.preferences_file.exists():
@@ -35,35 +60,130 @@ class StyleManager:
             self.preferences = default_prefs
         else:
             self.load_preferences()
-    
+
+    @staticmethod
+    def _signature(path: Path) -> Optional[Tuple[int, int, int]]:
+        try:
+            info = path.stat()
+        except FileNotFoundError:
+            return None
+        return info.st_mtime_ns, info.st_size, info.st_ino
+
+    def _load_profiles(self) -> None:
+        """Load the named profiles from file (none if it does not exist yet)"""
+        signature = self._signature(self.profiles_file)
+        profiles = {}
+        if signature is not None:
+            try:
+                with open(self.profiles_file, 'r') as f:
+                    profiles = {name: StylePreferences(**data) for name, data in json.load(f).items()}
+            except (json.JSONDecodeError, FileNotFoundError, TypeError, ValueError, AttributeError):
+                # Keep serving the profiles already loaded rather than dropping them
+                return
+        self.profiles = profiles
+        self._signatures[self.profiles_file] = signature
+
+    def _refresh(self) -> None:
+        """Re-read whichever file changed since it was last read, at most every reload_interval"""
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            if self._signature(self.preferences_file) != self._signatures.get(self.preferences_file):
+                self.load_preferences()
+            if self._signature(self.profiles_file) != self._signatures.get(self.profiles_file):
+                self._load_profiles()
+
     def load_preferences(self) -> StylePreferences:
-        """Load preferences from file"""
+        """
+        Load preferences from file. A file that cannot be read or parsed (say,
+        one being edited by hand) is never overwritten: the preferences
+        already loaded stay in force, and the file is read again once it changes.
+        """
+        signature = self._signature(self.preferences_file)
         try:
             with open(self.preferences_file, 'r') as f:
-                data = json.load(f)
-                self.preferences = StylePreferences(**data)
-                return self.preferences
-        except (json.JSONDecodeError, FileNotFoundError):
-            self.preferences = StylePreferences()
-            self.save_preferences(self.preferences)
+                self.preferences = StylePreferences(**json.load(f))
+        except (json.JSONDecodeError, FileNotFoundError, TypeError, ValueError, AttributeError):
             return self.preferences
-    
-    def save_preferences(self, preferences: StylePreferences) -> None:
-        """Save preferences to file"""
-        with open(self.preferences_file, 'w') as f:
-            json.dump(preferences.dict(), f, indent=2)
-        self.preferences = preferences
-    
-    def get_preferences_dict(self) -> Dict[str, Any]:
-        """Get current style preferences as a dictionary"""
+        self._signatures[self.preferences_file] = signature
+        return self.preferences
+
+    @staticmethod
+    def _file_mode(path: Path) -> int:
+        """Permissions of the existing file, or those a new file gets under the umask"""
         try:
-            prefs = self.load_preferences()
-            return {
-                "indentation": prefs.indentation,
-                "indent_size": prefs.indent_size,
-                "max_line_length": prefs.max_line_length,
-                "naming_convention": prefs.naming_convention
-            }
+            return stat.S_IMODE(path.stat().st_mode)
+        except FileNotFoundError:
+            return 0o666 & ~_UMASK
+
+    def _write(self, path: Path, data: Any) -> None:
+        """
+        Write a JSON file under a temporary name and rename it into place,
+        so a reader in any process sees either the old or the new contents,
+        never a half-written file.
+        """
+        fd, temporary = tempfile.mkstemp(dir=self.preferences_dir, prefix=f".{path.stem}.", suffix=".tmp")
+        try:
+            # mkstemp creates the file 0600; keep the mode an ordinary write would leave
+            os.chmod(temporary, self._file_mode(path))
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+            raise
+        self._signatures[path] = self._signature(path)
+
+    def save_preferences(self, preferences: StylePreferences, profile: Optional[str] = None) -> None:
+        """Save the default preferences, or those of a named profile, to file"""
+        if profile is None:
+            self._write(self.preferences_file, preferences.model_dump())
+            self.preferences = preferences
+            return
+        with self._lock:
+            # Start from the file so profiles saved by other processes are kept
+            self._load_profiles()
+            profiles = {**self.profiles, profile: preferences}
+            self._write(self.profiles_file, {name: prefs.model_dump() for name, prefs in profiles.items()})
+            self.profiles = profiles
+
+    def delete_profile(self, profile: str) -> bool:
+        """Remove a named profile; returns False if there was none"""
+        with self._lock:
+            self._load_profiles()
+            if profile not in self.profiles:
+                return False
+            profiles = {name: prefs for name, prefs in self.profiles.items() if name != profile}
+            self._write(self.profiles_file, {name: prefs.model_dump() for name, prefs in profiles.items()})
+            self.profiles = profiles
+            return True
+
+    def profile_names(self) -> List[str]:
+        self._refresh()
+        return sorted(self.profiles)
+
+    def get_preferences(self, *profiles: Optional[str]) -> StylePreferences:
+        """
+        Preferences of the first of `profiles` that exists (e.g. the user's,
+        then their team's), else the default preferences.
+        """
+        self._refresh()
+        for profile in profiles:
+            if profile is not None and profile in self.profiles:
+                return self.profiles[profile]
+        return self.preferences
+
+    def get_preferences_dict(self, *profiles: Optional[str]) -> Dict[str, Any]:
+        """Get current style preferences as a dictionary; see get_preferences"""
+        try:
+            return self.get_preferences(*profiles).model_dump()
         except Exception as e:
             return {
                 "indentation": "spaces",
@@ -73,4 +193,4 @@ class StyleManager:
             }
 
 # Create a singleton instance
-style_manager = StyleManager()
\ No newline at end of file
+style_manager = StyleManager(reload_interval=settings.style_reload_interval)
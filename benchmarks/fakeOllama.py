@@ -0,0 +1,287 @@
+"""
+A fake Ollama server for benchmarks and load tests: no model, just Ollama's
+HTTP API with realistic timing.
+
+Implements GET /api/tags, /api/ps and /api/version and POST /api/generate (streamed
+NDJSON or a single reply, preload requests without a prompt, num_predict).
+Timing follows a profile: model load time, prompt evaluation and decode
+speed in tokens per second, jitter, and how many generations run at once.
+
+Usage:
+    python -m benchmarks.fakeOllama [--port 11434] [--profile gpu] [--tokens-per-second N] ...
+
+Then point the API at it with AICT_OLLAMA_BASE_URL=http://127.0.0.1:<port>.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from app.llm.modelRegistry import registered_models
+
+
+class FakeProfile(BaseModel):
+    """Timing of the fake backend"""
+    load_ms: float = 0.0                     # loading a model that is not resident
+    prompt_tokens_per_second: float = 0.0    # 0 = prompt evaluation is instant
+    tokens_per_second: float = 0.0           # decode speed; 0 = no delay between tokens
+    response_tokens: int = 200               # reply length when num_predict is not set
+    jitter: float = 0.0                      # +/- fraction applied to every delay
+    parallel: int = 4                        # generations served at once (OLLAMA_NUM_PARALLEL)
+    max_loaded_models: int = 1               # resident models before one is evicted
+    runaway: bool = False                    # replies loop like a degenerate model, for the output guard
+
+
+PROFILES: Dict[str, FakeProfile] = {
+    # No delays at all: measures the API's own overhead
+    "instant": FakeProfile(),
+    # A warm 7B model on a consumer GPU
+    "gpu": FakeProfile(load_ms=2500, prompt_tokens_per_second=1500, tokens_per_second=60, jitter=0.1),
+    # The same model on CPU
+    "cpu": FakeProfile(
+        load_ms=8000, prompt_tokens_per_second=120, tokens_per_second=10, jitter=0.15, parallel=1
+    ),
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def reply_tokens(prompt: str, count: int, runaway: bool = False) -> List[str]:
+    """
+    Deterministic reply split into roughly token-sized pieces: prose for
+    explanation prompts, code otherwise. Every line is numbered, so the
+    reply never looks like a repetition loop to the output guard, unless
+    `runaway` is set: then the code repeats one block until num_predict.
+    """
+    if runaway:
+        block = "    total = combine(total, items[index])\n    if total > limit:\n        raise ValueError(total)\n"
+        text = "def process(items):\n" + block * (count // 8 + 1)
+        pieces = [text[i:i + 4] for i in range(0, len(text), 4)]
+    elif "explain" in prompt.lower():
+        lines = [f"Step {i} adds item {i} to the running total and checks it against the limit. " for i in range(1, count)]
+        pieces = [word + " " for line in lines for word in line.split()]
+    else:
+        lines = ["def process(items):\n", "    total_0 = 0\n"]
+        lines += [f"    total_{i} = combine(total_{i - 1}, items[{i}])\n" for i in range(1, count)]
+        text = "".join(lines)
+        pieces = [text[i:i + 4] for i in range(0, len(text), 4)]
+    return pieces[:count]
+
+
+class FakeOllama:
+    """Shared state of the fake server: the profile, resident models and the parallel-slot limit"""
+    def __init__(self, profile: FakeProfile, models: List[str]):
+        self.profile = profile
+        self.models = models
+        self.slots = threading.BoundedSemaphore(profile.parallel)
+        self._lock = threading.Lock()
+        self._resident: Dict[str, float] = {}  # model -> last use
+        self._contexts: Dict[str, Any] = {}  # model -> num_ctx it was loaded with
+        self.stats = {"generations": 0, "loads": 0, "aborted": 0}
+
+    def delay(self, seconds: float) -> float:
+        if seconds <= 0:
+            return 0.0
+        if self.profile.jitter:
+            seconds *= 1 + random.uniform(-self.profile.jitter, self.profile.jitter)
+        time.sleep(seconds)
+        return seconds
+
+    def load(self, model: str, num_ctx: Optional[int] = None) -> float:
+        """
+        Make the model resident, evicting the least recently used one; returns
+        the load time. Like Ollama, a request for another context size reloads it.
+        """
+        with self._lock:
+            loaded = model in self._resident and self._contexts.get(model) == num_ctx
+            self._resident[model] = time.monotonic()
+            self._contexts[model] = num_ctx
+            if not loaded:
+                self.stats["loads"] += 1
+                while len(self._resident) > self.profile.max_loaded_models:
+                    del self._resident[min(self._resident, key=self._resident.get)]
+        return 0.0 if loaded else self.delay(self.profile.load_ms / 1000)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeOllamaServer"
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _send_json(self, body: Dict[str, Any], status: int = 200) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, body: Dict[str, Any]) -> None:
+        data = (json.dumps(body) + "\n").encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self) -> None:
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": name, "model": name} for name in self.server.fake.models]})
+        elif self.path == "/api/ps":
+            with self.server.fake._lock:
+                resident = list(self.server.fake._resident)
+            self._send_json({"models": [{"name": name, "model": name} for name in resident]})
+        elif self.path == "/api/version":
+            self._send_json({"version": "0.0.0-fake"})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self) -> None:
+        if self.path != "/api/generate":
+            self._send_json({"error": "not found"}, 404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        model = body.get("model", "")
+        if model not in self.server.fake.models:
+            self._send_json({"error": f"model '{model}' not found"}, 404)
+            return
+        try:
+            self._generate(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away mid-generation, as a cancelled request does
+            with self.server.fake._lock:
+                self.server.fake.stats["aborted"] += 1
+
+    def _generate(self, body: Dict[str, Any]) -> None:
+        fake = self.server.fake
+        profile = fake.profile
+        prompt = body.get("prompt") or ""
+        stream = body.get("stream", True)
+        options = body.get("options") or {}
+        count = options.get("num_predict") or profile.response_tokens
+        if count < 0:
+            count = profile.response_tokens
+
+        with fake.slots:
+            started = time.monotonic()
+            load = fake.load(body["model"], options.get("num_ctx"))
+            final: Dict[str, Any] = {"model": body["model"], "response": "", "done": True, "load_duration": int(load * 1e9)}
+            if not prompt:
+                # A preload request: load the model and reply without generating
+                final.update(done_reason="load", total_duration=int((time.monotonic() - started) * 1e9))
+                self._send_json(final)
+                return
+
+            prompt_tokens = estimate_tokens(prompt)
+            rate = profile.prompt_tokens_per_second
+            prompt_eval = fake.delay(prompt_tokens / rate) if rate else 0.0
+            if stream:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+            pieces = reply_tokens(prompt, count, profile.runaway)
+            decode_started = time.monotonic()
+            per_token = 1 / profile.tokens_per_second if profile.tokens_per_second else 0.0
+            for piece in pieces:
+                fake.delay(per_token)
+                if stream:
+                    self._send_chunk({"model": body["model"], "response": piece, "done": False})
+            eval_duration = time.monotonic() - decode_started
+
+            final.update(
+                done_reason="length" if len(pieces) >= count else "stop",
+                prompt_eval_count=prompt_tokens,
+                prompt_eval_duration=int(prompt_eval * 1e9),
+                eval_count=len(pieces),
+                eval_duration=int(eval_duration * 1e9),
+                total_duration=int((time.monotonic() - started) * 1e9),
+            )
+            with fake._lock:
+                fake.stats["generations"] += 1
+            if stream:
+                self._send_chunk(final)
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            else:
+                self._send_json({**final, "response": "".join(pieces)})
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, fake: FakeOllama, host: str = "127.0.0.1"):
+        super().__init__((host, port), _Handler)
+        self.fake = fake
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        # A client aborting a generation resets its connection; that is expected, not an error
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_fake_ollama(
+    profile: FakeProfile,
+    port: int = 0,
+    models: Optional[List[str]] = None,
+) -> FakeOllamaServer:
+    """Serve a fake Ollama on a background thread (port 0 = any free port)"""
+    server = FakeOllamaServer(port, FakeOllama(profile, models or registered_models()))
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server
+
+
+def profile_from_args(args: argparse.Namespace) -> FakeProfile:
+    """The named profile with any timing overridden on the command line"""
+    overrides = {
+        field: getattr(args, field) for field in FakeProfile.model_fields
+        if getattr(args, field, None) is not None
+    }
+    return PROFILES[args.profile].model_copy(update=overrides)
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="gpu", help="timing profile")
+    parser.add_argument("--load-ms", dest="load_ms", type=float, help="model load time")
+    parser.add_argument("--prompt-tokens-per-second", dest="prompt_tokens_per_second", type=float)
+    parser.add_argument("--tokens-per-second", dest="tokens_per_second", type=float, help="decode speed")
+    parser.add_argument("--response-tokens", dest="response_tokens", type=int, help="reply length without num_predict")
+    parser.add_argument("--jitter", type=float, help="+/- fraction applied to every delay")
+    parser.add_argument("--parallel", type=int, help="generations served at once")
+    parser.add_argument("--max-loaded-models", dest="max_loaded_models", type=int)
+    parser.add_argument("--runaway", action="store_true", default=None, help="reply in a repetition loop")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    profile = profile_from_args(args)
+    server = FakeOllamaServer(args.port, FakeOllama(profile, registered_models()), args.host)
+    print(f"Fake Ollama ({args.profile}: {profile.model_dump()}) on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
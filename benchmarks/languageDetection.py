@@ -0,0 +1,122 @@
+"""
+Compares the signature-based language detector with the previous behaviour
+(pygments.guess_lexer over the full input) for accuracy and latency.
+
+Usage:
+    python -m benchmarks.languageDetection [--repeat N] [--scale N]
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, Dict, List, Tuple
+
+from pygments.lexers import guess_lexer
+from pygments.util import ClassNotFound
+
+from app.llm.languageDetection import PYGMENTS_LANGUAGE_MAP, LanguageDetector
+from app.utils.settings import settings
+
+SAMPLES: List[Tuple[str, str]] = [
+    ("python", "import os\n\nclass Greeter:\n    def __init__(self, name):\n        self.name = name\n\n    def greet(self):\n        print(f'Hello {self.name}')\n"),
+    ("python", "def fib(n):\n    if n < 2:\n        return n\n    return fib(n - 1) + fib(n - 2)\n"),
+    ("python", "from typing import List\n\ndef total(xs: List[int]) -> int:\n    result = 0\n    for x in xs:\n        result += x\n    return result\n"),
+    ("javascript", "const express = require('express');\nconst app = express();\napp.get('/', (req, res) => res.send('ok'));\n"),
+    ("javascript", "function sum(a, b) {\n  return a + b;\n}\nconsole.log(sum(1, 2));\n"),
+    ("javascript", "let items = [1, 2, 3];\nitems.forEach(item => {\n  if (item === 2) { document.title = 'two'; }\n});\n"),
+    ("typescript", "interface User {\n  id: number;\n  name: string;\n}\n\nfunction greet(user: User): string {\n  return `Hi ${user.name}`;\n}\n"),
+    ("typescript", "export type Id = string | number;\nconst ids: Id[] = [1, 'a'];\n"),
+    ("typescript", "import { Injectable } from '@angular/core';\nexport class Service {\n  load(id: number): Promise<string> {\n    return fetch('/x').then(r => r.text());\n  }\n}\n"),
+    ("java", "public class Main {\n    public static void main(String[] args) {\n        System.out.println(\"Hello\");\n    }\n}\n"),
+    ("java", "package com.example;\n\nimport java.util.List;\n\npublic class Repo {\n    private final List<String> items;\n}\n"),
+    ("java", "public interface Shape {\n    double area();\n}\n\nclass Circle implements Shape {\n    @Override\n    public double area() { return 3.14; }\n}\n"),
+    ("csharp", "using System;\n\nnamespace Demo\n{\n    class Program\n    {\n        static void Main(string[] args)\n        {\n            Console.WriteLine(\"Hello\");\n        }\n    }\n}\n"),
+    ("csharp", "public class Person\n{\n    public string Name { get; set; }\n    public int Age { get; private set; }\n}\n"),
+    ("cpp", "#include <iostream>\n#include <vector>\n\nint main() {\n    std::vector<int> v{1, 2, 3};\n    for (auto x : v) std::cout << x << std::endl;\n    return 0;\n}\n"),
+    ("cpp", "template <typename T>\nT max_of(T a, T b) {\n    return a > b ? a : b;\n}\n"),
+    ("go", "package main\n\nimport \"fmt\"\n\nfunc main() {\n\tfmt.Println(\"hello\")\n}\n"),
+    ("go", "func (s *Server) Start() error {\n\tch := make(chan int)\n\tdefer close(ch)\n\treturn nil\n}\n"),
+    ("rust", "fn main() {\n    let mut count = 0;\n    count += 1;\n    println!(\"{}\", count);\n}\n"),
+    ("rust", "use std::collections::HashMap;\n\npub struct Cache {\n    map: HashMap<String, String>,\n}\n\nimpl Cache {\n    pub fn new() -> Self { Cache { map: HashMap::new() } }\n}\n"),
+    ("ruby", "class Dog\n  attr_reader :name\n\n  def initialize(name)\n    @name = name\n  end\n\n  def bark\n    puts 'Woof'\n  end\nend\n"),
+    ("ruby", "[1, 2, 3].each do |n|\n  puts n\nend\n"),
+    ("php", "<?php\nfunction greet($name) {\n    echo \"Hello $name\";\n}\n"),
+    ("php", "<?php\nclass User {\n    public function getName() { return $this->name; }\n}\n"),
+    ("swift", "import Foundation\n\nfunc greet(name: String) -> String {\n    return \"Hello \\(name)\"\n}\n"),
+    ("swift", "guard let url = URL(string: path) else { return }\nvar count: Int = 0\n"),
+    ("kotlin", "fun main() {\n    val name = \"Kotlin\"\n    println(\"Hello $name\")\n}\n"),
+    ("kotlin", "data class User(val id: Int, val name: String)\n\nfun describe(x: Any) = when (x) {\n    is Int -> \"int\"\n    else -> \"other\"\n}\n"),
+    ("html", "<!DOCTYPE html>\n<html>\n<head><title>Test</title></head>\n<body><div class=\"x\">Hi</div></body>\n</html>\n"),
+    ("css", "body {\n  margin: 0;\n  font-family: sans-serif;\n}\n\n.header {\n  color: #333;\n}\n"),
+]
+
+
+def legacy_detect(code: str) -> str:
+    """Detection as it worked before: guess_lexer over the whole input"""
+    try:
+        lexer = guess_lexer(code, stripnl=False, stripall=False)
+    except ClassNotFound:
+        return "unknown"
+    return PYGMENTS_LANGUAGE_MAP.get(lexer.name, lexer.name.lower())
+
+
+def measure(detect: Callable[[str], str], samples: List[Tuple[str, str]], repeat: int) -> Dict[str, float]:
+    timings = []
+    correct = 0
+    for expected, code in samples:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            language = detect(code)
+            timings.append((time.perf_counter() - started) * 1000)
+        correct += language == expected
+    timings.sort()
+    return {
+        "accuracy": round(correct / len(samples), 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p50_ms": round(timings[len(timings) // 2], 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95)], 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per sample")
+    parser.add_argument("--scale", type=int, default=50, help="copies of each sample in the large-input run")
+    args = parser.parse_args()
+
+    def fresh_detector() -> LanguageDetector:
+        return LanguageDetector(
+            prefix_chars=settings.detection_prefix_chars,
+            min_score=settings.detection_min_score,
+            min_margin=settings.detection_min_margin,
+            cache_size=settings.detection_cache_size,
+        )
+
+    # Warm pygments' lexer registry so the first legacy call is not penalised
+    legacy_detect("x = 1")
+
+    uncached = fresh_detector()
+    cached = fresh_detector()
+    for _, code in SAMPLES:
+        cached.detect(code)
+
+    def uncached_detect(code: str) -> str:
+        uncached.clear()
+        return uncached.detect(code).language
+
+    large = [(expected, code * args.scale) for expected, code in SAMPLES]
+    runs = {
+        "legacy (guess_lexer)": (legacy_detect, SAMPLES),
+        "signatures (cold)": (uncached_detect, SAMPLES),
+        "signatures (memoized)": (lambda code: cached.detect(code).language, SAMPLES),
+        f"legacy, {args.scale}x input": (legacy_detect, large),
+        f"signatures (cold), {args.scale}x input": (uncached_detect, large),
+    }
+
+    print(f"{'detector':<38}{'accuracy':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, (detect, samples) in runs.items():
+        result = measure(detect, samples, args.repeat)
+        print(f"{name:<38}{result['accuracy']:>10}{result['mean_ms']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
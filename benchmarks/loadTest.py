@@ -0,0 +1,292 @@
+"""
+Load test for the API: drives /api/explain_code, /api/translate_code and
+/api/generate_code (and their /stream variants, for time to first token)
+at several concurrency levels and reports p50/p95/p99 latency, throughput
+and TTFT. Results can be saved as a JSON baseline and compared with one
+from another commit.
+
+By default a fake Ollama (benchmarks.fakeOllama) and the API are started
+locally, so no model is needed; pass --url to test a running API instead.
+With --backends N the API balances across N fake Ollama nodes, which shows
+how throughput scales with nodes.
+
+Usage:
+    python -m benchmarks.loadTest [--profile gpu] [--concurrency 1,4,16] [--requests 32]
+        [--backends 3] [--save benchmarks/baselines/main.json] [--compare benchmarks/baselines/main.json]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.fakeOllama import add_profile_arguments, profile_from_args, start_fake_ollama
+
+SCENARIOS = ("explain", "translate", "generate")
+MODES = ("json", "stream")
+
+SNIPPET = """def moving_average(values, window):
+    if window <= 0:
+        raise ValueError("window must be positive")
+    result = []
+    total = 0
+    for i, value in enumerate(values):
+        total += value
+        if i >= window:
+            total -= values[i - window]
+        if i >= window - 1:
+            result.append(total / window)
+    return result
+"""
+
+# Figures where an increase is a regression, and those where a decrease is
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "ttft_p50_ms", "ttft_p95_ms", "ttft_p99_ms")
+HIGHER_IS_BETTER = ("throughput_rps",)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return round(sorted_values[rank - 1], 2)
+
+
+def build_request(scenario: str, mode: str, index: int) -> Tuple[str, str, Dict[str, Any]]:
+    """(method, path, httpx kwargs) for one request; each input is unique so nothing is served from cache"""
+    code = f"{SNIPPET}# request {index}\n"
+    suffix = "/stream" if mode == "stream" else ""
+    if scenario == "explain":
+        return "POST", f"/api/explain_code{suffix}", {
+            "json": {"code": code, "language": "python", "use_cache": False, "mode": "single"}
+        }
+    if scenario == "translate":
+        return "POST", f"/api/translate_code{suffix}", {
+            "json": {"code": code, "target_language": "javascript", "use_cache": False}
+        }
+    return "GET", f"/api/generate_code{suffix}", {
+        "params": {"description": f"a function that computes moving averages, variant {index}",
+                   "language": "python", "use_cache": False}
+    }
+
+
+async def timed_request(
+    client: httpx.AsyncClient, scenario: str, mode: str, index: int
+) -> Tuple[Optional[float], Optional[float], Optional[str]]:
+    """(latency ms, time to first token ms, error) for one request"""
+    method, path, kwargs = build_request(scenario, mode, index)
+    started = time.perf_counter()
+    first_token = None
+    try:
+        if mode == "json":
+            response = await client.request(method, path, **kwargs)
+            response.raise_for_status()
+        else:
+            async with client.stream(method, path, **kwargs) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line.startswith("event: token") and first_token is None:
+                        first_token = (time.perf_counter() - started) * 1000
+                    elif line.startswith("event: error") or line.startswith("event: cancelled"):
+                        return None, None, line[len("event: "):]
+    except httpx.HTTPError as e:
+        return None, None, str(e) or type(e).__name__
+    return (time.perf_counter() - started) * 1000, first_token, None
+
+
+async def run_level(
+    client: httpx.AsyncClient, scenario: str, mode: str, concurrency: int, requests: int, offset: int
+) -> Dict[str, Any]:
+    """Send `requests` requests with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int):
+        async with semaphore:
+            return await timed_request(client, scenario, mode, index)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[one(offset + i) for i in range(requests)])
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _, error in results if error is None)
+    ttfts = sorted(ttft for _, ttft, error in results if error is None and ttft is not None)
+    errors = [error for _, _, error in results if error is not None]
+    summary: Dict[str, Any] = {
+        "requests": requests,
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+    if mode == "stream":
+        summary.update(
+            ttft_p50_ms=percentile(ttfts, 0.50),
+            ttft_p95_ms=percentile(ttfts, 0.95),
+            ttft_p99_ms=percentile(ttfts, 0.99),
+        )
+    if errors:
+        summary["first_error"] = errors[0]
+    return summary
+
+
+async def run_benchmark(url: str, scenarios: List[str], modes: List[str], levels: List[int], requests: int, warmup: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    limits = httpx.Limits(max_connections=max(levels) * 2, max_keepalive_connections=max(levels) * 2)
+    async with httpx.AsyncClient(base_url=url, timeout=600, limits=limits) as client:
+        offset = 0
+        for scenario in scenarios:
+            # Warm-up requests load the models and fill the connection pools; they are not reported
+            for i in range(warmup):
+                await timed_request(client, scenario, "json", offset + i)
+            offset += warmup
+            for mode in modes:
+                for concurrency in levels:
+                    key = f"{scenario}/{mode}/c{concurrency}"
+                    results[key] = await run_level(client, scenario, mode, concurrency, requests, offset)
+                    offset += requests
+                    print_row(key, results[key])
+    return results
+
+
+def print_row(key: str, summary: Dict[str, Any]) -> None:
+    def show(value):
+        return "-" if value is None else value
+    print(
+        f"{key:<26}{show(summary['p50_ms']):>10}{show(summary['p95_ms']):>10}{show(summary['p99_ms']):>10}"
+        f"{show(summary.get('ttft_p50_ms')):>11}{summary['throughput_rps']:>10}{summary['errors']:>8}"
+    )
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print the change of every figure against the baseline; returns the regressions"""
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created_at', '?')}), tolerance {tolerance:.0%}")
+    for key, now in current["results"].items():
+        before = baseline["results"].get(key)
+        if before is None:
+            continue
+        changes = []
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            old, new = before.get(metric), now.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance
+            changes.append(f"{metric} {change:+.1%}{' !' if worse else ''}")
+            if worse:
+                regressions.append(f"{key} {metric}: {old} -> {new}")
+        print(f"{key:<26}{', '.join(changes)}")
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_api(app: str, ollama_urls: List[str], port: int) -> subprocess.Popen:
+    """Run the API in a subprocess pointed at the fake Ollama nodes, and wait until it is ready"""
+    env = {**os.environ, "AICT_OLLAMA_BASE_URL": ollama_urls[0], "AICT_OLLAMA_BACKENDS": json.dumps(ollama_urls)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The API exited with code {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health/ready", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError("The API did not become ready within 60s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="test a running API instead of starting one against a fake Ollama")
+    parser.add_argument("--app", default="app.api.server:app", help="ASGI app started when --url is not given")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated: " + ", ".join(SCENARIOS))
+    parser.add_argument("--modes", default=",".join(MODES), help="json (latency) and/or stream (adds TTFT)")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="requests per scenario, mode and level")
+    parser.add_argument("--warmup", type=int, default=2, help="unreported requests per scenario")
+    parser.add_argument("--backends", type=int, default=1, help="fake Ollama nodes the API balances across")
+    parser.add_argument("--save", help="write the results to this JSON baseline")
+    parser.add_argument("--compare", help="compare the results with this JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed change before a figure is a regression")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    modes = [name for name in args.modes.split(",") if name]
+    levels = [int(level) for level in args.concurrency.split(",") if level]
+    unknown = set(scenarios) - set(SCENARIOS) | set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown scenario or mode: {', '.join(sorted(unknown))}")
+
+    profile = profile_from_args(args)
+    api = None
+    url = args.url
+    if url is None:
+        fakes = [start_fake_ollama(profile) for _ in range(args.backends)]
+        port = free_port()
+        api = start_api(args.app, [fake.base_url for fake in fakes], port)
+        url = f"http://127.0.0.1:{port}"
+
+    print(f"{'scenario/mode/level':<26}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ttft p50':>11}{'req/s':>10}{'errors':>8}")
+    try:
+        results = asyncio.run(run_benchmark(url, scenarios, modes, levels, args.requests, args.warmup))
+    finally:
+        if api is not None:
+            api.terminate()
+            api.wait(timeout=10)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "url": args.url or "local (fake Ollama)",
+        "profile": args.profile if args.url is None else None,
+        "fake_ollama": profile.model_dump() if args.url is None else None,
+        "backends": args.backends if args.url is None else None,
+        "requests": args.requests,
+        "results": results,
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
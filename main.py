@@ -1,18 +1,11 @@
 import flet as ft
-from fastapi import FastAPI
 import uvicorn
 import threading
 
 # Import your application components
-from app.api.routes import router
+from app.api.server import app
 from app.ui.views import main_view
 
-# Create FastAPI app
-app = FastAPI(title="AI Code Assistant")
-
-# Register API routes
-app.include_router(router)
-
 # Define Flet UI main function
 def main(page: ft.Page):
     page.title = "AI Code Assistant"
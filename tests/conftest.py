@@ -0,0 +1,45 @@
+import os
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+# Tests import the application as `app`, however pytest is invoked
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+# The application reads its settings on import, so it is pointed at the fake
+# Ollama (served by the fake_ollama fixture) before any test imports it
+FAKE_OLLAMA_PORT = _free_port()
+os.environ["AICT_OLLAMA_BASE_URL"] = f"http://127.0.0.1:{FAKE_OLLAMA_PORT}"
+os.environ["AICT_OLLAMA_BACKENDS"] = "[]"
+os.environ["AICT_PRELOAD_MODELS"] = "false"
+os.environ.pop("AICT_CACHE_DB_PATH", None)
+os.environ.pop("AICT_SHARED_STATE_PATH", None)
+
+
+@pytest.fixture(scope="session")
+def fake_ollama():
+    """benchmarks/fakeOllama.py with no delays, serving every registered model"""
+    from benchmarks.fakeOllama import PROFILES, start_fake_ollama
+
+    server = start_fake_ollama(PROFILES["instant"], port=FAKE_OLLAMA_PORT)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def runaway_ollama(fake_ollama):
+    """The fake Ollama replying in a repetition loop for the duration of a test"""
+    profile = fake_ollama.fake.profile
+    fake_ollama.fake.profile = profile.model_copy(update={"runaway": True})
+    yield fake_ollama
+    fake_ollama.fake.profile = profile
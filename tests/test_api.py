@@ -1 +1,108 @@
-## tests? idk
\ No newline at end of file
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routes import router
+from app.llm.healthMonitor import health_monitor
+from app.utils.settings import settings
+
+
+@pytest.fixture
+def client(fake_ollama):
+    # The routes without the server's lifespan, so no background workers start
+    api = FastAPI()
+    api.include_router(router)
+    with TestClient(api) as client:
+        yield client
+
+
+def test_translation_is_served_from_the_cache_until_its_key_is_dropped(client):
+    body = {"code": "def double(x):\n    return x * 2\n", "target_language": "rust"}
+    first = client.post("/api/translate_code", json=body).json()
+    assert first["source_language"] == "python"
+    assert "def process" in first["code"]
+
+    hits = client.get("/api/cache/stats").json()["hits"]
+    assert client.post("/api/translate_code", json=body).json()["cache_key"] == first["cache_key"]
+    assert client.get("/api/cache/stats").json()["hits"] == hits + 1
+
+    assert client.delete(f"/api/cache/{first['cache_key']}").json() == {"removed": 1}
+    assert client.delete(f"/api/cache/{first['cache_key']}").json() == {"removed": 0}
+
+
+def test_multi_target_stream_reports_every_target(client):
+    body = {"code": "def double(x):\n    return x * 2\n", "target_language": ["go", "java"]}
+    events = client.post("/api/translate_code/stream", json=body).text
+    assert events.count("event: target_done") == 2
+    assert '"targets": ["go", "java"]' in events
+
+
+def test_open_breaker_rejects_requests_at_once(client):
+    health_monitor.breaker.trip()
+    try:
+        response = client.get("/api/generate_code", params={"description": "sum a list", "language": "python"})
+    finally:
+        health_monitor.breaker.record_success()
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+LARGE_FILE = "".join(
+    f"def scale_{i}(values, factor):\n    result = []\n    for value in values:\n"
+    f"        result.append(value * factor + {i})\n    return result\n\n"
+    for i in range(400)
+)
+
+
+def done_event(events: str) -> dict:
+    return json.loads(events.split("event: done\ndata: ")[1].split("\n")[0])
+
+
+def test_streamed_explanation_of_a_large_file_is_map_reduced(client):
+    events = client.post("/api/explain_code/stream", json={"code": LARGE_FILE, "language": "python"}).text
+    done = done_event(events)
+    assert done["mode"] == "map_reduce"
+    assert done["explained_chunks"] > 1
+    assert done["budget"]["fitting"] != "overflow"
+
+
+def test_overflowing_single_explanation_is_rejected(client):
+    response = client.post("/api/explain_code/stream", json={"code": LARGE_FILE, "language": "python", "mode": "single"})
+    assert response.status_code == 413
+
+
+def test_multi_target_stream_reports_a_guard_stop_per_target(client, runaway_ollama):
+    code = "".join(f"def add_{i}(a, b):\n    return a + b * {i}\n\n" for i in range(20))
+    events = client.post("/api/translate_code/stream", json={"code": code, "target_language": ["go", "java"]}).text
+    reports = done_event(events)["reports"]
+    assert set(reports) == {"go", "java"}
+    for report in reports.values():
+        assert report["stop_reason"] == "repetition"
+        assert report["clean_chars"] > 0
+        assert report["budget"]["num_predict"] > 0
+
+
+def test_batch_translation_returns_every_item_in_order(client):
+    items = [
+        {"id": f"snippet-{i}", "code": f"def triple_{i}(x):\n    return x * 3\n", "target_language": "go"}
+        for i in range(5)
+    ]
+    response = client.post("/api/translate_batch", json={"items": items, "concurrency": 2}).json()
+    assert response["succeeded"] == 5 and response["failed"] == 0
+    assert [result["id"] for result in response["results"]] == [item["id"] for item in items]
+    assert all(result["source_language"] == "python" for result in response["results"])
+
+
+def test_streamed_batch_ends_with_a_summary_line(client):
+    items = [{"code": f"def quadruple_{i}(x):\n    return x * 4\n"} for i in range(3)]
+    lines = client.post("/api/explain_batch", json={"items": items, "stream": True}).text.splitlines()
+    results, summary = [json.loads(line) for line in lines[:-1]], json.loads(lines[-1])
+    assert sorted(result["index"] for result in results) == [0, 1, 2]
+    assert summary["done"] and summary["succeeded"] == 3
+
+
+def test_oversized_batch_is_rejected(client):
+    items = [{"description": "sum a list", "language": "python"}] * (settings.batch_max_items + 1)
+    assert client.post("/api/generate_batch", json={"items": items}).status_code == 400
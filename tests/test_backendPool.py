@@ -0,0 +1,84 @@
+import time
+
+import httpx
+import pytest
+
+from app.llm.backendPool import BackendPool
+from app.llm.healthMonitor import BackendUnavailableError, CircuitBreaker
+from benchmarks.fakeOllama import PROFILES, start_fake_ollama
+
+NODES = ["http://gpu1", "http://gpu2", "http://gpu3"]
+
+
+def make_pool(urls=NODES, affinity_slack=2, eject_seconds=0.05):
+    return BackendPool(
+        urls=urls, failure_threshold=2, eject_seconds=eject_seconds, affinity_slack=affinity_slack, probe_timeout=1.0
+    )
+
+
+def test_requests_go_to_the_least_busy_node():
+    pool = make_pool(affinity_slack=0)
+    first, second, third = (pool.acquire("coder") for _ in range(3))
+    assert len({first.url, second.url, third.url}) == 3
+    pool.release(second, "coder", None)
+    assert pool.acquire("coder") is second
+
+
+def test_node_with_the_model_loaded_is_preferred_within_the_slack():
+    pool = make_pool(affinity_slack=1)
+    loaded = pool.backends[1]
+    pool.mark_resident(loaded.url, "coder")
+    assert pool.acquire("coder") is loaded
+    assert pool.acquire("coder") is loaded  # one more outstanding than the idle nodes: within the slack
+    assert pool.acquire("coder") is not loaded  # two more: a model load is cheaper than the wait
+    assert pool.stats()["affinity_hits"] == 2
+
+
+def test_nodes_without_the_model_are_skipped():
+    pool = make_pool()
+    pool.backends[0].models = {"writer:latest"}
+    pool.backends[1].models = {"coder:latest"}
+    pool.backends[2].models = {"writer:latest"}
+    assert pool.acquire("coder") is pool.backends[1]
+    assert pool.acquire("writer") is not pool.backends[1]
+
+
+def test_failing_node_is_ejected_then_given_a_trial():
+    pool = make_pool(urls=NODES[:2])
+    failing = pool.backends[0]
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            with pool.lease("coder", exclude=[pool.backends[1]]):
+                raise httpx.ConnectError("connection refused")
+    assert failing.breaker.state == CircuitBreaker.OPEN
+    assert pool.stats()["backends"][0]["ejections"] == 1
+    assert all(pool.acquire("coder") is pool.backends[1] for _ in range(3))
+
+    time.sleep(0.06)
+    with pool.lease("coder", exclude=[pool.backends[1]]) as trial:
+        assert trial is failing
+    assert failing.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_no_node_left_is_unavailable():
+    pool = make_pool(urls=NODES[:1], eject_seconds=30)
+    pool.backends[0].breaker.trip()
+    with pytest.raises(BackendUnavailableError) as unavailable:
+        pool.acquire("coder")
+    assert unavailable.value.retry_after > 0
+    assert pool.stats()["no_backend"] == 1
+
+
+def test_probe_reads_models_from_live_nodes_and_ejects_dead_ones():
+    server = start_fake_ollama(PROFILES["instant"], models=["coder:latest"])
+    try:
+        live = f"http://127.0.0.1:{server.server_address[1]}"
+        pool = make_pool(urls=[live, "http://127.0.0.1:9"], eject_seconds=30)
+        up, down = pool.probe()
+        assert up.reachable and up.models == ["coder:latest"]
+        assert not down.reachable
+        assert pool.backends[1].breaker.state == CircuitBreaker.OPEN
+        assert pool.acquire("coder") is pool.backends[0]
+    finally:
+        server.shutdown()
+        server.server_close()
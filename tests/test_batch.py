@@ -0,0 +1,42 @@
+import asyncio
+
+from app.api.batch import batch_concurrency, run_bounded
+from app.utils.settings import settings
+
+
+def collect(items, worker, concurrency):
+    async def run():
+        return [result async for result in run_bounded(items, worker, concurrency)]
+    return asyncio.run(run())
+
+
+def test_at_most_concurrency_items_run_at_once():
+    running = {"now": 0, "peak": 0}
+
+    async def worker(index, item):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        return {"output": item}
+
+    results = collect([f"item-{i}" for i in range(10)], worker, 3)
+    assert running["peak"] == 3
+    assert sorted(result.output for result in results) == sorted(f"item-{i}" for i in range(10))
+
+
+def test_a_failing_item_does_not_fail_the_batch():
+    async def worker(index, item):
+        if index == 1:
+            raise ValueError("unsupported language")
+        return {"output": item}
+
+    results = {result.index: result for result in collect(["a", "b", "c"], worker, 2)}
+    assert results[1].error == "unsupported language"
+    assert results[0].output == "a" and results[2].output == "c"
+
+
+def test_requested_concurrency_is_clamped_to_the_limits():
+    assert batch_concurrency(None) == settings.batch_concurrency
+    assert batch_concurrency(0) == settings.batch_concurrency
+    assert batch_concurrency(10_000) == settings.batch_max_concurrency
@@ -0,0 +1,77 @@
+import contextvars
+import threading
+import time
+
+from app.llm.chunkedTranslation import ChunkPool, chunk_budget
+from app.llm.codeChunker import plan_chunks
+from app.llm.mapReduceExplanation import explanation_budget
+from app.llm.modelConfiguration import OllamaModelConfig
+from app.llm.modelTask import ModelTask
+from app.llm.scheduler import RequestContext, RequestScheduler, request_context
+from app.llm.tokenBudget import estimate_tokens, fits_in_context, max_code_tokens
+
+CONFIG = OllamaModelConfig(name="test", num_ctx=2048)
+
+# Dense code: many short tokens per character, so a character heuristic undercounts it
+SOURCE = "".join(f"def f{i}(a,b):\n    return (a+{i})*(b-{i})//[{i},{i}][a%2]\n\n" for i in range(120))
+
+
+def test_overflowing_file_is_split_into_chunks_that_fit():
+    assert not fits_in_context(ModelTask.CODE_TRANSLATION, CONFIG, SOURCE, "python")
+    plan = plan_chunks(SOURCE, "python", chunk_budget(CONFIG, SOURCE))
+    assert len(plan.chunks) > 1
+    limit = max_code_tokens(ModelTask.CODE_TRANSLATION, CONFIG)
+    assert all(estimate_tokens(chunk.text) <= limit for chunk in plan.chunks)
+
+
+def test_explanation_chunks_fit_one_prompt():
+    plan = plan_chunks(SOURCE, "python", explanation_budget(CONFIG, SOURCE), stable=True)
+    assert len(plan.chunks) > 1
+    assert all(fits_in_context(ModelTask.CODE_EXPLANATION, CONFIG, chunk.text, "python") for chunk in plan.chunks)
+
+
+def test_max_code_tokens_is_the_fitting_boundary():
+    limit = max_code_tokens(ModelTask.CODE_TRANSLATION, CONFIG)
+    assert 0 < limit < CONFIG.num_ctx
+    assert fits_in_context(ModelTask.CODE_TRANSLATION, CONFIG, "", "python")
+    assert not fits_in_context(ModelTask.CODE_TRANSLATION, CONFIG, "x" * 5 * CONFIG.num_ctx, "python")
+
+
+def test_interactive_chunks_are_not_queued_behind_batch_chunks():
+    scheduler = RequestScheduler(capacity=1, max_queue_depth=16, task_priorities={})
+    pool = ChunkPool(workers=2, name="test-chunks")
+    order = []
+
+    def generate(name):
+        scheduler.acquire(ModelTask.CODE_TRANSLATION)
+        order.append(name)
+        scheduler.release(0.0)
+        return name
+
+    def request(priority, names, results):
+        request_context.set(RequestContext(client_id=priority, priority=priority))
+        results[priority] = pool.map(generate, names)
+
+    def queued(depth):
+        deadline = time.monotonic() + 5
+        while scheduler.stats()["queue_depth"] < depth:
+            assert time.monotonic() < deadline, "timed out"
+            time.sleep(0.01)
+
+    # Another generation holds the only slot while both requests arrive
+    scheduler.acquire(ModelTask.CODE_TRANSLATION)
+    results = {}
+    batch = threading.Thread(target=contextvars.Context().run, args=(request, "batch", ["b1", "b2", "b3", "b4"], results))
+    batch.start()
+    queued(2)
+    interactive = threading.Thread(target=contextvars.Context().run, args=(request, "interactive", ["i1"], results))
+    interactive.start()
+    # The interactive chunk reaches the scheduler although the batch request uses every worker
+    queued(3)
+    scheduler.release(0.0)
+    batch.join(5)
+    interactive.join(5)
+
+    assert order[0] == "i1"
+    assert results == {"batch": ["b1", "b2", "b3", "b4"], "interactive": ["i1"]}
+    pool.shutdown()
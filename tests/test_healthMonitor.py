@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from app.llm.cancellation import CANCELLED_BY_CLIENT, CancellationToken, RequestCancelledError
+from app.llm.chains import _produce
+from app.llm.healthMonitor import BackendUnavailableError, CircuitBreaker, OllamaHealthMonitor, health_monitor
+from app.llm.modelRegistry import get_config_for_task
+from app.llm.modelTask import ModelTask
+
+
+def make_breaker(reset_timeout=0.05):
+    return CircuitBreaker(failure_threshold=2, reset_timeout=reset_timeout)
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = make_breaker()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.retry_after() > 0
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = make_breaker()
+    breaker.trip()
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_trial_reopens():
+    breaker = make_breaker()
+    breaker.trip()
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_api_check_leaves_the_trial_to_the_generation():
+    monitor = OllamaHealthMonitor(interval=15.0, timeout=1.0, breaker=make_breaker())
+    monitor.breaker.trip()
+    with pytest.raises(BackendUnavailableError):
+        monitor.check_available()
+    time.sleep(0.06)
+    # The route's early check must not use up the half-open trial...
+    monitor.check_available()
+    monitor.check_available()
+    # ...so the generation itself gets it, and only one does
+    monitor.ensure_available()
+    with pytest.raises(BackendUnavailableError):
+        monitor.check_available()
+    with pytest.raises(BackendUnavailableError):
+        monitor.ensure_available()
+
+
+def test_released_trial_lets_the_next_request_test_the_backend():
+    breaker = make_breaker()
+    breaker.trip()
+    time.sleep(0.06)
+    assert breaker.admit() is True
+    assert breaker.admit() is None
+    breaker.release_trial()
+    assert breaker.admit() is True
+
+
+def test_trial_cancelled_before_reaching_ollama_is_released(fake_ollama):
+
+    config = get_config_for_task(ModelTask.CODE_TRANSLATION)
+    breaker = health_monitor.breaker
+    breaker.trip()
+    breaker._opened_at -= breaker.reset_timeout  # past the timeout: half-open
+    token = CancellationToken(counted=False)
+    token.cancel(CANCELLED_BY_CLIENT)
+    try:
+        with pytest.raises(RequestCancelledError):
+            list(_produce(ModelTask.CODE_TRANSLATION, config, config.create_model(), "prompt", "key", token=token))
+        # The trial never reached Ollama, so it is given back rather than held forever
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert not breaker.would_reject()
+    finally:
+        breaker.record_success()
@@ -0,0 +1,44 @@
+from app.llm.incrementalTranslation import IncrementalTranslator
+
+
+def source(changed: int = -1) -> str:
+    return "".join(
+        f"def step_{i}(total):\n    return total + {i * 7 if i != changed else 1000}\n\n" for i in range(30)
+    )
+
+
+def translator() -> IncrementalTranslator:
+    return IncrementalTranslator(segment_chars=200, ttl=60, max_sessions=4)
+
+
+def test_first_translation_streams_and_later_edits_reuse_segments(fake_ollama):
+    sessions = translator()
+    report = {}
+    tokens = list(sessions.stream("window", source(), "go", "python", use_cache=False, report=report))
+    assert report["segments"] > 1 and report["reused"] == 0
+    # Streamed token by token, not as one spliced piece per segment
+    assert len(tokens) > report["segments"]
+
+    edited = sessions.translate("window", source(changed=12), "go", "python", use_cache=False)
+    assert edited.segments == report["segments"]
+    assert edited.translated == 1
+    assert edited.reused == edited.segments - 1
+
+    # With segments to reuse the spliced result arrives in one piece; step_12 reverted, step_3 edited
+    report = {}
+    assert len(list(sessions.stream("window", source(changed=3), "go", "python", use_cache=False, report=report))) == 1
+    assert report["translated"] == 2
+
+
+def test_single_segment_streams(fake_ollama):
+    report = {}
+    tokens = list(translator().stream("window", "x = 1\n", "go", "python", use_cache=False, report=report))
+    assert report["segments"] == 1
+    assert len(tokens) > 1
+
+
+def test_sessions_are_bounded(fake_ollama):
+    sessions = translator()
+    for window in range(6):
+        sessions.translate(f"window-{window}", "x = 1\n", "go", "python")
+    assert sessions.stats()["sessions"] == 4
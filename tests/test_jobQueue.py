@@ -0,0 +1,63 @@
+import time
+
+from app.llm.jobQueue import QUEUED, RUNNING, SUCCEEDED, JobQueue, JobStore
+from app.llm.scheduler import RequestContext
+
+CONTEXT = RequestContext(client_id="tests", priority="batch")
+
+
+def test_each_job_is_claimed_by_one_process_in_order(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    first, second = JobStore(path), JobStore(path)
+    older = first.create("generate", {"description": "a", "language": "python"}, CONTEXT)
+    newer = first.create("generate", {"description": "b", "language": "python"}, CONTEXT)
+
+    claimed = first.claim("first")
+    assert claimed["id"] == older and claimed["status"] == RUNNING and claimed["owner"] == "first"
+    assert second.claim("second")["id"] == newer
+    assert first.claim("first") is None
+
+
+def test_requeued_job_waits_out_its_delay(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job_id = store.create("translate", {"code": "x = 1", "target_language": "go"}, CONTEXT)
+    store.claim("worker")
+    store.set_progress(job_id, 1, 3)
+
+    store.requeue(job_id, delay=60)
+    row = store.get(job_id)
+    assert row["status"] == QUEUED and row["owner"] is None and row["completed"] == 0
+    assert store.claim("worker") is None
+
+    store.requeue(job_id)
+    assert store.claim("worker")["id"] == job_id
+
+
+def test_jobs_of_dead_processes_are_recovered(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    alive = store.create("generate", {"description": "a", "language": "python"}, CONTEXT)
+    orphaned = store.create("generate", {"description": "b", "language": "python"}, CONTEXT)
+    store.claim("alive")
+    store.claim("dead")
+
+    assert store.recover(lambda owner: owner == "alive") == 1
+    assert store.get(alive)["status"] == RUNNING
+    assert store.get(orphaned)["status"] == QUEUED
+    assert store.claim("alive")["id"] == orphaned
+
+
+def test_job_runs_against_the_backend(tmp_path, fake_ollama):
+    jobs = JobQueue(
+        db_path=str(tmp_path / "jobs.db"), workers=1, retention=60,
+        max_pending=8, prune_interval=60, poll_interval=0.05,
+    )
+    jobs.start()
+    try:
+        job = jobs.submit("generate", {"description": "sum a list", "language": "python"}, CONTEXT)
+        deadline = time.monotonic() + 10
+        while jobs.get(job.id).status != SUCCEEDED:
+            assert time.monotonic() < deadline, jobs.get(job.id)
+            time.sleep(0.05)
+        assert "def process" in jobs.get(job.id).result["code"]
+    finally:
+        jobs.stop()
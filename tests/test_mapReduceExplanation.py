@@ -0,0 +1,44 @@
+from app.llm.chains import create_explanation_summary_chain
+from app.llm.mapReduceExplanation import batch_notes, map_reduce_explainer
+from app.llm.modelRegistry import get_config_for_task
+from app.llm.modelTask import ModelTask
+from app.llm.tokenBudget import MIN_PREDICT, estimate_tokens, max_code_tokens
+
+# Far too large for one explanation prompt
+SOURCE = "".join(
+    f"def scale_{i}(values, factor):\n    result = []\n    for value in values:\n"
+    f"        result.append(value * factor + {i})\n    return result\n\n"
+    for i in range(400)
+)
+
+NOTES = [f"## Lines {i}\nscale_{i} multiplies every value by the factor and adds {i}. " * 4 for i in range(60)]
+
+
+def test_notes_are_batched_to_fit_one_prompt():
+    limit = 300
+    batches = batch_notes(NOTES, limit)
+    assert len(batches) > 1
+    assert [note for batch in batches for note in batch] == NOTES
+    assert all(estimate_tokens("".join(note + "\n\n" for note in batch)) <= limit for batch in batches)
+
+
+def test_oversized_note_is_cut_to_the_limit():
+    (batch,) = batch_notes(["word " * 1000], 100)
+    assert estimate_tokens(batch[0] + "\n\n") <= 100
+
+
+def test_reduce_step_is_budgeted_on_its_notes(fake_ollama):
+    limit = max_code_tokens(ModelTask.CODE_EXPLANATION, get_config_for_task(ModelTask.CODE_EXPLANATION))
+    notes = "\n\n".join(batch_notes(NOTES, limit)[0])
+    result = create_explanation_summary_chain()({"notes": notes, "language": "python", "final": True})
+    budget = result["budget"]
+    assert budget["fitting"] == "none"
+    assert budget["code_tokens"] > 0
+    assert budget["num_predict"] > 192
+
+
+def test_large_file_gets_a_full_final_explanation(fake_ollama):
+    result = map_reduce_explainer.explain(SOURCE, "python", use_cache=False)
+    assert result.chunks > 1 and result.levels >= 1
+    # The fake replies with num_predict words: well above the floor and the guard's minimum
+    assert len(result.explanation.split()) > max(MIN_PREDICT, 256)
@@ -0,0 +1,67 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.metrics import MetricsMiddleware, router as metrics_router
+from app.api.routes import router
+from app.llm.metrics import Histogram, Metrics
+
+
+@pytest.fixture
+def client(fake_ollama):
+    api = FastAPI()
+    api.include_router(router)
+    api.include_router(metrics_router)
+    api.add_middleware(MetricsMiddleware)
+    with TestClient(api) as client:
+        yield client
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("aict_test_seconds", "Test", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, stage="decode")
+    assert histogram.render() == [
+        "# HELP aict_test_seconds Test",
+        "# TYPE aict_test_seconds histogram",
+        'aict_test_seconds_bucket{stage="decode",le="0.1"} 1',
+        'aict_test_seconds_bucket{stage="decode",le="1.0"} 2',
+        'aict_test_seconds_bucket{stage="decode",le="+Inf"} 3',
+        'aict_test_seconds_sum{stage="decode"} 5.55',
+        'aict_test_seconds_count{stage="decode"} 3',
+    ]
+
+
+def test_generation_records_ollama_stages_and_decode_rate():
+    metrics = Metrics()
+    metrics.observe_generation("code_translation", "coder", "ok", 1.5, {
+        "load_duration": 2e8, "prompt_eval_duration": 1e8, "eval_duration": 2e9, "eval_count": 100,
+    })
+    text = metrics.render()
+    assert 'aict_generations_total{task="code_translation",model="coder",outcome="ok"} 1' in text
+    for stage in ("model_load", "prompt_eval", "decode"):
+        assert f'aict_stage_duration_seconds_count{{stage="{stage}",task="code_translation"}} 1' in text
+    assert 'aict_decode_tokens_per_second_sum{task="code_translation",model="coder"} 50' in text
+    assert 'aict_eval_tokens_total{task="code_translation",model="coder"} 100' in text
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    metrics.observe_request("/api/translate_code", "POST", "code_translation", 200, 0.1)
+    assert "aict_http_requests_total{" not in metrics.render()
+
+
+def test_scrape_reports_requests_by_route_and_the_generations_they_ran(client):
+    body = {"code": "def negate(x):\n    return -x\n", "target_language": "kotlin", "use_cache": False}
+    assert client.post("/api/translate_code", json=body).status_code == 200
+    client.get("/api/no_such_route")
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert ('aict_http_requests_total{route="/api/translate_code",method="POST",'
+            'task="code_translation",status="200"}') in text
+    assert 'aict_http_requests_total{route="unmatched",method="GET",task="none",status="404"}' in text
+    assert 'aict_generations_total{task="code_translation"' in text
+    assert 'aict_stage_duration_seconds_count{stage="decode",task="code_translation"}' in text
+    assert "aict_backend_slots " in text
@@ -0,0 +1,52 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routes import router
+from app.llm.chains import create_code_explanation_chain
+from app.llm.modelRegistry import MODEL_REGISTRY, get_config_for_task, resolve_profile
+from app.llm.modelTask import ModelTask
+from app.utils.settings import settings
+
+
+def test_requested_profile_wins_over_the_deployment_choices(monkeypatch):
+    monkeypatch.setattr(settings, "profile", "balanced")
+    monkeypatch.setattr(settings, "task_profiles", {"code_translation": "high-quality"})
+    assert resolve_profile(ModelTask.CODE_TRANSLATION, "low-latency") == "low-latency"
+    assert resolve_profile(ModelTask.CODE_TRANSLATION) == "high-quality"
+    assert resolve_profile(ModelTask.CODE_EXPLANATION) == "balanced"
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(KeyError):
+        resolve_profile(ModelTask.CODE_GENERATION, "turbo")
+
+
+def test_profile_is_applied_over_the_registered_configuration(monkeypatch):
+    monkeypatch.setattr(settings, "num_thread", 6)
+    config = get_config_for_task(ModelTask.CODE_EXPLANATION, "low-latency")
+    assert config.num_ctx == 2048 and config.num_predict == 256 and config.top_k == 20
+    assert config.num_thread == 6
+    # Everything the profile does not set comes from the registry, which is left untouched
+    assert config.temperature == MODEL_REGISTRY[ModelTask.CODE_EXPLANATION].temperature
+    assert MODEL_REGISTRY[ModelTask.CODE_EXPLANATION].num_thread is None
+
+
+def test_every_option_reaches_ollama(fake_ollama):
+    config = get_config_for_task(ModelTask.CODE_EXPLANATION, "high-quality")
+    create_code_explanation_chain("high-quality")({
+        "code": "def cube(x):\n    return x ** 3\n", "language": "python", "use_cache": False
+    })
+    # The fake loads the model with the context size the request asked for
+    assert fake_ollama.fake._contexts[config.name] == config.num_ctx == 8192
+
+
+def test_api_lists_profiles_and_rejects_unknown_ones(fake_ollama):
+    api = FastAPI()
+    api.include_router(router)
+    with TestClient(api) as client:
+        profiles = client.get("/api/profiles").json()
+        assert profiles["code_translation"]["default"] == resolve_profile(ModelTask.CODE_TRANSLATION)
+        assert set(profiles["code_translation"]["profiles"]) == {"low-latency", "balanced", "high-quality"}
+        response = client.post("/api/translate_code", json={"code": "x = 1\n", "target_language": "go", "profile": "turbo"})
+        assert response.status_code == 400
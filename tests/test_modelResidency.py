@@ -0,0 +1,26 @@
+from app.llm.chains import create_code_translation_chain
+from app.llm.modelRegistry import get_config_for_task, preload_options
+from app.llm.modelResidency import ModelResidency
+from app.llm.modelTask import ModelTask
+
+
+def loads_after_preload(server, options) -> int:
+    """Preload the translation model, translate once, and count the loads the translation caused"""
+    name = get_config_for_task(ModelTask.CODE_TRANSLATION).name
+    residency = ModelResidency([server.base_url], keep_alive=None, load_threshold_ms=1)
+    assert isinstance(residency.preload({name: options})[name], float)
+    loads = server.fake.stats["loads"]
+    create_code_translation_chain()({
+        "code": "x = 1\n", "source_language": "python", "target_language": "go", "use_cache": False
+    })
+    return server.fake.stats["loads"] - loads
+
+
+def test_preload_uses_the_context_size_requests_will_ask_for(fake_ollama):
+    options = preload_options()[get_config_for_task(ModelTask.CODE_TRANSLATION).name]
+    assert options["num_ctx"] == get_config_for_task(ModelTask.CODE_TRANSLATION).num_ctx
+    assert loads_after_preload(fake_ollama, options) == 0
+
+
+def test_preload_with_default_options_is_loaded_again(fake_ollama):
+    assert loads_after_preload(fake_ollama, {}) == 1
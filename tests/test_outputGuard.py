@@ -0,0 +1,62 @@
+from app.llm.chains import create_code_translation_chain
+from app.llm.modelTask import ModelTask
+from app.llm.outputGuard import OutputGuard
+from app.llm.responseCache import response_cache
+
+# Long enough for an output limit that leaves room for a loop to show
+SOURCE = "".join(f"def add_{i}(a, b):\n    return a + b * {i}\n\n" for i in range(20))
+
+
+def run(guard: OutputGuard, text: str, piece: int = 4) -> str:
+    """Stream text through the guard in small pieces, as Ollama does"""
+    passed = "".join(guard.feed(text[i:i + piece]) for i in range(0, len(text), piece))
+    return passed + guard.finish()
+
+
+def test_echoed_prompt_heading_ends_the_answer():
+    guard = OutputGuard(ModelTask.CODE_TRANSLATION)
+    answer = "function add(a, b) {\n  return a + b;\n}\n"
+    passed = run(guard, answer + "# Requirements:\n1. Keep the same functionality\n")
+    assert guard.stop.reason == "sentinel"
+    assert guard.output[:guard.stop.clean_chars].rstrip() == answer.rstrip()
+    assert "Requirements" not in passed
+
+
+def test_comments_resembling_headings_pass():
+    guard = OutputGuard(ModelTask.CODE_TRANSLATION)
+    code = "def save(rows):\n    # Write the result to disk\n    # Requirements: none\n    return rows\n"
+    assert run(guard, code) == code
+    assert guard.stop is None
+
+
+def test_repetition_loop_is_cut_after_the_first_block():
+    guard = OutputGuard(ModelTask.CODE_GENERATION)
+    block = "    total = combine(total, items[index])\n    if total > limit:\n        raise ValueError(total)\n"
+    run(guard, "def process(items):\n" + block * 10)
+    assert guard.stop.reason == "repetition"
+    assert guard.output[:guard.stop.clean_chars].count(block) == 1
+
+
+def test_short_repeated_lines_are_not_a_loop():
+    guard = OutputGuard(ModelTask.CODE_GENERATION)
+    code = "# " + "=" * 60 + "\n" + "    }\n" * 6 + "# " + "=" * 60 + "\n"
+    assert run(guard, code) == code
+    assert guard.stop is None
+
+
+def test_guard_stops_a_runaway_generation_and_it_is_not_cached(runaway_ollama):
+    chain = create_code_translation_chain()
+    inputs = {"code": SOURCE, "source_language": "python", "target_language": "javascript", "use_cache": True}
+    result = chain(inputs)
+    assert result["stop_reason"] == "repetition"
+    assert result["translated_code"].count("raise ValueError(total)") == 1
+    # A later hit could not report the stop, so the truncated answer is never cached
+    assert response_cache.get(result["cache_key"]) is None
+
+
+def test_complete_generation_is_cached(fake_ollama):
+    chain = create_code_translation_chain()
+    inputs = {"code": SOURCE, "source_language": "python", "target_language": "go", "use_cache": True}
+    result = chain(inputs)
+    assert result["stop_reason"] is None
+    assert response_cache.get(result["cache_key"]).strip() == result["translated_code"]
@@ -0,0 +1,33 @@
+from app.llm.modelTask import ModelTask
+from app.llm.responseCache import ResponseCache
+
+
+def test_invalidate_key_drops_only_that_entry():
+    cache = ResponseCache(max_entries=8, ttl=60)
+    cache.set("a", "first", ModelTask.CODE_TRANSLATION)
+    cache.set("b", "second", ModelTask.CODE_TRANSLATION)
+
+    assert cache.invalidate_key("a") == 1
+    assert cache.get("a") is None
+    assert cache.get("b") == "second"
+    assert cache.invalidate_key("a") == 0
+
+
+def test_key_invalidation_reaches_processes_sharing_the_disk_tier(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = ResponseCache(max_entries=8, ttl=60, db_path=path, sync_interval=0)
+    second = ResponseCache(max_entries=8, ttl=60, db_path=path, sync_interval=0)
+    first.set("a", "first", ModelTask.CODE_EXPLANATION)
+    first.set("b", "second", ModelTask.CODE_EXPLANATION)
+    # Disk hits are promoted into the second process's memory tier
+    assert second.get("a") == "first"
+    assert second.get("b") == "second"
+
+    assert first.invalidate_key("a") == 1
+    assert second.get("a") is None
+    assert second.get("b") == "second"
+    # A process started later does not replay old invalidations over new entries
+    second.set("a", "again", ModelTask.CODE_EXPLANATION)
+    third = ResponseCache(max_entries=8, ttl=60, db_path=path, sync_interval=0)
+    assert third.get("a") == "again"
+    assert first.get("a") == "again"
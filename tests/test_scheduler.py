@@ -0,0 +1,150 @@
+import contextvars
+import threading
+import time
+
+import pytest
+
+from app.llm.cancellation import (
+    CANCELLED_BY_CLIENT,
+    DEADLINE_EXCEEDED,
+    CancellationToken,
+    RequestCancelledError,
+    request_cancellation
+)
+from app.llm.modelTask import ModelTask
+from app.llm.scheduler import QueueFullError, RequestContext, RequestScheduler, request_context
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def queue(scheduler, served, name, task=ModelTask.CODE_TRANSLATION, client_id="anonymous", priority="interactive",
+          model=None):
+    """Wait for a slot in a thread of its own; record the order slots are granted in"""
+    def run():
+        request_context.set(RequestContext(client_id=client_id, priority=priority))
+        scheduler.acquire(task, model)
+        served.append(name)
+        scheduler.release(0.0, model)
+    depth = scheduler.stats()["queue_depth"]
+    thread = threading.Thread(target=contextvars.Context().run, args=(run,))
+    thread.start()
+    wait_for(lambda: scheduler.stats()["queue_depth"] == depth + 1)
+    return thread
+
+
+def serve(scheduler, threads, model=None):
+    """Free the slot held by the test and let the queue drain"""
+    scheduler.release(0.0, model)
+    for thread in threads:
+        thread.join(5)
+
+
+def test_interactive_requests_go_before_batch_and_by_task_priority():
+    scheduler = RequestScheduler(capacity=1, max_queue_depth=8, task_priorities={"code_generation": 1})
+    scheduler.acquire(ModelTask.CODE_TRANSLATION)
+    served = []
+    threads = [
+        queue(scheduler, served, "batch", priority="batch"),
+        queue(scheduler, served, "generation", task=ModelTask.CODE_GENERATION),
+        queue(scheduler, served, "translation"),
+    ]
+    serve(scheduler, threads)
+    assert served == ["translation", "generation", "batch"]
+
+
+def test_clients_take_turns_within_a_priority():
+    scheduler = RequestScheduler(capacity=1, max_queue_depth=8, task_priorities={})
+    scheduler.acquire(ModelTask.CODE_TRANSLATION)
+    served = []
+    threads = [queue(scheduler, served, f"busy-{i}", client_id="busy") for i in range(3)]
+    threads.append(queue(scheduler, served, "quiet", client_id="quiet"))
+    serve(scheduler, threads)
+    assert served == ["busy-0", "quiet", "busy-1", "busy-2"]
+
+
+def test_full_queue_rejects_with_retry_after():
+    scheduler = RequestScheduler(capacity=1, max_queue_depth=1, task_priorities={})
+    scheduler.acquire(ModelTask.CODE_TRANSLATION)
+    served = []
+    threads = [queue(scheduler, served, "queued")]
+    with pytest.raises(QueueFullError) as rejected:
+        scheduler.check_admission()
+    assert rejected.value.retry_after >= 1
+    with pytest.raises(QueueFullError):
+        scheduler.acquire(ModelTask.CODE_TRANSLATION)
+    assert scheduler.stats()["rejected"] == 2
+    serve(scheduler, threads)
+    assert served == ["queued"]
+
+
+def test_requests_for_the_running_model_go_first_within_the_affinity_window():
+    scheduler = RequestScheduler(capacity=1, max_queue_depth=8, task_priorities={}, affinity_window=5.0)
+    scheduler.acquire(ModelTask.CODE_TRANSLATION, "coder")
+    served = []
+    threads = [
+        queue(scheduler, served, "other", model="writer"),
+        queue(scheduler, served, "same", model="coder"),
+    ]
+    serve(scheduler, threads, "coder")
+    assert served == ["same", "other"]
+    assert scheduler.stats()["affinity_reorders"] == 1
+
+
+def test_a_request_waiting_past_the_affinity_window_is_not_passed_over():
+    scheduler = RequestScheduler(capacity=1, max_queue_depth=8, task_priorities={}, affinity_window=0.05)
+    scheduler.acquire(ModelTask.CODE_TRANSLATION, "coder")
+    served = []
+    threads = [
+        queue(scheduler, served, "other", model="writer"),
+        queue(scheduler, served, "same", model="coder"),
+    ]
+    time.sleep(0.1)
+    serve(scheduler, threads, "coder")
+    assert served == ["other", "same"]
+    assert scheduler.stats()["model_switches"] == 2
+
+
+def test_cancelled_request_is_withdrawn_from_the_queue():
+    scheduler = RequestScheduler(capacity=1, max_queue_depth=8, task_priorities={})
+    scheduler.acquire(ModelTask.CODE_TRANSLATION)
+    token = CancellationToken(counted=False)
+    errors = []
+
+    def run():
+        request_cancellation.set(token)
+        try:
+            scheduler.acquire(ModelTask.CODE_TRANSLATION)
+        except RequestCancelledError as e:
+            errors.append(e)
+    thread = threading.Thread(target=contextvars.Context().run, args=(run,))
+    thread.start()
+    wait_for(lambda: scheduler.stats()["queue_depth"] == 1)
+
+    token.cancel(CANCELLED_BY_CLIENT)
+    thread.join(5)
+    assert errors[0].reason == CANCELLED_BY_CLIENT
+    assert scheduler.stats()["queue_depth"] == 0
+    # The slot it never got goes to the next request instead
+    served = []
+    serve(scheduler, [queue(scheduler, served, "next")])
+    assert served == ["next"]
+
+
+def test_queued_request_is_withdrawn_when_its_deadline_passes():
+    scheduler = RequestScheduler(capacity=1, max_queue_depth=8, task_priorities={})
+    scheduler.acquire(ModelTask.CODE_TRANSLATION)
+    token = CancellationToken(deadline=time.monotonic() + 0.05, counted=False)
+
+    def run():
+        request_cancellation.set(token)
+        scheduler.acquire(ModelTask.CODE_TRANSLATION)
+
+    with pytest.raises(RequestCancelledError) as cancelled:
+        contextvars.Context().run(run)
+    assert cancelled.value.reason == DEADLINE_EXCEEDED
+    assert scheduler.stats()["queue_depth"] == 0
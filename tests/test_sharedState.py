@@ -0,0 +1,60 @@
+import time
+
+from app.llm.cancellation import CANCELLED_BY_CLIENT, CancellationToken, cancellation_registry
+from app.llm.sharedState import SharedState
+
+
+def shared(path) -> SharedState:
+    state = SharedState(str(path), poll_interval=0.01, heartbeat_interval=0.05, cancel_poll_interval=0.01)
+    state.start()
+    return state
+
+
+def test_slots_are_shared_between_processes(tmp_path):
+    first, second = shared(tmp_path / "state.db"), shared(tmp_path / "state.db")
+    try:
+        slot = first.acquire_slot(capacity=2)
+        second.acquire_slot(capacity=2)
+        assert second.stats()["slots_in_use"] == 2
+        first.release_slot(slot)
+        second.acquire_slot(capacity=2)
+    finally:
+        first.stop()
+        second.stop()
+
+
+def test_slots_of_a_dead_process_are_reclaimed(tmp_path):
+    dead, alive = shared(tmp_path / "state.db"), shared(tmp_path / "state.db")
+    try:
+        dead.acquire_slot(capacity=1)
+        # The process dies without releasing anything: its heartbeat stops
+        dead._stop_event.set()
+        for thread in dead._threads:
+            thread.join()
+
+        started = time.monotonic()
+        alive.acquire_slot(capacity=1)
+        assert time.monotonic() - started >= 0.1  # waited for the heartbeat to go stale
+        assert not alive.is_alive(dead.instance_id)
+        assert alive.stats()["reclaimed"] == 1
+    finally:
+        alive.stop()
+
+
+def test_cancel_reaches_the_process_serving_the_request(tmp_path):
+    serving, receiving = shared(tmp_path / "state.db"), shared(tmp_path / "state.db")
+    token = CancellationToken(counted=False)
+    cancellation_registry.register("remote-request", token)
+    try:
+        # The cancel arrives at a process that is not serving the request
+        receiving.request_cancel("remote-request")
+        deadline = time.monotonic() + 2
+        while not token.cancelled and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert token.reason == CANCELLED_BY_CLIENT
+        assert serving.stats()["cancels_received"] + receiving.stats()["cancels_received"] == 1
+        # Handed out once: nothing is left for the next poll
+        assert receiving.cancel_requested(["remote-request"]) == []
+    finally:
+        serving.stop()
+        receiving.stop()
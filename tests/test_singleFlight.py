@@ -0,0 +1,106 @@
+import contextvars
+import threading
+import time
+
+import pytest
+
+from app.llm.cancellation import CancellationToken, RequestCancelledError, request_cancellation
+from app.llm.modelTask import ModelTask
+from app.llm.scheduler import RequestScheduler
+from app.llm.singleFlight import SingleFlight
+
+
+def subscribe(flight: SingleFlight, key, start, token, results, name):
+    """Consume a flight in a thread of its own, as a request under `token` would"""
+    def run():
+        request_cancellation.set(token)
+        try:
+            results[name] = list(flight.stream(key, start))
+        except BaseException as e:
+            results[name] = e
+    thread = threading.Thread(target=contextvars.Context().run, args=(run,))
+    thread.start()
+    return thread
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_followers_join_the_leaders_generation():
+    flight = SingleFlight()
+    release = threading.Event()
+    starts = []
+
+    def start(token):
+        starts.append(token)
+        release.wait(5)
+        yield "a"
+        yield "b"
+
+    results = {}
+    threads = [subscribe(flight, "key", start, CancellationToken(), results, i) for i in range(3)]
+    wait_for(lambda: flight.stats()["coalesced"] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(starts) == 1
+    assert results == {0: ["a", "b"], 1: ["a", "b"], 2: ["a", "b"]}
+
+
+def test_generation_is_cancelled_once_every_subscriber_is():
+    flight = SingleFlight()
+    produced = []
+
+    def start(token):
+        produced.append(token)
+        yield "a"
+        while not token.cancelled:
+            time.sleep(0.01)
+        raise RequestCancelledError(token.reason)
+
+    tokens = [CancellationToken(), CancellationToken()]
+    results = {}
+    threads = [subscribe(flight, "key", start, token, results, i) for i, token in enumerate(tokens)]
+    wait_for(lambda: produced and flight.stats()["coalesced"] == 1)
+    tokens[0].cancel("test")
+    time.sleep(0.1)
+    assert not produced[0].cancelled
+    tokens[1].cancel("test")
+    for thread in threads:
+        thread.join(5)
+
+    assert produced[0].cancelled
+    assert all(isinstance(result, RequestCancelledError) for result in results.values())
+
+
+def test_leader_cancelled_while_queued_does_not_fail_followers():
+    # The producer waits for a scheduler slot under the flight's token, not the leader's
+    scheduler = RequestScheduler(capacity=1, max_queue_depth=8, task_priorities={})
+    scheduler.acquire(ModelTask.CODE_GENERATION)
+    flight = SingleFlight()
+
+    def start(token):
+        with scheduler.slot(ModelTask.CODE_GENERATION):
+            yield "code"
+
+    leader, follower = CancellationToken(), CancellationToken()
+    results = {}
+    threads = [subscribe(flight, "key", start, leader, results, "leader")]
+    wait_for(lambda: scheduler.stats()["queue_depth"] == 1)
+    threads.append(subscribe(flight, "key", start, follower, results, "follower"))
+    wait_for(lambda: flight.stats()["coalesced"] == 1)
+
+    leader.cancel("client_disconnected")
+    time.sleep(0.1)
+    assert scheduler.stats()["queue_depth"] == 1
+    scheduler.release()
+    for thread in threads:
+        thread.join(5)
+
+    assert isinstance(results["leader"], RequestCancelledError)
+    assert results["follower"] == ["code"]
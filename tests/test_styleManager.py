@@ -0,0 +1,51 @@
+import json
+import time
+
+import pytest
+
+from app.utils.styleManager import StyleManager, StylePreferences
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return StyleManager(reload_interval=0.0)
+
+
+def test_profiles_fall_back_to_the_defaults(manager):
+    manager.save_preferences(StylePreferences(indentation="tabs"), "team")
+    assert manager.get_preferences("alice", "team").indentation == "tabs"
+    assert manager.get_preferences("alice").indentation == "spaces"
+    assert manager.delete_profile("team")
+    assert not manager.delete_profile("team")
+    assert manager.profile_names() == []
+
+
+def test_changes_by_another_process_are_picked_up(manager):
+    other = StyleManager(reload_interval=0.0)
+    other.save_preferences(StylePreferences(indent_size=2))
+    other.save_preferences(StylePreferences(naming_convention="camelCase"), "team")
+    assert manager.get_preferences().indent_size == 2
+    assert manager.get_preferences("team").naming_convention == "camelCase"
+
+
+@pytest.mark.parametrize("contents", ['{"indent_size": 2', '{"indent_size": "two"}', '[1, 2]'])
+def test_unreadable_file_is_kept_and_ignored(manager, contents):
+    manager.save_preferences(StylePreferences(indent_size=8))
+    time.sleep(0.01)
+    manager.preferences_file.write_text(contents)
+
+    assert manager.get_preferences_dict()["indent_size"] == 8
+    assert manager.preferences_file.read_text() == contents
+
+    manager.preferences_file.write_text(json.dumps({"indent_size": 3}))
+    assert manager.get_preferences().indent_size == 3
+
+
+def test_saving_keeps_the_file_readable(manager):
+    manager.preferences_file.chmod(0o644)
+    manager.save_preferences(StylePreferences(indent_size=2))
+    assert manager.preferences_file.stat().st_mode & 0o777 == 0o644
+
+    manager.save_preferences(StylePreferences(), "team")
+    assert manager.profiles_file.stat().st_mode & 0o044
@@ -0,0 +1,45 @@
+from app.llm.modelRegistry import get_config_for_task
+from app.llm.modelTask import ModelTask
+from app.llm.tokenBudget import compact_code, estimate_tokens, fits_in_context, max_code_tokens, plan_budget
+
+
+def test_compaction_drops_comments_and_blank_lines():
+    code = "#!/usr/bin/env python\nimport os  \n\n\n# a comment\nx = 1  # trailing\n"
+    assert compact_code(code, "python") == "#!/usr/bin/env python\nimport os\nx = 1\n"
+
+
+def test_compaction_keeps_multiline_strings_intact():
+    code = 'def f():\n    s = """one\n\n    two   \n"""\n\n    return s\n'
+    compacted = compact_code(code, "python")
+    before, after = {}, {}
+    exec(code, before)
+    exec(compacted, after)
+    assert after["f"]() == before["f"]()
+    assert compacted == 'def f():\n    s = """one\n\n    two   \n"""\n    return s\n'
+
+
+def test_unknown_language_is_left_alone():
+    assert compact_code("a\n\n  b  \n", "no-such-language") == "a\n\n  b  \n"
+
+
+def test_estimate_grows_with_text():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("def f(x):\n    return x\n") < estimate_tokens("def f(x):\n    return x\n" * 10)
+
+
+def test_profile_output_limit_bounds_translation():
+    code = "".join(f"def f{i}(a, b):\n    return a * {i} + b\n\n" for i in range(40))
+    prompt = "Translate this code:\n" + code
+    limits = {
+        profile: plan_budget(ModelTask.CODE_TRANSLATION, get_config_for_task(ModelTask.CODE_TRANSLATION, profile), prompt, code)
+        for profile in ("low-latency", "balanced")
+    }
+    assert limits["low-latency"].num_predict <= get_config_for_task(ModelTask.CODE_TRANSLATION, "low-latency").num_predict
+    assert limits["low-latency"].num_predict < limits["balanced"].num_predict
+
+
+def test_translation_chunks_fit_the_profile_output_limit():
+    config = get_config_for_task(ModelTask.CODE_TRANSLATION, "low-latency")
+    # The context would hold more code, but not its whole translation within num_predict
+    limit = max_code_tokens(ModelTask.CODE_TRANSLATION, config)
+    assert 64 + int(limit * 1.3) <= config.num_predict < 64 + int((limit + 1) * 1.3)
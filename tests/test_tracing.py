@@ -0,0 +1,65 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routes import router
+from app.api.tracing import TracingMiddleware
+from app.llm.tracing import Tracer, current_trace, span
+
+
+@pytest.fixture
+def client(fake_ollama):
+    api = FastAPI()
+    api.include_router(router)
+    api.add_middleware(TracingMiddleware)
+    with TestClient(api) as client:
+        yield client
+
+
+def test_request_trace_has_a_span_per_stage(client):
+    body = {"code": "def square(x):\n    return x * x\n", "target_language": "swift", "use_cache": False}
+    response = client.post("/api/translate_code", json=body, headers={"X-Request-ID": "trace-me"})
+    assert response.headers["X-Request-ID"] == "trace-me"
+
+    trace = client.get("/api/debug/traces/trace-me").json()
+    assert trace["route"] == "/api/translate_code" and trace["status"] == 200
+    assert {"detection", "chain_construction", "prompt_render", "queue", "llm_call"} <= set(trace["breakdown_ms"])
+    llm_call = next(span for span in trace["spans"] if span["name"] == "llm_call")
+    assert llm_call["eval_count"] > 0 and llm_call["tokens_per_second"] > 0
+
+
+def test_untagged_request_gets_an_id_to_find_its_trace_by(client):
+    response = client.get("/api/profiles")
+    request_id = response.headers["X-Request-ID"]
+    assert len(request_id) == 32
+    assert client.get(f"/api/debug/traces/{request_id}").json()["path"] == "/api/profiles"
+
+
+def test_slow_requests_are_kept_with_their_spans():
+    tracer = Tracer(enabled=True, sample_rate=0.0, slow_request_ms=0.0, buffer_size=4)
+    trace = tracer.start("POST", "/api/explain_code", "slow-one")
+    reset = current_trace.set(trace)
+    try:
+        with span("llm_call", model="coder") as attributes:
+            attributes["eval_count"] = 12
+    finally:
+        current_trace.reset(reset)
+    tracer.finish(trace, 200, "/api/explain_code")
+
+    slow = tracer.recent(slow_only=True)
+    assert [entry["request_id"] for entry in slow] == ["slow-one"]
+    assert slow[0]["spans"][0]["eval_count"] == 12
+    assert tracer.stats()["slow"] == 1
+
+
+def test_span_records_the_error_that_ended_it():
+    tracer = Tracer(enabled=True, sample_rate=0.0, slow_request_ms=None, buffer_size=4)
+    trace = tracer.start("GET", "/api/generate_code")
+    reset = current_trace.set(trace)
+    try:
+        with pytest.raises(TimeoutError):
+            with span("llm_call"):
+                raise TimeoutError()
+    finally:
+        current_trace.reset(reset)
+    assert trace.to_dict()["spans"][0]["error"] == "TimeoutError"